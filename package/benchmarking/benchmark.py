@@ -0,0 +1,266 @@
+"""Benchmark the model over the number of individuals, behaviours, connections and memory length
+A module that runs standard configurations of the model, made from base_params.json, and records for each the construction
+time, steps per second, peak resident memory and the peak size of the memory traced by tracemalloc and the number of
+blocks still allocated at the end of the traced run.
+For every alpha_change case N, M, K and cultural_inertia are varied one at a time around the base configuration, giving
+how the cost of a run scales with each of them.
+
+Each configuration is run in a fresh process so that its peak memory is its own. The results are saved as JSON and
+compared against a stored baseline, listing the configurations that have become slower or use more memory.
+
+Run from the root folder with: python -m package.benchmarking.benchmark
+
+Created: 10/10/2022
+"""
+
+# imports
+import json
+import os
+import sys
+import time
+import platform
+import tracemalloc
+import multiprocessing
+import numpy as np
+from package.resources.run import create_network
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ALPHA_CHANGE_LIST = [
+    "static_uniform_weights",
+    "static_culturally_determined_weights",
+    "dynamic_culturally_determined_weights",
+    "behavioural_independence",
+]
+
+BENCHMARK_GRID = {
+    "N": [50, 200, 800],
+    "M": [1, 3, 10],
+    "K": [5, 20, 40],
+    "cultural_inertia": [10, 100, 1000],
+}
+
+BENCHMARK_PARAMS = {
+    "time_steps_max": 200,
+    "save_timeseries_data": 0,
+}
+
+# modules
+def get_peak_rss() -> int:
+    """
+    Return the peak resident memory of this process in bytes. Without the resource module (Windows) psutil, listed in
+    requirements.txt, gives the peak working set, or the current resident memory on platforms without one
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    int
+        peak resident set size
+    """
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024  # kilobytes except on macOS
+    import psutil
+
+    memory_info = psutil.Process().memory_info()
+    return getattr(memory_info, "peak_wset", memory_info.rss)
+
+def produce_benchmark_configs(
+    base_params: dict, grid: dict = BENCHMARK_GRID, alpha_change_list: list = ALPHA_CHANGE_LIST
+) -> dict[str, dict]:
+    """
+    Produce the parameter dict of each benchmark, varying each property of the grid one at a time from the base parameters
+    for each alpha_change case
+
+    Parameters
+    ----------
+    base_params: dict
+        parameters of the base configuration
+    grid: dict[str, list]
+        values taken by each varied property
+    alpha_change_list: list[str]
+        alpha_change cases to benchmark
+
+    Returns
+    -------
+    config_dict: dict[str, dict]
+        parameters of each benchmark, keyed by name e.g "behavioural_independence/N=800"
+    """
+    config_dict = {}
+    for alpha_change in alpha_change_list:
+        for property, values in grid.items():
+            for value in values:
+                params = base_params.copy()
+                params["alpha_change"] = alpha_change
+                params[property] = value
+                config_dict["%s/%s=%s" % (alpha_change, property, value)] = params
+    return config_dict
+
+def run_benchmark(params: dict, repeats: int = 3, tracemalloc_steps: int = 10) -> dict:
+    """
+    Time the construction and steps of one configuration, keeping the fastest of the repeats, then measure the memory traced by
+    tracemalloc over a short separate run (tracing slows the model too much to be used while timing)
+
+    Parameters
+    ----------
+    params: dict
+        parameters of the configuration
+    repeats: int
+        number of timed runs
+    tracemalloc_steps: int
+        number of steps of the traced run
+
+    Returns
+    -------
+    result: dict
+        construction_time, step_time, steps_per_second, peak_rss, rss_before, tracemalloc_peak and tracemalloc_live_blocks
+        (blocks traced by tracemalloc still allocated after the traced steps)
+    """
+    params = dict(params, topology_cache=0)  # every run builds its network, so its construction is measured
+    rss_before = get_peak_rss()
+    construction_time_list = []
+    step_time_list = []
+    for __ in range(repeats):
+        start_time = time.perf_counter()
+        social_network = create_network(params)
+        construction_time_list.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        while social_network.t < params["time_steps_max"]:
+            social_network.next_step()
+        step_time_list.append((time.perf_counter() - start_time) / params["time_steps_max"])
+        del social_network
+    peak_rss = get_peak_rss()
+
+    tracemalloc.start()
+    social_network = create_network(params)
+    for __ in range(tracemalloc_steps):
+        social_network.next_step()
+    tracemalloc_live_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    __, tracemalloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    step_time = min(step_time_list)
+    return {
+        "construction_time": min(construction_time_list),
+        "step_time": step_time,
+        "steps_per_second": 1 / step_time,
+        "peak_rss": peak_rss,
+        "rss_before": rss_before,
+        "tracemalloc_peak": tracemalloc_peak,
+        "tracemalloc_live_blocks": tracemalloc_live_blocks,
+    }
+
+def run_benchmark_config(item: tuple) -> tuple[str, dict]:
+    name, params, repeats = item
+    return name, run_benchmark(params, repeats)
+
+def run_benchmarks(config_dict: dict[str, dict], repeats: int = 3) -> dict[str, dict]:
+    """
+    Run every benchmark one after another, each in a new process
+
+    Parameters
+    ----------
+    config_dict: dict[str, dict]
+        parameters of each benchmark, keyed by name
+    repeats: int
+        number of timed runs of each benchmark
+
+    Returns
+    -------
+    results: dict[str, dict]
+        result of each benchmark, see run_benchmark
+    """
+    results = {}
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for name, result in pool.imap(run_benchmark_config, [(name, params, repeats) for name, params in config_dict.items()]):
+            print("%-60s %10.1f steps/s %8.1f MB" % (name, result["steps_per_second"], result["peak_rss"] / 1e6))
+            results[name] = result
+    return results
+
+def get_environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def compare_results(results: dict[str, dict], baseline: dict[str, dict], tolerance: float = 0.1) -> list[str]:
+    """
+    Compare benchmark results against a baseline, a configuration has regressed if its steps per second fell or its peak memory
+    grew by more than the tolerance
+
+    Parameters
+    ----------
+    results: dict[str, dict]
+        result of each benchmark
+    baseline: dict[str, dict]
+        results of an earlier run of the benchmarks
+    tolerance: float
+        allowed relative change e.g 0.1 is 10%
+
+    Returns
+    -------
+    regression_list: list[str]
+        names of the configurations that have regressed
+    """
+    regression_list = []
+    print("%-60s %10s %10s" % ("benchmark", "speed", "memory"))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        speed_ratio = result["steps_per_second"] / baseline[name]["steps_per_second"]
+        memory_ratio = (result["peak_rss"] - result["rss_before"]) / max(1, baseline[name]["peak_rss"] - baseline[name]["rss_before"])
+        regressed = (speed_ratio < 1 - tolerance) or (memory_ratio > 1 + tolerance)
+        print("%-60s %9.2fx %9.2fx %s" % (name, speed_ratio, memory_ratio, "REGRESSION" if regressed else ""))
+        if regressed:
+            regression_list.append(name)
+    return regression_list
+
+def main(
+        BASE_PARAMS_LOAD = "package/constants/base_params.json",
+        BENCHMARK_PARAMS = BENCHMARK_PARAMS,
+        GRID = BENCHMARK_GRID,
+        ALPHA_CHANGE_LIST = ALPHA_CHANGE_LIST,
+        REPEATS = 3,
+        RESULTS_FILE = None,
+        BASELINE_LOAD = "package/benchmarking/baseline.json",
+        TOLERANCE = 0.1,
+        ) -> list[str]:
+
+    f = open(BASE_PARAMS_LOAD)
+    base_params = json.load(f)
+    base_params.update(BENCHMARK_PARAMS)
+
+    config_dict = produce_benchmark_configs(base_params, GRID, ALPHA_CHANGE_LIST)
+    results = run_benchmarks(config_dict, REPEATS)
+
+    if RESULTS_FILE is None:
+        os.makedirs("results", exist_ok=True)
+        RESULTS_FILE = "results/benchmark_" + time.strftime("%H_%M_%S__%d_%m_%Y") + ".json"
+    with open(RESULTS_FILE, "w") as f:
+        json.dump({"environment": get_environment(), "params": base_params, "results": results}, f, indent=4)
+    print("results saved to: ", RESULTS_FILE)
+
+    regression_list = []
+    if BASELINE_LOAD is not None and os.path.exists(BASELINE_LOAD):
+        with open(BASELINE_LOAD) as f:
+            baseline = json.load(f)
+        regression_list = compare_results(results, baseline["results"], TOLERANCE)
+        print("regressions: ", len(regression_list))
+
+    return regression_list
+
+if __name__ == '__main__':
+    regression_list = main(
+        BASE_PARAMS_LOAD = "package/constants/base_params.json",
+        BASELINE_LOAD = "package/benchmarking/baseline.json",
+        )
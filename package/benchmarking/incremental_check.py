@@ -0,0 +1,103 @@
+"""Check that the incremental link strength update gives the same simulations as the full update
+A module that runs small simulations with dynamic culturally determined weights, for both engines, dense and sparse,
+once with the full link strength update and once with "incremental_weighting": 1 and "weighting_tolerance": 0, and
+compares their saved time series of link strengths and total identity differences and their emissions stock.
+With a tolerance of 0 every row whose identities moved is recomputed, so the results must agree to rounding.
+
+Run from the root folder with: python -m package.benchmarking.incremental_check
+
+Created: 10/10/2022
+"""
+
+# imports
+import json
+import numpy as np
+from package.resources.run import generate_data
+
+CHECK_PARAMS = {
+    "N": 40,
+    "M": 3,
+    "K": 6,
+    "cultural_inertia": 20,
+    "time_steps_max": 60,
+    "save_timeseries_data": 1,
+    "alpha_change": "dynamic_culturally_determined_weights",
+}
+
+COMPARED_CHANNEL_LIST = ["weighting_matrix", "total_identity_differences", "total_carbon_emissions_stock"]
+
+# modules
+def produce_check_configs(base_params: dict) -> dict[str, dict]:
+    """
+    Produce the parameter dict of each check: both engines, dense and sparse
+
+    Parameters
+    ----------
+    base_params: dict
+        parameters of the base configuration
+
+    Returns
+    -------
+    config_dict: dict[str, dict]
+        parameters of each check, keyed by name e.g "matrix/sparse"
+    """
+    config_dict = {}
+    for engine in ["agent", "matrix"]:
+        for sparse_network in [0, 1]:
+            params = base_params.copy()
+            params.update(engine=engine, sparse_network=sparse_network)
+            config_dict["%s/%s" % (engine, "sparse" if sparse_network else "dense")] = params
+    return config_dict
+
+def calc_difference(params: dict) -> dict[str, float]:
+    """
+    Run a simulation with the full and the incremental link strength update and return the largest difference between
+    each of the compared time series
+
+    Parameters
+    ----------
+    params: dict
+        parameters of the simulation
+
+    Returns
+    -------
+    difference_dict: dict[str, float]
+        largest absolute difference of each time series of COMPARED_CHANNEL_LIST
+    """
+    data_list = [
+        generate_data(dict(params, incremental_weighting=incremental_weighting, weighting_tolerance=0))
+        for incremental_weighting in [0, 1]
+    ]
+    return {
+        channel: np.max(np.abs(getattr(data_list[0], "history_" + channel) - getattr(data_list[1], "history_" + channel)))
+        for channel in COMPARED_CHANNEL_LIST
+    }
+
+def main(
+        BASE_PARAMS_LOAD = "package/constants/base_params.json",
+        CHECK_PARAMS = CHECK_PARAMS,
+        TOLERANCE = 1e-12,
+        ) -> list[str]:
+
+    f = open(BASE_PARAMS_LOAD)
+    base_params = json.load(f)
+    base_params.update(CHECK_PARAMS)
+
+    failure_list = []
+    for name, params in produce_check_configs(base_params).items():
+        difference_dict = calc_difference(params)
+        for channel, difference in difference_dict.items():
+            failed = difference > TOLERANCE
+            print("%-20s %-30s %10.2e %s" % (name, channel, difference, "FAILED" if failed else "ok"))
+            if failed:
+                failure_list.append(name + "/" + channel)
+
+    print("failures: ", len(failure_list))
+    return failure_list
+
+if __name__ == '__main__':
+    failure_list = main(
+        BASE_PARAMS_LOAD = "package/constants/base_params.json",
+        )
+    if failure_list:
+        raise SystemExit(1)
@@ -0,0 +1,112 @@
+"""Check that the numba kernels give the same simulations as the NumPy code
+A module that runs small simulations of every alpha_change case, dense and sparse, with green influencers and without,
+once with "kernel_backend": "numpy" and once with "numba", and compares their emissions, identities and final state.
+The kernels only change the order of some sums, so the results must agree to rounding.
+
+numba is optional (see requirements-optional.txt). Without it the check is skipped.
+
+Run from the root folder with: python -m package.benchmarking.kernel_check
+
+Created: 10/10/2022
+"""
+
+# imports
+import json
+import numpy as np
+from package.resources.run import generate_data
+from package.model import kernels
+from package.benchmarking.benchmark import ALPHA_CHANGE_LIST
+
+CHECK_PARAMS = {
+    "N": 40,
+    "M": 3,
+    "K": 6,
+    "cultural_inertia": 20,
+    "time_steps_max": 60,
+    "save_timeseries_data": 0,
+    "engine": "matrix",
+}
+
+# modules
+def produce_check_configs(base_params: dict, alpha_change_list: list = ALPHA_CHANGE_LIST) -> dict[str, dict]:
+    """
+    Produce the parameter dict of each check: every alpha_change case, dense and sparse, with and without green influencers
+
+    Parameters
+    ----------
+    base_params: dict
+        parameters of the base configuration
+    alpha_change_list: list[str]
+        alpha_change cases to check
+
+    Returns
+    -------
+    config_dict: dict[str, dict]
+        parameters of each check, keyed by name e.g "behavioural_independence/sparse/green"
+    """
+    config_dict = {}
+    for alpha_change in alpha_change_list:
+        for sparse_network in [0, 1]:
+            for green_N in [0, 5]:
+                params = base_params.copy()
+                params.update(alpha_change=alpha_change, sparse_network=sparse_network, green_N=green_N)
+                name = "%s/%s/%s" % (alpha_change, "sparse" if sparse_network else "dense", "green" if green_N else "no_green")
+                config_dict[name] = params
+    return config_dict
+
+def calc_relative_difference(params: dict) -> float:
+    """
+    Run a simulation with both kernel backends and return the largest relative difference between them
+
+    Parameters
+    ----------
+    params: dict
+        parameters of the simulation
+
+    Returns
+    -------
+    float
+        largest relative difference of the emissions stock and flow, the identity measures and the attitudes
+    """
+    data_list = [generate_data(dict(params, kernel_backend=kernel_backend)) for kernel_backend in ["numpy", "numba"]]
+
+    pair_list = [
+        (data.total_carbon_emissions_stock, data.total_carbon_emissions_flow, data.average_identity, data.var_identity)
+        for data in data_list
+    ]
+    difference = max(abs(a - b) / max(abs(a), 1e-300) for a, b in zip(*pair_list))
+
+    attitude_list = [data.get_behavioural_attitude_matrix() for data in data_list]
+    return max(difference, np.max(np.abs(attitude_list[0] - attitude_list[1])))
+
+def main(
+        BASE_PARAMS_LOAD = "package/constants/base_params.json",
+        CHECK_PARAMS = CHECK_PARAMS,
+        TOLERANCE = 1e-12,
+        ) -> list[str]:
+
+    if not kernels.NUMBA_AVAILABLE:
+        print("numba is not installed, nothing to check")
+        return []
+
+    f = open(BASE_PARAMS_LOAD)
+    base_params = json.load(f)
+    base_params.update(CHECK_PARAMS)
+
+    failure_list = []
+    for name, params in produce_check_configs(base_params).items():
+        difference = calc_relative_difference(params)
+        failed = difference > TOLERANCE
+        print("%-70s %10.2e %s" % (name, difference, "FAILED" if failed else "ok"))
+        if failed:
+            failure_list.append(name)
+
+    print("failures: ", len(failure_list))
+    return failure_list
+
+if __name__ == '__main__':
+    failure_list = main(
+        BASE_PARAMS_LOAD = "package/constants/base_params.json",
+        )
+    if failure_list:
+        raise SystemExit(1)
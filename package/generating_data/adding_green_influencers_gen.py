@@ -13,6 +13,7 @@ from package.resources.utility import (
 from package.resources.run import (
     multi_stochstic_emissions_run_all_individual,
 )
+from package.resources.result_cache import Result_Cache, DEFAULT_MAX_SIZE
 
 def calc_new_K(K,N, N_green):
     """Adjust K to keep constant network densitiy"""
@@ -38,11 +39,14 @@ def calc_attribute_percentage_change(carbon_emissions_not_influencer_no_green_no
     return emissions_difference_stochastic_compare_green,emissions_difference_stochastic_compare_no_green,emissions_difference_stochastic_compare_identity,emissions_difference_stochastic_compare_no_identity
 
 
-def main(RUN = 1,BASE_PARAMS_LOAD = "package/constants/base_params_add_greens.json", param_vary_reps = 100,green_N = 20,sum_a_b = 2, confirmation_bias = 5):    
+def main(RUN = 1,BASE_PARAMS_LOAD = "package/constants/base_params_add_greens.json", param_vary_reps = 100,green_N = 20,sum_a_b = 2, confirmation_bias = 5, CACHE_DIR = None, CACHE_MAX_SIZE = DEFAULT_MAX_SIZE):    
     
     if RUN:
+        cache = Result_Cache(CACHE_DIR, CACHE_MAX_SIZE) if CACHE_DIR is not None else None
+
         f = open(BASE_PARAMS_LOAD)
         base_params = json.load(f)
+        base_params["topology_cache"] = 1  # runs of the same seed and green_N share a network, build it once per process
         
         ###############################################################
         
@@ -117,11 +121,11 @@ def main(RUN = 1,BASE_PARAMS_LOAD = "package/constants/base_params_add_greens.js
         ##############################################################################
         #DO THE RUNS
         #GREENS
-        emissions_list_green_no_identity, carbon_emissions_not_influencer_green_no_identity  = multi_stochstic_emissions_run_all_individual(params_list_green_no_identity)        
-        emissions_list_green_identity, carbon_emissions_not_influencer_green_identity = multi_stochstic_emissions_run_all_individual(params_list_green_identity)
+        emissions_list_green_no_identity, carbon_emissions_not_influencer_green_no_identity  = multi_stochstic_emissions_run_all_individual(params_list_green_no_identity, cache = cache)        
+        emissions_list_green_identity, carbon_emissions_not_influencer_green_identity = multi_stochstic_emissions_run_all_individual(params_list_green_identity, cache = cache)
         #NO GREENS
-        emissions_list_no_green_no_identity, carbon_emissions_not_influencer_no_green_no_identity = multi_stochstic_emissions_run_all_individual(params_list_no_green_no_identity)
-        emissions_list_no_green_identity, carbon_emissions_not_influencer_no_green_identity = multi_stochstic_emissions_run_all_individual(params_list_no_green_identity)
+        emissions_list_no_green_no_identity, carbon_emissions_not_influencer_no_green_no_identity = multi_stochstic_emissions_run_all_individual(params_list_no_green_no_identity, cache = cache)
+        emissions_list_no_green_identity, carbon_emissions_not_influencer_no_green_identity = multi_stochstic_emissions_run_all_individual(params_list_no_green_identity, cache = cache)
 
         ####################################################################################
         emissions_difference_matrix_compare_green,emissions_difference_matrix_compare_no_green,emissions_difference_matrix_compare_identity,emissions_difference_matrix_compare_no_identity = calc_attribute_percentage_change(carbon_emissions_not_influencer_no_green_no_identity,carbon_emissions_not_influencer_no_green_identity,carbon_emissions_not_influencer_green_no_identity,carbon_emissions_not_influencer_green_identity,mean_list,base_params)
@@ -8,6 +8,7 @@ import json
 import numpy as np
 from package.resources.utility import createFolder,produce_name_datetime,save_object,calc_pos_clusters_set_bandwidth
 from package.resources.run import one_seed_identity_data_run
+from package.resources.result_cache import Result_Cache, DEFAULT_MAX_SIZE
 from package.generating_data.oneD_param_sweep_gen import (
     produce_param_list,
 )
@@ -19,9 +20,12 @@ def main(
     param_min = 0.0,
     param_max = 100.0,
     reps = 500,
-
+    CACHE_DIR = None,
+    CACHE_MAX_SIZE = DEFAULT_MAX_SIZE,
     ) -> str:
 
+    cache = Result_Cache(CACHE_DIR, CACHE_MAX_SIZE) if CACHE_DIR is not None else None
+
     property_varied = "confirmation_bias"
 
     ###FIRST RUN WITH IDENTITY (BEHAVIORAL INTERDEPENDANCE)
@@ -29,18 +33,19 @@ def main(
 
     f = open(BASE_PARAMS_LOAD)
     base_params = json.load(f)
+    base_params["topology_cache"] = 1  # every run has the same network, build it once per process
 
     base_params["alpha_change"] = "dynamic_culturally_determined_weights"#Just to make sure
 
     params_list_identity = produce_param_list(base_params, property_values_list, property_varied)
-    results_identity_lists_identity = one_seed_identity_data_run(params_list_identity)#list of lists lists [param set up, stochastic, cluster]
+    results_identity_lists_identity = one_seed_identity_data_run(params_list_identity, cache = cache)#list of lists lists [param set up, stochastic, cluster]
 
     #####################################################################
     ####NO IDENTITY
 
     base_params["alpha_change"] = "behavioural_independence"#Now change to behavioural independence
     params_list_no_identity = produce_param_list(base_params, property_values_list, property_varied)
-    results_identity_lists_no_identity = one_seed_identity_data_run(params_list_no_identity)#list of lists lists [param set up, stochastic, cluster]
+    results_identity_lists_no_identity = one_seed_identity_data_run(params_list_no_identity, cache = cache)#list of lists lists [param set up, stochastic, cluster]
 
     ############################################################################
 
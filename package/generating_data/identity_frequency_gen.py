@@ -6,14 +6,20 @@ import json
 import numpy as np
 from package.resources.utility import produce_name_datetime, createFolder,save_object
 from package.resources.run import parallel_run 
+from package.resources.result_cache import Result_Cache, DEFAULT_MAX_SIZE
+from package.resources.network_reader import save_network_list
 from package.generating_data.oneD_param_sweep_gen import (
     produce_param_list,
 )
 
 def main(
-    BASE_PARAMS_LOAD = "package/constants/base_params_identity_frequency.json"
+    BASE_PARAMS_LOAD = "package/constants/base_params_identity_frequency.json",
+    CACHE_DIR = None,
+    CACHE_MAX_SIZE = DEFAULT_MAX_SIZE
 ) -> str: 
 
+    cache = Result_Cache(CACHE_DIR, CACHE_MAX_SIZE) if CACHE_DIR is not None else None
+
     property_varied = "alpha_change"
     title_list = [r"Static uniform $\alpha_{n,k}$", r"Static culturally determined $\alpha_{n,k}$", r"Dynamic culturally determined $\alpha_{n,k}$"]
     property_values_list = ["static_uniform_weights", "static_culturally_determined_weights", "dynamic_culturally_determined_weights"]
@@ -27,10 +33,10 @@ def main(
 
     params_list = produce_param_list(base_params, np.asarray(property_values_list), property_varied)
 
-    data_list = parallel_run(params_list)
+    data_list = parallel_run(params_list, cache = cache)
     createFolder(fileName)
 
-    save_object(data_list, fileName + "/Data", "data_list")
+    save_network_list(data_list, fileName + "/Data", "data_list")
     save_object(base_params, fileName + "/Data", "base_params")
     save_object(property_varied, fileName + "/Data", "property_varied")
     save_object(title_list, fileName + "/Data", "title_list")
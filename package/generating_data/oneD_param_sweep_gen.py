@@ -13,6 +13,8 @@ import json
 import numpy as np
 from package.resources.utility import createFolder,produce_name_datetime,save_object
 from package.resources.run import parallel_run
+from package.resources.result_cache import Result_Cache, DEFAULT_MAX_SIZE
+from package.resources.network_reader import save_network_list
 
 # modules
 def produce_param_list(params: dict, property_list: list, property: str) -> list[dict]:
@@ -45,9 +47,13 @@ def produce_param_list(params: dict, property_list: list, property: str) -> list
 
 def main(
         RUN_TYPE = 0,
-        BASE_PARAMS_LOAD = "package/constants/base_params.json"
+        BASE_PARAMS_LOAD = "package/constants/base_params.json",
+        CACHE_DIR = None,
+        CACHE_MAX_SIZE = DEFAULT_MAX_SIZE
          ) -> str: 
 
+    cache = Result_Cache(CACHE_DIR, CACHE_MAX_SIZE) if CACHE_DIR is not None else None
+
     if RUN_TYPE == 0:
         #FOR POLARISATION A,B PLOT
         property_varied = "a_attitude"
@@ -88,10 +94,10 @@ def main(
     else:
         params_list = produce_param_list(params, property_values_list, property_varied)
 
-    data_list = parallel_run(params_list) 
+    data_list = parallel_run(params_list, cache = cache)
     createFolder(fileName)
 
-    save_object(data_list, fileName + "/Data", "data_list")
+    save_network_list(data_list, fileName + "/Data", "data_list")
     save_object(params, fileName + "/Data", "base_params")
     save_object(property_varied, fileName + "/Data", "property_varied")
     save_object(property_varied_title, fileName + "/Data", "property_varied_title")
@@ -7,6 +7,7 @@ Created: 10/10/2022
 
 # imports
 import json
+import os
 import numpy as np
 from SALib.sample import sobol
 import numpy.typing as npt
@@ -14,9 +15,12 @@ from copy import deepcopy
 from package.resources.utility import (
     createFolder,
     save_object,
+    load_object,
     produce_name_datetime,
 )
 from package.resources.run import parallel_run_sa,parallel_run_sa_flat
+from package.resources.run_store import Run_Store
+from package.resources.shared_params import Shared_Param_List, save_param_values
 
 # modules
 def generate_problem(
@@ -177,7 +181,7 @@ def produce_param_list_SA_flat(
         #this mutliplies for the different seeds
         for k in base_params_copy["seed_list"]:#NEED IT TO BE SIDE BY SIDE!!!!
             base_params_copy["set_seed"] = k
-            params_list.append(base_params_copy)
+            params_list.append(base_params_copy.copy())
     return params_list
 
 def calc_average_vals(flat_result, param_reps,seed_reps):
@@ -189,14 +193,22 @@ def main(
         N_samples = 1024,
         BASE_PARAMS_LOAD = "package/constants/base_params.json",
         VARIABLE_PARAMS_LOAD = "package/constants/variable_parameters_dict_SA.json",
-        calc_second_order = False
+        calc_second_order = False,
+        CHECKPOINT_DIR = None
          ) -> str: 
-    
-    
+    """
+    Run the sensitivity analysis and save the results. If CHECKPOINT_DIR is given the output of each run is saved there as soon as it
+    finishes, and calling main again with the same CHECKPOINT_DIR resumes the analysis, only computing the runs that are missing.
+    The sampled parameter values are kept in CHECKPOINT_DIR so that a resumed analysis uses the same samples.
+    The runs are given to the workers as a Shared_Param_List, the parameter values are saved once as param_values.npy
+    and each worker makes the parameter dictionaries of its runs from the memory mapped file. The saved params_list_sa is the
+    list of these dictionaries, as before
+    """
 
     # load base params
     f = open(BASE_PARAMS_LOAD)
     base_params = json.load(f)
+    base_params["topology_cache"] = 1  # rows varying other parameters than N, K and prob_rewire share the network of their A row
 
     # load variable params
     f_variable_parameters = open(VARIABLE_PARAMS_LOAD)
@@ -207,23 +219,40 @@ def main(
     AV_reps = len(base_params["seed_list"])
     
 
-    problem, param_values, param_reps = generate_problem(
-        variable_parameters_dict, N_samples, AV_reps, calc_second_order
-    )
+    if CHECKPOINT_DIR is not None and os.path.exists(CHECKPOINT_DIR + "/param_values.pkl"):
+        problem, param_values, param_reps = load_object(CHECKPOINT_DIR, "param_values")
+    else:
+        problem, param_values, param_reps = generate_problem(
+            variable_parameters_dict, N_samples, AV_reps, calc_second_order
+        )
+
+    if CHECKPOINT_DIR is not None:
+        run_store = Run_Store(CHECKPOINT_DIR)
+        save_object((problem, param_values, param_reps), CHECKPOINT_DIR, "param_values")
+    else:
+        run_store = None
 
     print("Dynamic variables: ", len(variable_parameters_dict))
     print("Average reps: ", AV_reps)
     print("Samples: ",param_reps)
     print("Total runs: ", param_reps*AV_reps)
     print("Second order calc", calc_second_order)
+    root = "sensitivity_analysis"
+    fileName = produce_name_datetime(root)
+    print("fileName:", fileName)
+
+    createFolder(fileName)
+
     #ALT FLAT
     seed_reps = len(base_params["seed_list"])
 
-    params_list_sa = produce_param_list_SA_flat(
-        param_values, base_params, variable_parameters_dict
+    param_values_path = (CHECKPOINT_DIR if CHECKPOINT_DIR is not None else fileName + "/Data") + "/param_values.npy"
+    save_param_values(param_values, param_values_path)
+    params_list_sa = Shared_Param_List(
+        param_values_path, base_params, [x["property"] for x in variable_parameters_dict.values()]
     )
     Y_emissions_flow_flat, Y_mu_flat, Y_var_flat, Y_coefficient_of_variance_flat, Y_emissions_flow_change_flat, Y_emissions_stock_flat = parallel_run_sa_flat(
-        params_list_sa
+        params_list_sa, run_store = run_store
     )
 
     Y_emissions_flow = calc_average_vals(Y_emissions_flow_flat, param_reps,seed_reps)
@@ -244,14 +273,8 @@ def main(
     )
     """
 
-    root = "sensitivity_analysis"
-    fileName = produce_name_datetime(root)
-    print("fileName:", fileName)
-
-    createFolder(fileName)
-
     save_object(base_params, fileName + "/Data", "base_params")
-    save_object(params_list_sa, fileName + "/Data", "params_list_sa")
+    save_object(list(params_list_sa), fileName + "/Data", "params_list_sa")  # plain dicts, readable without param_values.npy
     save_object(variable_parameters_dict, fileName + "/Data", "variable_parameters_dict")
     save_object(problem, fileName + "/Data", "problem")
     save_object(Y_emissions_flow, fileName + "/Data", "Y_emissions_flow")
@@ -9,6 +9,7 @@ Created: 10/10/2022
 """
 # imports
 from package.resources.run import generate_data
+from package.resources.network_reader import save_network
 from package.resources.utility import (
     createFolder, 
     save_object, 
@@ -27,7 +28,7 @@ def main(
     Data = generate_data(base_params)  # run the simulation
 
     createFolder(fileName)
-    save_object(Data, fileName + "/Data", "social_network")
+    save_network(Data, fileName + "/Data", "social_network")
     save_object(base_params, fileName + "/Data", "base_params")
 
     return fileName
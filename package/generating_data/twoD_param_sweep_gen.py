@@ -20,6 +20,7 @@ from package.resources.utility import (
 from package.resources.run import (
     parallel_run_sa,
 )
+from package.resources.result_cache import Result_Cache, DEFAULT_MAX_SIZE
 
 # modules
 def produce_param_list_n_double(
@@ -80,9 +81,13 @@ def generate_vals_variable_parameters_and_norms(variable_parameters_dict):
 
 def main(
         BASE_PARAMS_LOAD = "package/constants/base_params.json",
-        VARIABLE_PARAMS_LOAD = "package/constants/variable_parameters_dict_2D.json"
+        VARIABLE_PARAMS_LOAD = "package/constants/variable_parameters_dict_2D.json",
+        CACHE_DIR = None,
+        CACHE_MAX_SIZE = DEFAULT_MAX_SIZE
     ) -> str: 
 
+    cache = Result_Cache(CACHE_DIR, CACHE_MAX_SIZE) if CACHE_DIR is not None else None
+
     # load base params
     f_base_params = open(BASE_PARAMS_LOAD)
     base_params = json.load(f_base_params)
@@ -108,8 +113,9 @@ def main(
         results_mu,
         results_var,
         results_coefficient_of_variance,
-        results_emissions_change
-    ) = parallel_run_sa(params_list)
+        results_emissions_change,
+        results_emissions_stock
+    ) = parallel_run_sa(params_list, cache = cache)
 
 
     createFolder(fileName)
@@ -122,6 +128,7 @@ def main(
     save_object(results_var, fileName + "/Data", "results_var")
     save_object(results_coefficient_of_variance,fileName + "/Data","results_coefficient_of_variance")
     save_object(results_emissions_change, fileName + "/Data", "results_emissions_change")
+    save_object(results_emissions_stock, fileName + "/Data", "results_emissions_stock")
 
     return fileName
 
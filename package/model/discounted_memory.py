@@ -0,0 +1,181 @@
+"""Define the discounted memory used for identities
+A module that defines a circular buffer holding the last cultural_inertia values of a quantity (an individual's average
+attitude, a vector of attitudes, or the same for every individual at once) together with their truncated
+quasi-hyperbolic discounted sum. As the discount weights are geometric the discounted sum can be updated incrementally
+each step, which avoids shifting the whole buffer and recomputing the weighted sum over cultural_inertia past values.
+
+Created: 10/10/2022
+"""
+
+# imports
+from copy import copy
+import numpy as np
+import numpy.typing as npt
+
+# modules
+class Discounted_Memory:
+    """
+    Class to represent the memory of an individual (or of all individuals at once) over the last cultural_inertia steps
+
+    ...
+
+    Attributes
+    ----------
+    cultural_inertia: int
+        the number of steps into the past that are remembered
+    discount_factor: float
+        the degree to which each previous time step has a decreasing importance to an individuals memory. Domain = [0,1]
+    buffer: npt.NDArray[float]
+        circular buffer of shape (cultural_inertia, ...) of past values
+    position: int
+        index in the buffer of the oldest value, which is the next to be overwritten
+    newest_weight: float
+        normalized discount applied to the newest value
+    oldest_weight: float
+        normalized discount that the oldest value would have if it was kept for one more step
+    discounted_value: npt.NDArray[float]
+        discounted sum of the values in memory, e.g the identity of an individual
+    filled_with_init_value: bool
+        whether every value in memory is still the initial value, i.e there has been no update
+
+    Methods
+    -------
+    update(value: npt.NDArray) -> npt.NDArray:
+        Add the newest value, forget the oldest one and return the new discounted sum
+    advance(discounted_value: npt.NDArray):
+        Record an update whose newest value has already been written into the buffer
+    reorder(order: npt.NDArray):
+        Reorder the individuals stored along the second axis of the buffer
+    calc_ordered_buffer() -> npt.NDArray:
+        Return the past values with the newest first
+    """
+
+    def __init__(
+        self,
+        init_value,
+        normalized_discount_array: npt.NDArray,
+        discount_factor: float,
+    ):
+        """
+        Constructs all the necessary attributes for the Discounted_Memory object. The memory is filled with init_value
+
+        Parameters
+        ----------
+        init_value: float or npt.NDArray[float]
+            initial value that fills the whole memory
+        normalized_discount_array: npt.NDArray[float]
+            normalized discounts to past values, of length cultural_inertia. Must be geometric in discount_factor
+        discount_factor: float
+            the degree to which each previous time step has a decreasing importance. Domain = [0,1]
+        """
+        init_value = np.asarray(init_value, dtype=normalized_discount_array.dtype)  # float32 or float64 as the discounts
+
+        self.cultural_inertia = len(normalized_discount_array)
+        self.discount_factor = discount_factor
+        self.buffer = np.tile(init_value, (self.cultural_inertia,) + (1,) * init_value.ndim)
+        self.position = 0
+        self.filled_with_init_value = True
+
+        self.newest_weight = normalized_discount_array[0]
+        self.oldest_weight = self.discount_factor * normalized_discount_array[-1]
+
+        self.discounted_value = np.tensordot(normalized_discount_array, self.buffer, axes=1)[()]  # here discount list is normalized
+
+    def update(self, value) -> npt.NDArray:
+        """
+        Add the newest value and forget the oldest one. Each past value is discounted by one more factor of discount_factor,
+        so the new discounted sum follows from the previous one in O(1) rather than O(cultural_inertia)
+
+        Parameters
+        ----------
+        value: float or npt.NDArray[float]
+            the newest value
+
+        Returns
+        -------
+        discounted_value: npt.NDArray
+            discounted sum of the values in memory
+        """
+        self.discounted_value = (
+            self.discount_factor * self.discounted_value
+            + self.newest_weight * value
+            - self.oldest_weight * self.buffer[self.position]
+        )
+        self.buffer[self.position] = value
+        self.position = (self.position + 1) % self.cultural_inertia
+        self.filled_with_init_value = False
+
+        return self.discounted_value
+
+    def advance(self, discounted_value: npt.NDArray):
+        """
+        Record an update made outside update, e.g by kernels.update_individuals_kernel, which has written the newest value
+        into the buffer at position and calculated the new discounted sum
+
+        Parameters
+        ----------
+        discounted_value: npt.NDArray
+            discounted sum of the values in memory after the update
+
+        Returns
+        -------
+        None
+        """
+        self.discounted_value = discounted_value
+        self.position = (self.position + 1) % self.cultural_inertia
+        self.filled_with_init_value = False
+
+    def reorder(self, order: npt.NDArray):
+        """
+        Reorder the individuals stored along the second axis of the buffer, used when the network is shuffled
+
+        Parameters
+        ----------
+        order: npt.NDArray[int]
+            new order of the individuals
+
+        Returns
+        -------
+        None
+        """
+        if self.filled_with_init_value:  # every row is the same, reorder one and repeat it rather than gathering them all
+            self.buffer = np.tile(self.buffer[0, order], (self.cultural_inertia,) + (1,) * (self.buffer.ndim - 1))
+        else:  # gathering along the second axis does not give a C contiguous array, which the numba kernels write into
+            self.buffer = np.ascontiguousarray(self.buffer[:, order])
+        self.discounted_value = self.discounted_value[order]
+
+    def calc_ordered_buffer(self) -> npt.NDArray:
+        """
+        Return the past values with the newest first, as they are weighted by the normalized discount array
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        npt.NDArray
+            array of shape (cultural_inertia, ...) of past values
+        """
+        return np.roll(self.buffer, -self.position, axis=0)[::-1]
+
+def stack_discounted_memories(memories: list[Discounted_Memory]) -> Discounted_Memory:
+    """
+    Combine the memories of several simulations into one, with the simulations along the second axis of the buffer.
+    Used to step several stochastic seeds at once
+
+    Parameters
+    ----------
+    memories: list[Discounted_Memory]
+        memories with the same cultural_inertia, discount_factor and position
+
+    Returns
+    -------
+    stacked_memory: Discounted_Memory
+        memory whose buffer has shape (cultural_inertia, len(memories), ...)
+    """
+    stacked_memory = copy(memories[0])
+    stacked_memory.buffer = np.stack([x.buffer for x in memories], axis=1)
+    stacked_memory.discounted_value = np.stack([x.discounted_value for x in memories])
+    stacked_memory.filled_with_init_value = all(x.filled_with_init_value for x in memories)
+    return stacked_memory
@@ -0,0 +1,70 @@
+"""Account for the carbon emissions of behaviours
+A module of the emissions calculations shared by the engines: the emissions of each behaviour from its value, their
+sum for each individual and the total of the network, optionally leaving out the green influencers. Every function works
+on arrays with the behaviours along the last axis, whether the values of one individual (M), of a network (NxM) or of
+a batch of networks (SxNxM).
+
+Created: 10/10/2022
+"""
+
+# imports
+import numpy as np
+import numpy.typing as npt
+
+# modules
+def calc_behavioural_emissions(value_matrix: npt.NDArray) -> npt.NDArray:
+    """
+    Return the emissions of each behaviour, the normalized Beta (1 - value)/2, 0 when the green behaviour is fully performed
+
+    Parameters
+    ----------
+    value_matrix: npt.NDArray
+        behavioural values, behaviours along the last axis. Domain = [-1,1]
+
+    Returns
+    -------
+    behavioural_carbon_emissions: npt.NDArray
+        emissions of each behaviour, same shape as value_matrix
+    """
+    return (1 - value_matrix) / 2
+
+def calc_individual_emissions(value_matrix: npt.NDArray) -> tuple[npt.NDArray, npt.NDArray]:
+    """
+    Return the emissions of each individual and each of their behaviours
+
+    Parameters
+    ----------
+    value_matrix: npt.NDArray
+        behavioural values, behaviours along the last axis
+
+    Returns
+    -------
+    individual_carbon_emissions_flow: npt.NDArray
+        emissions of each individual, value_matrix without its last axis
+    behavioural_carbon_emissions: npt.NDArray
+        emissions of each behaviour
+    """
+    behavioural_carbon_emissions = calc_behavioural_emissions(value_matrix)
+    return behavioural_carbon_emissions.sum(axis=-1), behavioural_carbon_emissions
+
+def calc_total_emissions(
+    individual_carbon_emissions_flow: npt.NDArray, green_fountain_state: npt.NDArray = None
+) -> npt.NDArray:
+    """
+    Return the total emissions of the network, leaving out the green influencers if their mask is given
+
+    Parameters
+    ----------
+    individual_carbon_emissions_flow: npt.NDArray
+        emissions of each individual, individuals along the last axis
+    green_fountain_state: npt.NDArray[bool]
+        mask of the green influencers, same shape as individual_carbon_emissions_flow. If None everyone is counted
+
+    Returns
+    -------
+    total_network_emissions: float or npt.NDArray
+        total emissions, one per network for a batch
+    """
+    if green_fountain_state is None:
+        return individual_carbon_emissions_flow.sum(axis=-1)
+    return np.where(green_fountain_state, 0.0, individual_carbon_emissions_flow).sum(axis=-1)
@@ -0,0 +1,200 @@
+"""Define the recorder of time series data
+A module that defines a recorder which preallocates typed arrays for every time series saved during a simulation and
+writes into them in place, instead of appending Python lists. One row is stored every compression_factor steps.
+Only a chosen set of time series (channels) may be recorded, the others are neither allocated nor saved.
+Time series of quantities belonging to individuals ("agent channels") have the individuals along their second axis,
+indexed by the id of the individual.
+
+Created: 10/10/2022
+"""
+
+# imports
+import numpy as np
+import numpy.typing as npt
+
+# modules
+class History_Recorder:
+    """
+    Class to represent the saved time series of a simulation
+
+    ...
+
+    Attributes
+    ----------
+    capacity: int
+        number of rows allocated for each time series, grows if more rows are saved
+    record: list[str]
+        names of the channels to record, if None every channel is recorded
+    available_channels: list[str]
+        names of all channels that could be recorded
+    size: int
+        number of rows saved so far
+    data: dict[str, npt.NDArray]
+        the preallocated array of each time series (channel), keyed by name
+    agent_channels: set[str]
+        names of the channels that have the individuals along their second axis
+
+    Methods
+    -------
+    add_channel(name: str, shape: tuple, dtype = float, agent_channel: bool = False):
+        Preallocate the array of a time series
+    is_recorded(name: str) -> bool:
+        Whether a time series is recorded
+    check_record():
+        Raise an error if record contains unknown channels
+    save(name: str, row: int, value, index = None):
+        Write a value into a time series in place
+    get(name: str) -> npt.NDArray:
+        Return a view of the saved rows of a time series
+    """
+
+    def __init__(self, capacity: int, record: list = None):
+        """
+        Constructs all the necessary attributes for the History_Recorder object.
+
+        Parameters
+        ----------
+        capacity: int
+            number of rows to allocate, normally time_steps_max/compression_factor + 1 including the initial state
+        record: list[str]
+            names of the channels to record e.g ["identity","total_carbon_emissions_flow"], if None every channel is recorded
+        """
+        self.capacity = capacity
+        self.record = record
+        self.size = 0
+        self.data = {}
+        self.agent_channels = set()
+        self.available_channels = []
+
+    def add_channel(self, name: str, shape: tuple, dtype=float, agent_channel: bool = False):
+        """
+        Preallocate the array of a time series, if it is to be recorded
+
+        Parameters
+        ----------
+        name: str
+            name of the time series, e.g "identity"
+        shape: tuple
+            shape of a single saved value
+        dtype: type
+            type of the saved values
+        agent_channel: bool
+            whether the first axis of shape is the individuals, indexed by their id
+
+        Returns
+        -------
+        None
+        """
+        self.available_channels.append(name)
+        if (self.record is not None) and (name not in self.record):
+            return
+
+        self.data[name] = np.zeros((self.capacity,) + tuple(shape), dtype=dtype)
+        if agent_channel:
+            self.agent_channels.add(name)
+
+    def is_recorded(self, name: str) -> bool:
+        """
+        Whether a time series is recorded
+
+        Parameters
+        ----------
+        name: str
+            name of the time series
+
+        Returns
+        -------
+        bool
+        """
+        return name in self.data
+
+    def check_record(self):
+        """
+        Raise an error if record contains channels that were never added, to catch typos in the parameters
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self.record is not None:
+            unknown_channels = set(self.record) - set(self.available_channels)
+            if unknown_channels:
+                raise ValueError(
+                    "Unknown history channels %s, choose from %s" % (sorted(unknown_channels), self.available_channels)
+                )
+
+    def grow(self, row: int):
+        """
+        Enlarge all the arrays so that row can be written, doubling the capacity to keep the number of reallocations low
+
+        Parameters
+        ----------
+        row: int
+            row that is about to be written
+
+        Returns
+        -------
+        None
+        """
+        new_capacity = max(row + 1, 2 * self.capacity)
+        for name, array in self.data.items():
+            new_array = np.zeros((new_capacity,) + array.shape[1:], dtype=array.dtype)
+            new_array[: self.capacity] = array
+            self.data[name] = new_array
+        self.capacity = new_capacity
+
+    def save(self, name: str, row: int, value, index=None):
+        """
+        Write a value into a time series in place, does nothing if the time series is not recorded
+
+        Parameters
+        ----------
+        name: str
+            name of the time series
+        row: int
+            row to write, time divided by the compression_factor
+        value: float or npt.NDArray
+            the value to save
+        index: int or npt.NDArray[int]
+            if given, the individual(s) of an agent channel that the value belongs to
+
+        Returns
+        -------
+        None
+        """
+        if name not in self.data:
+            return
+        if row >= self.capacity:
+            self.grow(row)
+        if index is None:
+            self.data[name][row] = value
+        else:
+            self.data[name][row, index] = value
+        self.size = max(self.size, row + 1)
+
+    def get(self, name: str) -> npt.NDArray:
+        """
+        Return a view of the saved rows of a time series
+
+        Parameters
+        ----------
+        name: str
+            name of the time series
+
+        Returns
+        -------
+        npt.NDArray
+            array of shape (size, ...) of the saved values
+        """
+        return self.data[name][: self.size]
+
+    def __getstate__(self) -> dict:
+        # only the saved rows are pickled
+        state = self.__dict__.copy()
+        state["data"] = {name: array[: self.size] for name, array in self.data.items()}
+        state["capacity"] = self.size
+        return state
@@ -0,0 +1,334 @@
+"""Compiled kernels for the hot loops of a time step
+A module of loop based versions of the most expensive parts of a time step, compiled with numba when it is installed.
+Each kernel fuses a chain of NumPy operations (e.g the abs, multiply, exp and row normalisation of the link strengths)
+into a single pass over the individuals or connections, writing straight into its output without the NxN temporaries
+that NumPy creates for every operation. The individual update kernel also updates the discounted memory (identities, or
+attitudes in the "behavioural_independence" case) in the same pass. The social influence is not part of it: it uses
+the link strengths that are recomputed between the individual update and the next social influence, so it stays a
+separate matrix product.
+
+They are used when the parameters contain "kernel_backend": "numba". numba is optional, if it is not installed the
+NumPy code in network.py and network_matrix.py is used instead. The kernels give the same results as the NumPy code up
+to rounding.
+
+Created: 10/10/2022
+"""
+
+# imports
+import math
+import warnings
+import numpy as np
+import numpy.typing as npt
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+KERNEL_BACKENDS = ["numpy", "numba"]
+
+# modules
+def check_kernel_backend(kernel_backend: str) -> str:
+    """
+    Check the requested kernel backend, falling back to "numpy" with a warning if numba is requested but not installed
+
+    Parameters
+    ----------
+    kernel_backend: str
+        "numpy" or "numba"
+
+    Returns
+    -------
+    str
+        the backend that will be used
+    """
+    if kernel_backend not in KERNEL_BACKENDS:
+        raise ValueError("Unknown kernel_backend %s, choose from %s" % (kernel_backend, KERNEL_BACKENDS))
+    if kernel_backend == "numba" and not NUMBA_AVAILABLE:
+        warnings.warn("numba is not installed, using the numpy kernel_backend instead")
+        return "numpy"
+    return kernel_backend
+
+def jit(func):
+    # compile if numba is available, otherwise leave as plain Python (never called in that case)
+    if NUMBA_AVAILABLE:
+        return njit(cache=True)(func)
+    return func
+
+@jit
+def calc_weighting_matrix_kernel(
+    attribute_array: npt.NDArray,
+    adjacency_matrix: npt.NDArray,
+    confirmation_bias: float,
+) -> tuple[npt.NDArray, npt.NDArray]:
+    """
+    Calculate the row normalized link strengths and the total attribute difference with neighbours of each individual,
+    as Network.update_weightings does for a dense network
+
+    Parameters
+    ----------
+    attribute_array: npt.NDArray
+        array of length N of the attribute (identity) that determines link strength
+    adjacency_matrix: npt.NDArray
+        NxN array of the network structure
+    confirmation_bias: float
+        how strongly link strength falls with the difference in attribute
+
+    Returns
+    -------
+    weighting_matrix: npt.NDArray
+        NxN row normalized link strengths
+    total_identity_differences: npt.NDArray
+        sum over neighbours of the absolute difference in attribute of each individual
+    """
+    N = attribute_array.shape[0]
+    weighting_matrix = np.empty((N, N), dtype=attribute_array.dtype)
+    total_identity_differences = np.empty(N, dtype=attribute_array.dtype)
+
+    for i in range(N):
+        row_sum = 0.0
+        difference_sum = 0.0
+        for j in range(N):
+            a = adjacency_matrix[i, j]
+            if a != 0.0:
+                difference = abs(attribute_array[i] - attribute_array[j])
+                w = a * math.exp(-confirmation_bias * difference)
+                weighting_matrix[i, j] = w
+                row_sum += w
+                difference_sum += abs(a * difference)
+            else:
+                weighting_matrix[i, j] = 0.0
+        for j in range(N):
+            weighting_matrix[i, j] /= row_sum
+        total_identity_differences[i] = difference_sum
+
+    return weighting_matrix, total_identity_differences
+
+@jit
+def calc_sparse_weighting_kernel(
+    attribute_array: npt.NDArray,
+    indptr: npt.NDArray,
+    indices: npt.NDArray,
+    adjacency_data: npt.NDArray,
+    confirmation_bias: float,
+) -> tuple[npt.NDArray, npt.NDArray]:
+    """
+    Calculate the row normalized link strengths of the connections of a CSR adjacency matrix and the total attribute difference
+    with neighbours of each individual
+
+    Parameters
+    ----------
+    attribute_array: npt.NDArray
+        array of length N of the attribute (identity) that determines link strength
+    indptr, indices, adjacency_data: npt.NDArray
+        CSR structure and values of the adjacency matrix
+    confirmation_bias: float
+        how strongly link strength falls with the difference in attribute
+
+    Returns
+    -------
+    weighting_data: npt.NDArray
+        row normalized link strength of each connection, in the order of the CSR structure
+    total_identity_differences: npt.NDArray
+        sum over neighbours of the absolute difference in attribute of each individual
+    """
+    N = attribute_array.shape[0]
+    weighting_data = np.empty(indices.shape[0], dtype=attribute_array.dtype)
+    total_identity_differences = np.empty(N, dtype=attribute_array.dtype)
+
+    for i in range(N):
+        row_sum = 0.0
+        difference_sum = 0.0
+        for e in range(indptr[i], indptr[i + 1]):
+            difference = abs(attribute_array[i] - attribute_array[indices[e]])
+            w = adjacency_data[e] * math.exp(-confirmation_bias * difference)
+            weighting_data[e] = w
+            row_sum += w
+            difference_sum += adjacency_data[e] * difference
+        for e in range(indptr[i], indptr[i + 1]):
+            weighting_data[e] /= row_sum
+        total_identity_differences[i] = difference_sum
+
+    return weighting_data, total_identity_differences
+
+@jit
+def calc_behavioural_weighting_kernel(
+    attitudes_star_matrix: npt.NDArray,
+    indptr: npt.NDArray,
+    edge_columns: npt.NDArray,
+    edge_adjacency: npt.NDArray,
+    confirmation_bias: float,
+) -> npt.NDArray:
+    """
+    Calculate the row normalized link strength of each connection for each behaviour from the similarity of discounted attitudes,
+    as Network.update_behavioural_weightings does
+
+    Parameters
+    ----------
+    attitudes_star_matrix: npt.NDArray
+        NxM array of time discounted attitudes
+    indptr: npt.NDArray
+        start of the connections of each row, connections are in CSR order
+    edge_columns, edge_adjacency: npt.NDArray
+        column and adjacency value of each connection
+    confirmation_bias: float
+        how strongly link strength falls with the difference in attitude
+
+    Returns
+    -------
+    weighting_array: npt.NDArray
+        ExM row normalized link strengths
+    """
+    N, M = attitudes_star_matrix.shape
+    weighting_array = np.empty((edge_columns.shape[0], M), dtype=attitudes_star_matrix.dtype)
+    row_sums = np.empty(M)
+
+    for i in range(N):
+        row_sums[:] = 0.0
+        for e in range(indptr[i], indptr[i + 1]):
+            j = edge_columns[e]
+            for m in range(M):
+                w = edge_adjacency[e] * math.exp(-confirmation_bias * abs(attitudes_star_matrix[i, m] - attitudes_star_matrix[j, m]))
+                weighting_array[e, m] = w
+                row_sums[m] += w
+        for e in range(indptr[i], indptr[i + 1]):
+            for m in range(M):
+                weighting_array[e, m] /= row_sums[m]
+
+    return weighting_array
+
+@jit
+def calc_behavioural_influence_kernel(
+    behavioural_weighting_array: npt.NDArray,
+    behavioural_attitude_matrix: npt.NDArray,
+    indptr: npt.NDArray,
+    edge_columns: npt.NDArray,
+) -> npt.NDArray:
+    """
+    Calculate the influence of neighbours on each behaviour weighted by the behaviour's link strengths
+
+    Parameters
+    ----------
+    behavioural_weighting_array: npt.NDArray
+        ExM link strengths
+    behavioural_attitude_matrix: npt.NDArray
+        NxM behavioural attitudes
+    indptr: npt.NDArray
+        start of the connections of each row
+    edge_columns: npt.NDArray
+        column of each connection
+
+    Returns
+    -------
+    neighbour_influence: npt.NDArray
+        NxM influence of neighbours
+    """
+    N, M = behavioural_attitude_matrix.shape
+    neighbour_influence = np.zeros((N, M), dtype=behavioural_attitude_matrix.dtype)
+
+    for i in range(N):
+        for e in range(indptr[i], indptr[i + 1]):
+            j = edge_columns[e]
+            for m in range(M):
+                neighbour_influence[i, m] += behavioural_weighting_array[e, m] * behavioural_attitude_matrix[j, m]
+
+    return neighbour_influence
+
+@jit
+def update_individuals_kernel(
+    attitude_matrix: npt.NDArray,
+    threshold_matrix: npt.NDArray,
+    phi_array: npt.NDArray,
+    social_component_matrix: npt.NDArray,
+    green_fountain_state: npt.NDArray,
+    memory_buffer: npt.NDArray,
+    memory_position: int,
+    discounted_value: npt.NDArray,
+    discount_factor: float,
+    newest_weight: float,
+    oldest_weight: float,
+    remember_attitudes: bool,
+) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
+    """
+    Update the values, attitudes, average attitudes, emissions and discounted memory of every individual in one pass, as
+    Network_Matrix.update_individuals followed by Discounted_Memory.update does. The memory holds either the average
+    attitude of each individual (its identity) or, in the "behavioural_independence" case, every attitude
+
+    Parameters
+    ----------
+    attitude_matrix, threshold_matrix, social_component_matrix: npt.NDArray
+        NxM arrays of the current attitudes, thresholds and social influence
+    phi_array: npt.NDArray
+        social susceptibility of each behaviour
+    green_fountain_state: npt.NDArray
+        mask of green influencers, whose first attitude stays at 1
+    memory_buffer: npt.NDArray
+        circular buffer of the memory with shape (cultural_inertia, N, K), K = M if remember_attitudes else 1. The newest
+        value is written into it in place
+    memory_position: int
+        index in the buffer of the oldest value
+    discounted_value: npt.NDArray
+        NxK discounted sum of the memory before the update
+    discount_factor, newest_weight, oldest_weight: float
+        as in Discounted_Memory
+    remember_attitudes: bool
+        whether the memory holds the attitudes rather than their average
+
+    Returns
+    -------
+    value_matrix, new_attitude_matrix: npt.NDArray
+        NxM values (from the attitudes before the update) and updated attitudes
+    av_behaviour_array: npt.NDArray
+        mean updated attitude of each individual
+    individual_carbon_emissions_flow: npt.NDArray
+        emissions of each individual
+    behavioural_carbon_emissions: npt.NDArray
+        NxM emissions of each behaviour
+    new_discounted_value: npt.NDArray
+        NxK discounted sum of the memory after the update, e.g the identities
+    """
+    N, M = attitude_matrix.shape
+    K = memory_buffer.shape[2]
+    dtype = attitude_matrix.dtype
+    value_matrix = np.empty((N, M), dtype=dtype)
+    new_attitude_matrix = np.empty((N, M), dtype=dtype)
+    behavioural_carbon_emissions = np.empty((N, M), dtype=dtype)
+    av_behaviour_array = np.empty(N, dtype=dtype)
+    individual_carbon_emissions_flow = np.empty(N, dtype=dtype)
+    new_discounted_value = np.empty((N, K), dtype=discounted_value.dtype)
+
+    for i in range(N):
+        attitude_sum = 0.0
+        emissions_sum = 0.0
+        for m in range(M):
+            value = attitude_matrix[i, m] - threshold_matrix[i, m]
+            value_matrix[i, m] = value
+            attitude = (1 - phi_array[m]) * attitude_matrix[i, m] + phi_array[m] * social_component_matrix[i, m]
+            if m == 0 and green_fountain_state[i]:
+                attitude = 1.0
+            new_attitude_matrix[i, m] = attitude
+            attitude_sum += attitude
+            emissions = (1 - value) / 2
+            behavioural_carbon_emissions[i, m] = emissions
+            emissions_sum += emissions
+        av_behaviour_array[i] = attitude_sum / M
+        individual_carbon_emissions_flow[i] = emissions_sum
+
+        for k in range(K):
+            newest = new_attitude_matrix[i, k] if remember_attitudes else av_behaviour_array[i]
+            new_discounted_value[i, k] = (
+                discount_factor * discounted_value[i, k]
+                + newest_weight * newest
+                - oldest_weight * memory_buffer[memory_position, i, k]
+            )
+            memory_buffer[memory_position, i, k] = newest
+
+    return (
+        value_matrix,
+        new_attitude_matrix,
+        av_behaviour_array,
+        individual_carbon_emissions_flow,
+        behavioural_carbon_emissions,
+        new_discounted_value,
+    )
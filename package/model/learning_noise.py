@@ -0,0 +1,181 @@
+"""Draw the social learning error of each step in blocks
+A module that defines the source of the learning error added to the social influence every step. Instead of one NxM
+draw per step the error of many steps is drawn at once as a (steps, N, M) block and handed out one step at a time.
+Optionally the next block is drawn on a background thread while the current one is used, NumPy releases the GIL
+while filling the block so the draws overlap with the step.
+
+A stream's normal draws are the same whether they are made one at a time or many at once, so the error of every step
+does not depend on the block size or on whether the background thread is used, and neither do the results.
+
+Created: 10/10/2022
+"""
+
+# imports
+import os
+import numpy.typing as npt
+from concurrent.futures import ThreadPoolExecutor
+
+NOISE_EXECUTOR = None
+NOISE_EXECUTOR_PID = None
+
+# modules
+def get_noise_executor() -> ThreadPoolExecutor:
+    """
+    Return the thread that draws blocks in the background, shared by all the simulations of the process and made again in a
+    forked worker as the thread of the parent process does not exist there
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    ThreadPoolExecutor
+    """
+    global NOISE_EXECUTOR, NOISE_EXECUTOR_PID
+    if NOISE_EXECUTOR is None or NOISE_EXECUTOR_PID != os.getpid():
+        NOISE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="learning_noise")
+        NOISE_EXECUTOR_PID = os.getpid()
+    return NOISE_EXECUTOR
+
+class Learning_Noise:
+    """
+    Class to represent the social learning error of a simulation, drawn in blocks of steps
+
+    ...
+
+    Attributes
+    ----------
+    rng: np.random.RandomState or np.random.Generator
+        stream the error is drawn from, used by nothing else once the steps start
+    scale: float
+        standard deviation of the error
+    shape: tuple[int]
+        shape of the error of one step, (N, M)
+    block_steps: int
+        number of steps drawn at once
+    background: bool
+        whether the next block is drawn on a background thread
+    steps_left: int
+        steps of the run not yet drawn, blocks are cut short so no more is drawn than the run needs. None if unknown
+    block: npt.NDArray
+        current block of shape (steps, N, M)
+    position: int
+        step of the current block handed out next
+    pending: concurrent.futures.Future
+        next block being drawn in the background
+    next_block: npt.NDArray
+        next block once drawn, kept when the object is pickled with a block pending
+
+    Methods
+    -------
+    next() -> npt.NDArray:
+        Return the error of the next step
+    """
+
+    def __init__(self, rng, scale: float, shape: tuple, block_steps: int = 1, background: bool = False, steps_left: int = None):
+        """
+        Constructs all the necessary attributes for the Learning_Noise object.
+
+        Parameters
+        ----------
+        rng: np.random.RandomState or np.random.Generator
+            stream the error is drawn from
+        scale: float
+            standard deviation of the error
+        shape: tuple[int]
+            shape of the error of one step, (N, M)
+        block_steps: int
+            number of steps drawn at once
+        background: bool
+            whether the next block is drawn on a background thread
+        steps_left: int
+            number of steps of the run, None if unknown
+        """
+        if block_steps < 1:
+            raise ValueError("noise_block_steps must be at least 1, got %s" % block_steps)
+
+        self.rng = rng
+        self.scale = scale
+        self.shape = shape
+        self.block_steps = int(block_steps)
+        self.background = bool(background)
+        self.steps_left = steps_left
+
+        self.block = None
+        self.position = 0
+        self.pending = None
+        self.next_block = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        if self.pending is not None:  # a future cannot be pickled, keep its block instead
+            state["next_block"] = self.pending.result()
+            state["pending"] = None
+        return state
+
+    def reserve_steps(self) -> int:
+        """
+        Return the number of steps of the next block and count them as drawn
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        steps: int
+            block_steps, or fewer at the end of the run, and 1 for steps past the expected end
+        """
+        steps = self.block_steps
+        if self.steps_left is not None:
+            steps = max(1, min(steps, self.steps_left))
+            self.steps_left -= steps
+        return steps
+
+    def draw_block(self, steps: int) -> npt.NDArray:
+        """
+        Draw the error of several steps
+
+        Parameters
+        ----------
+        steps: int
+            number of steps
+
+        Returns
+        -------
+        npt.NDArray
+            block of shape (steps, N, M)
+        """
+        return self.rng.normal(loc=0, scale=self.scale, size=(steps,) + self.shape)
+
+    def next(self) -> npt.NDArray:
+        """
+        Return the error of the next step, drawing a new block when the current one is used up
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        npt.NDArray
+            NxM learning error
+        """
+        if self.block is None or self.position == len(self.block):
+            if self.pending is not None:
+                self.block = self.pending.result()
+                self.pending = None
+            elif self.next_block is not None:
+                self.block = self.next_block
+                self.next_block = None
+            else:
+                self.block = self.draw_block(self.reserve_steps())
+            self.position = 0
+
+            if self.background and (self.steps_left is None or self.steps_left > 0):
+                self.pending = get_noise_executor().submit(self.draw_block, self.reserve_steps())
+
+        learning_error = self.block[self.position]
+        self.position += 1
+        return learning_error
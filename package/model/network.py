@@ -8,11 +8,24 @@ Created: 10/10/2022
 """
 
 # imports
+import time
 import numpy as np
 import networkx as nx
 import numpy.typing as npt
+import scipy.sparse as sp
 from package.model.individuals import Individual
 from package.model.one_m_green_influencer import Individual_one_m_green_influencer
+from package.model.history import History_Recorder
+from package.model import kernels
+from package.model.profiling import Step_Profiler
+from package.model.emissions import calc_total_emissions
+from package.model.random_streams import create_rng_streams, create_topology_rng, draw_integers
+from package.model.small_world import watts_strogatz_edges
+from package.model.topology_cache import TOPOLOGY_CACHE, calc_structure_path, load_structure, save_structure
+from package.model.learning_noise import Learning_Noise
+
+PRECISIONS = ["float64", "float32"]
+NETWORK_GENERATORS = ["networkx", "numpy"]
 
 # modules
 class Network:
@@ -30,13 +43,56 @@ class Network:
     ----------
     set_seed : int
         stochastic seed of simulation for reproducibility
+    rng_type: str
+        "legacy" (default) or "generator", the kind of random number streams, see random_streams.py
+    construction_rng: np.random.RandomState or np.random.Generator
+        random number stream used to build the network
+    noise_rng: np.random.RandomState or np.random.Generator
+        random number stream used for the learning noise of each step
     alpha_change : char
         determines how  and how often agent's re-asses their connections strength in the social network
     save_timeseries_data : bool
         whether or not to save data. Set to 0 if only interested in end state of the simulation.
+    record: list[str]
+        optional list of time series to save e.g ["identity","total_carbon_emissions_flow"], by default all are saved.
+        The names are those of the history_* attributes without the "history_" prefix, time is always saved
     compression_factor: int
         how often data is saved. If set to 1 its every step, then 10 is every 10th steps. Higher value gives lower
         resolution for graphs but more managable saved or end object size
+    sparse_network: bool
+        whether to store the adjacency_matrix and weighting_matrix as scipy CSR sparse arrays. Weightings are then only calculated
+        for existing connections, making each step O(N*K) instead of O(N^2). Needed for very large N
+    incremental_weighting: bool
+        whether, in the "dynamic_culturally_determined_weights" case, to only recompute the link strengths of individuals whose
+        identity, or whose neighbour's identity, moved by more than weighting_tolerance since their links were last computed
+    weighting_tolerance: float
+        change in identity below which link strengths are not recomputed. With 0 the incremental update gives the same result
+        as recomputing every link
+    weighting_identity_array: npt.NDArray[float]
+        identity of each individual when its link strengths were last computed, only if incremental_weighting
+    kernel_backend: str
+        "numpy" (default) or "numba". With "numba" the link strength updates (and the individual update of the matrix engine)
+        use the compiled loops in kernels.py. Falls back to "numpy" with a warning if numba is not installed
+    precision: str
+        "float64" (default) or "float32". With "float32" attitudes, thresholds, identities, link strengths and the saved time
+        series are single precision and a dense adjacency_matrix is stored as booleans, halving the memory they use. The
+        emissions stock is still accumulated in double precision
+    dtype: np.dtype
+        floating point type of the state, set by precision
+    profiler: Step_Profiler
+        number of calls and time spent in each stage of next_step (and in the construction), only timed if
+        parameters["profile"] is set
+    convergence_window: int
+        number of steps over which average identity, identity variance and emissions flow per behaviour must all stay within
+        convergence_tolerance for the simulation to be considered converged. If 0 (default) convergence is not checked
+    convergence_tolerance: float
+        largest change (max - min) over the window allowed in each of the measures, required if convergence_window is set
+    convergence_buffer: npt.NDArray[float]
+        circular buffer of shape (convergence_window, 3) of the last values of the measures
+    converged: bool
+        whether the simulation has converged, runs may then be stopped early
+    t_converged: int
+        time step at which the run was stopped and the emissions stock extrapolated, None if it ran to the end
     t: float
         keep track of time
     M: int
@@ -60,6 +116,9 @@ class Network:
         the extent to which individuals will only pay attention to other idividuals who are similar to them in social interactions
     learning_error_scale: float
         the standard deviation of a guassian distribution centered on zero, representing the imperfection of learning in social transmission
+    learning_noise: Learning_Noise
+        source of the learning error of each step, drawn in blocks of "noise_block_steps" steps (default 1), on a
+        background thread if "noise_background" is set
     phi_array: npt.NDArray[float]
         list of degree of social susceptibility or conspicous consumption of the different behaviours. 
     homophily: float
@@ -80,11 +139,35 @@ class Network:
         list of Individuals objects containing behaviours of each individual
     adjacency_matrix: npt.NDArray[bool]
         array giveing social network structure where 1 represents a connection between agents and 0 no connection. It is symetric about the diagonal
+    edge_rows: npt.NDArray[int]
+        row of each of the E connections of the adjacency_matrix, in CSR order. Only used if sparse_network or in the "behavioural_independence" case
+    edge_columns: npt.NDArray[int]
+        column of each connection, only used in the "behavioural_independence" case
+    edge_adjacency: npt.NDArray[float]
+        adjacency_matrix value of each connection, only used in the "behavioural_independence" case
+    edge_row_matrix: sp.csr_array
+        NxE array summing values over the connections of each row, only used in the "behavioural_independence" case
+    behavioural_weighting_array: npt.NDArray[float]
+        ExM array of the link strength of each connection for each behaviour, only used in the "behavioural_independence" case
     weighting_matrix: npt.NDArray[float]
         an NxN array how how much each agent values the opinion of their neighbour. Note that is it not symetric and agent i doesn't need to value the
         opinion of agent j as much as j does i's opinion
+    network_generator: str
+        "networkx" (default) or "numpy". With "numpy" the small world network is generated as arrays by small_world.py and
+        a networkx graph is only made if it is kept, which is much faster for large N but gives different networks
+    keep_network_graph: bool
+        whether to keep the networkx graph as network, default 1
+    topology_cache: bool
+        whether to reuse the network of an earlier run of this process with the same N + green_N, K, prob_rewire, set_seed
+        and network_generator, default 0. The cached adjacency_matrix and network are shared and read only
+    topology_cache_dir: str
+        folder in which the connections of each network are saved and reused across processes, None (default) for none
+    number_of_edges: int
+        number of connections in the network
+    network_density: float
+        fraction of the possible connections that exist
     network: nx.Graph
-        a networkx watts strogatz small world graph
+        a networkx watts strogatz small world graph, None if parameters["keep_network_graph"] is 0
     social_component_matrix: npt.NDArray[float]
         NxM array of influence of neighbours on an individual's attitudes towards M behaviours
     average_identity: float
@@ -101,24 +184,30 @@ class Network:
         total change in agent link strength from previous to current step, a measure of convergece should tend to zero
     total_carbon_emissions: float
         total emissions due to behavioural choices of agents. Note the difference between this and carbon_emissions list for each behaviour
-    history_weighting_matrix: list[npt.NDArray[float]]
-        time series of weighting_matrix
-    history_social_component_matrix: list[npt.NDArray[float]]
+    history: History_Recorder
+        preallocated arrays of all saved time series, only if save_timeseries_data. The history_* attributes below are views of it
+    history_weighting_matrix: npt.NDArray[float]
+        time series of weighting_matrix. If sparse_network each row is the data array of the CSR weighting matrix
+    history_social_component_matrix: npt.NDArray[float]
         time series of social_component_matrix
-    history_var_identity: list[float]
+    history_var_identity: npt.NDArray[float]
         time series of var_identity
-    history_time: list[float]
+    history_time: npt.NDArray[int]
         time series of time
-    history_total_carbon_emission: list[float]
-        time series of total_carbon_emissions in the system, not the carbon_emissions for each behaviour
-    history_weighting_matrix_convergence: list[float]
+    history_total_carbon_emissions_flow: npt.NDArray[float]
+        time series of total_carbon_emissions_flow in the system, not the carbon_emissions for each behaviour
+    history_weighting_matrix_convergence: npt.NDArray[float]
         time series of weighting_matrix_convergence
-    history_average_identity: list[float]
+    history_average_identity: npt.NDArray[float]
         time series of average agent identity
-    history_std_identity: list[float]
+    history_std_identity: npt.NDArray[float]
         time series of std_identity
-    history_min_identity: list[float]
+    history_min_identity: npt.NDArray[float]
         time series of min_identity
+    history_identity, history_av_behaviour, history_individual_carbon_emissions_flow: npt.NDArray[float]
+        time series of each individual's identity, average attitude and emissions, of shape (time, N) with individuals ordered by id
+    history_behaviour_values, history_behaviour_attitudes, history_behaviour_thresholds, history_behavioural_carbon_emissions: npt.NDArray[float]
+        time series of each individual's behaviours, of shape (time, N, M) with individuals ordered by id
     
 
     Methods
@@ -129,30 +218,70 @@ class Network:
         Returns row normalized discount array
     create_weighting_matrix()-> tuple[npt.NDArray, npt.NDArray, nx.Graph]:
         Create small world social network
-    produce_circular_list(list) -> list:
-        Makes an ordered list circular so that the start and end values are close in value
-    partial_shuffle(l, swap_reps) -> list:
-        Partially shuffle a list using Fisher Yates shuffle
+    create_small_world_weighting_matrix(n: int) -> tuple[npt.NDArray, npt.NDArray, nx.Graph]:
+        Create the adjacency and row normalized weighting matrices of a small world network of n individuals, cached
+    generate_topology(n: int) -> dict:
+        Generate a small world network of n individuals, or read its connections from topology_cache_dir
+    calc_network_density() -> float:
+        Fraction of the possible connections that exist, from the number of edges
+    calc_circular_order(order: npt.NDArray) -> npt.NDArray:
+        Makes an ordering circular so that the start and end values are close in value
+    calc_partial_shuffle(order: npt.NDArray) -> npt.NDArray:
+        Partially shuffle an ordering using random swaps
+    calc_shuffle_order(identity_array: npt.NDArray) -> npt.NDArray:
+        Order individuals by identity, make it circular and partially shuffle it
     generate_init_data_behaviours() -> tuple:
         Generate the initial values for agent behavioural attitudes and thresholds
     create_agent_list() -> list:
         Create list of Individual objects that each have behaviours
+    init_agents():
+        Create the agents, add green influencers and order them in the network by identity
+    get_behavioural_attitude_matrix() -> npt.NDArray:
+        Gather the NxM behavioural attitudes of all individuals
+    get_attitudes_star_matrix() -> npt.NDArray:
+        Gather the NxM discounted past attitudes of all individuals
+    get_identity_array() -> npt.NDArray:
+        Gather the identities of all individuals
+    get_id_array() -> npt.NDArray:
+        Gather the ids of all individuals
+    get_individual_emissions_flow_array() -> npt.NDArray:
+        Gather the emissions of all individuals
+    get_green_fountain_state() -> npt.NDArray:
+        Gather which individuals are green influencers
     calc_ego_influence_degroot() ->  npt.NDArray:
         Calculate the influence of neighbours using the Degroot model of weighted aggregation
     calc_social_component_matrix() ->  npt.NDArray:
         Combine neighbour influence and social learning error to updated individual behavioural attitudes
     calc_total_weighting_matrix_difference(matrix_before: npt.NDArray, matrix_after: npt.NDArray)-> float:
         Calculate the total change in link strength over one time step
+    calc_sparse_weighting_matrix(attribute_array: npt.NDArray) -> tuple[sp.csr_array, npt.NDArray]:
+        Calculate the row normalized link strengths only over existing connections
     update_weightings()-> float:
         Update the link strength array according to the new agent identities
+    calc_total_identity_differences(identity_array: npt.NDArray) -> npt.NDArray:
+        Calculate the total difference in identity of each individual with its neighbours
+    update_weightings_incremental() -> tuple[npt.NDArray, npt.NDArray, float]:
+        Update only the link strengths of individuals whose identity, or whose neighbours' identity, has changed
+    init_behavioural_weightings():
+        List the connections of the network and give each the same link strength for every behaviour
+    update_behavioural_weightings() -> npt.NDArray:
+        Update the link strengths of all behaviours at once according to the agent attitudes
     calc_total_emissions() -> int:
         Calculate total carbon emissions of N*M behaviours
     calc_network_identity() ->  tuple[float, float, float, float]:
         Return various identity properties
     update_individuals():
         Update Individual objects with new information
+    create_history_recorder(time_steps_max: int, record: list) -> History_Recorder:
+        Preallocate the time series of the network and individuals
     save_timeseries_data_network():
         Save time series data
+    get_columnar_data() -> dict:
+        Gather the results of the simulation as arrays and scalars for save_columnar
+    check_convergence() -> bool:
+        Whether the network measures have stayed within convergence_tolerance over the last convergence_window steps
+    extrapolate_emissions_stock(time_steps_max: int):
+        Extend the emissions stock of a converged run to the end of the horizon
     next_step():
         Push the simulation forwards one time step
     """
@@ -168,14 +297,40 @@ class Network:
 
         """
 
+        construction_start_time = time.perf_counter()
+        self.profiler = Step_Profiler(parameters.get("profile", 0))
+
         self.set_seed = parameters["set_seed"]
-        np.random.seed(self.set_seed)
+        self.rng_type = parameters.get("rng", "legacy")
+        self.construction_rng, self.noise_rng = create_rng_streams(self.set_seed, self.rng_type)
 
         self.K = int(round(parameters["K"]))  # round due to the sampling method producing floats in the Sobol Sensitivity Analysis
         self.prob_rewire = parameters["prob_rewire"]
         self.alpha_change = parameters["alpha_change"]
         self.save_timeseries_data = parameters["save_timeseries_data"]
         self.compression_factor = parameters["compression_factor"]
+        self.sparse_network = parameters.get("sparse_network", 0)
+        self.network_generator = parameters.get("network_generator", "networkx")
+        if self.network_generator not in NETWORK_GENERATORS:
+            raise ValueError("Unknown network_generator %s, choose from %s" % (self.network_generator, NETWORK_GENERATORS))
+        self.keep_network_graph = parameters.get("keep_network_graph", 1)
+        self.topology_cache = parameters.get("topology_cache", 0)
+        self.topology_cache_dir = parameters.get("topology_cache_dir")
+        self.incremental_weighting = parameters.get("incremental_weighting", 0)
+        self.weighting_tolerance = parameters.get("weighting_tolerance", 0.0)
+        self.convergence_window = parameters.get("convergence_window", 0)
+        self.convergence_tolerance = parameters.get("convergence_tolerance")
+        if self.convergence_window and self.convergence_tolerance is None:
+            raise ValueError("convergence_window is set, convergence_tolerance must be given too")
+        self.kernel_backend = kernels.check_kernel_backend(parameters.get("kernel_backend", "numpy"))
+        self.precision = parameters.get("precision", "float64")
+        if self.precision not in PRECISIONS:
+            raise ValueError("Unknown precision %s, choose from %s" % (self.precision, PRECISIONS))
+        self.dtype = np.dtype(self.precision)
+        self.converged = False
+        self.t_converged = None
+        if self.convergence_window:
+            self.convergence_buffer = np.full((self.convergence_window, 3), np.nan)  # NaN until the window is filled
 
         # time
         self.t = 0
@@ -189,17 +344,17 @@ class Network:
         self.cultural_inertia = int(round(parameters["cultural_inertia"]))
 
         # time discounting
-        self.discount_factor = parameters["discount_factor"]
+        self.discount_factor = float(parameters["discount_factor"])  # a Python float keeps float32 arrays in float32
         self.normalized_discount_array = self.calc_normalized_discount_array()
 
         # social learning and bias
-        self.confirmation_bias = parameters["confirmation_bias"]
+        self.confirmation_bias = float(parameters["confirmation_bias"])
         self.learning_error_scale = parameters["learning_error_scale"]
 
         # social influence of behaviours
         self.phi_lower = parameters["phi_lower"]
         self.phi_upper = parameters["phi_upper"]
-        self.phi_array = np.linspace(self.phi_lower, self.phi_upper, num=self.M)
+        self.phi_array = np.linspace(self.phi_lower, self.phi_upper, num=self.M, dtype=self.dtype)
 
         # network homophily
         self.homophily = parameters["homophily"]  # 0-1
@@ -222,9 +377,11 @@ class Network:
             ) = self.create_weighting_matrix()
 
         if self.alpha_change == "behavioural_independence":
-            self.weighting_matrix_list = [self.weighting_matrix]*self.M
+            self.init_behavioural_weightings()
 
-        self.network_density = nx.density(self.network)
+        self.network_density = self.calc_network_density()
+        if not self.keep_network_graph:
+            self.network = None  # the graph is only needed to build the adjacency matrix
         
         self.a_attitude = parameters["a_attitude"]
         self.b_attitude = parameters["b_attitude"]
@@ -236,24 +393,44 @@ class Network:
             self.threshold_matrix_init,
         ) = self.generate_init_data_behaviours()
 
-        self.agent_list = self.create_agent_list()
-
-        if self.green_N > 0:
-            self.add_green_influencers_list()
-            self.N = len(self.agent_list)
-
-        self.shuffle_agent_list()#partial shuffle of the list based on identity
-
+        if self.save_timeseries_data:
+            self.history = self.create_history_recorder(parameters["time_steps_max"], parameters.get("record"))
+
+        self.init_agents()
+
+        if self.incremental_weighting:
+            self.weighting_identity_array = np.full(self.N, np.inf, dtype=self.dtype)  # the initial weights are uniform, so every link is computed on the first update
+            if self.sparse_network:
+                # store the weights in the same order as the edges of the adjacency_matrix so they can be updated in place
+                self.weighting_matrix = sp.csr_array(
+                    (
+                        np.asarray(self.weighting_matrix[self.edge_rows, self.adjacency_matrix.indices]).ravel(),
+                        self.adjacency_matrix.indices,
+                        self.adjacency_matrix.indptr,
+                    ),
+                    shape=self.adjacency_matrix.shape,
+                )
+
+        self.learning_noise = Learning_Noise(
+            self.noise_rng,
+            self.learning_error_scale,
+            (self.N, self.M),
+            parameters.get("noise_block_steps", 1),
+            parameters.get("noise_background", 0),
+            parameters["time_steps_max"] + 1,  # one draw at construction then one per step
+        )
         self.social_component_matrix = self.calc_social_component_matrix()
 
         if self.alpha_change == ("static_culturally_determined_weights" or "dynamic_culturally_determined_weights"):
             self.weighting_matrix, self.total_identity_differences,__ = self.update_weightings()
+        elif self.alpha_change == "dynamic_culturally_determined_weights":  # the link strengths start uniform, only the differences are needed
+            self.total_identity_differences = self.calc_total_identity_differences(self.get_identity_array())
         elif self.alpha_change == "behavioural_independence":#independent behaviours
-            self.weighting_matrix_list = self.update_weightings_list()
+            self.behavioural_weighting_array = self.update_behavioural_weightings()
 
         self.init_total_carbon_emissions  = self.calc_total_emissions_flow()
         self.total_carbon_emissions_flow = self.init_total_carbon_emissions
-        self.total_carbon_emissions_stock = self.init_total_carbon_emissions
+        self.total_carbon_emissions_stock = np.float64(self.init_total_carbon_emissions)  # double precision whatever the precision
 
         (
                 self.identity_list,
@@ -265,22 +442,70 @@ class Network:
         ) = self.calc_network_identity()
 
         if self.save_timeseries_data:
-            self.history_weighting_matrix = [self.weighting_matrix]
-            self.history_social_component_matrix = [self.social_component_matrix]
-            self.history_time = [self.t]
             self.weighting_matrix_convergence = 0  # there is no convergence in the first step, to deal with time issues when plotting
-            self.history_weighting_matrix_convergence = [
-                self.weighting_matrix_convergence
-            ]
-            self.history_average_identity = [self.average_identity]
-            self.history_std_identity = [self.std_identity]
-            self.history_var_identity = [self.var_identity]
-            self.history_min_identity = [self.min_identity]
-            self.history_max_identity = [self.max_identity]
-            self.history_total_carbon_emissions_flow = [self.total_carbon_emissions_flow]
-            self.history_total_carbon_emissions_stock = [self.total_carbon_emissions_stock]
-            if self.alpha_change == ("static_culturally_determined_weights" or "dynamic_culturally_determined_weights"):
-                self.history_total_identity_differences = [self.total_identity_differences]
+            self.save_timeseries_data_network()
+
+        if self.profiler.enabled:
+            self.profiler.add("construction", time.perf_counter() - construction_start_time)
+
+    def __getattr__(self, name: str):
+        # history_* attributes are views of the saved rows in the History_Recorder
+        history = self.__dict__.get("history")
+        if history is not None and name.startswith("history_") and name[len("history_"):] in history.data:
+            return history.get(name[len("history_"):])
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    def create_history_recorder(self, time_steps_max: int, record: list = None) -> History_Recorder:
+        """
+        Preallocate the time series of the network and of the individuals, one row is saved every compression_factor steps
+
+        Parameters
+        ----------
+        time_steps_max: int
+            number of steps the simulation is expected to run for, used to size the arrays
+        record: list[str]
+            names of the time series to save, if None all are saved
+
+        Returns
+        -------
+        history: History_Recorder
+            recorder with a channel for each time series
+        """
+        if record is not None:
+            record = ["time"] + list(record)
+        history = History_Recorder(time_steps_max // self.compression_factor + 1, record)
+        N_total = self.N + self.green_N
+
+        # network
+        history.add_channel("time", (), dtype=int)
+        if self.sparse_network:
+            history.add_channel("weighting_matrix", (self.adjacency_matrix.nnz,), dtype=self.dtype)  # data of the CSR weighting matrix
+        else:
+            history.add_channel("weighting_matrix", (N_total, N_total), dtype=self.dtype)
+        history.add_channel("social_component_matrix", (N_total, self.M), dtype=self.dtype)
+        history.add_channel("weighting_matrix_convergence", (), dtype=self.dtype)
+        history.add_channel("average_identity", (), dtype=self.dtype)
+        history.add_channel("std_identity", (), dtype=self.dtype)
+        history.add_channel("var_identity", (), dtype=self.dtype)
+        history.add_channel("min_identity", (), dtype=self.dtype)
+        history.add_channel("max_identity", (), dtype=self.dtype)
+        history.add_channel("total_carbon_emissions_flow", (), dtype=self.dtype)
+        history.add_channel("total_carbon_emissions_stock", ())
+        if self.alpha_change in ("static_culturally_determined_weights", "dynamic_culturally_determined_weights"):
+            history.add_channel("total_identity_differences", (N_total,), dtype=self.dtype)
+
+        # individuals, indexed by their id
+        history.add_channel("behaviour_values", (N_total, self.M), dtype=self.dtype, agent_channel=True)
+        history.add_channel("behaviour_attitudes", (N_total, self.M), dtype=self.dtype, agent_channel=True)
+        history.add_channel("behaviour_thresholds", (N_total, self.M), dtype=self.dtype, agent_channel=True)
+        history.add_channel("av_behaviour", (N_total,), dtype=self.dtype, agent_channel=True)
+        history.add_channel("identity", (N_total,), dtype=self.dtype, agent_channel=True)
+        history.add_channel("individual_carbon_emissions_flow", (N_total,), dtype=self.dtype, agent_channel=True)
+        history.add_channel("behavioural_carbon_emissions", (N_total, self.M), dtype=self.dtype, agent_channel=True)
+
+        history.check_record()
+
+        return history
 
     def normlize_matrix(self, matrix: npt.NDArray) -> npt.NDArray:
         """
@@ -296,8 +521,12 @@ class Network:
         norm_matrix: npt.NDArray
             row normalized array
         """
-        row_sums = matrix.sum(axis=1)
-        norm_matrix = matrix / row_sums[:, np.newaxis]
+        if sp.issparse(matrix):
+            row_sums = np.asarray(matrix.sum(axis=1)).ravel()
+            norm_matrix = sp.csr_array(matrix.multiply(1 / row_sums[:, np.newaxis]))
+        else:
+            row_sums = matrix.sum(axis=1)
+            norm_matrix = matrix / row_sums[:, np.newaxis]
 
         return norm_matrix
 
@@ -316,11 +545,15 @@ class Network:
         """
 
         discount_row = [(self.discount_factor)**(v) for v in range(self.cultural_inertia)]
-        normalized_discount_array = (np.asarray(discount_row)/sum(discount_row))
+        normalized_discount_array = (np.asarray(discount_row)/sum(discount_row)).astype(self.dtype)
 
 
         return normalized_discount_array 
 
+    def adjacency_dtype(self) -> type:
+        # a dense 0/1 adjacency is stored as booleans in single precision, in double precision it stays as floats
+        return bool if self.dtype == np.float32 else float
+
     def create_weighting_matrix(self) -> tuple[npt.NDArray, npt.NDArray, nx.Graph]:
         """
         Create watts-strogatz small world graph using Networkx library
@@ -339,18 +572,7 @@ class Network:
         ws: nx.Graph
             a networkx watts strogatz small world graph
         """
-
-        G = nx.watts_strogatz_graph(n=self.N, k=self.K, p=self.prob_rewire, seed=self.set_seed)
-
-        weighting_matrix = nx.to_numpy_array(G)
-
-        norm_weighting_matrix = self.normlize_matrix(weighting_matrix)
-
-        return (
-            weighting_matrix,
-            norm_weighting_matrix,
-            G,
-        )
+        return self.create_small_world_weighting_matrix(self.N)
     
     def create_weighting_matrix_add_greens(self):
         """
@@ -370,48 +592,196 @@ class Network:
         ws: nx.Graph
             a networkx watts strogatz small world graph
         """
+        return self.create_small_world_weighting_matrix(self.N + self.green_N)
+
+    def create_small_world_weighting_matrix(self, n: int) -> tuple[npt.NDArray, npt.NDArray, nx.Graph]:
+        """
+        Create the adjacency and row normalized weighting matrices of a watts-strogatz small world network, taken from the
+        topology cache of the process if a run has already built the same network (see topology_cache.py)
+
+        Parameters
+        ----------
+        n: int
+            number of individuals, including any green influencers
 
-        G = nx.watts_strogatz_graph(n=self.N+self.green_N, k=self.K, p=self.prob_rewire, seed=self.set_seed)
+        Returns
+        -------
+        weighting_matrix: npt.NDArray[bool]
+            adjacency matrix, dense or sparse. Read only if cached
+        norm_weighting_matrix: npt.NDArray[float]
+            row normalized link strengths, a copy owned by this network
+        ws: nx.Graph
+            a networkx watts strogatz small world graph, None if generated with numpy and not kept. Frozen if cached
+        """
+        key = (n, self.K, float(self.prob_rewire), int(self.set_seed), self.network_generator, self.sparse_network, self.dtype.str)
 
-        weighting_matrix = nx.to_numpy_array(G)
+        topology = TOPOLOGY_CACHE.get(key, self.keep_network_graph) if self.topology_cache else None
+        if topology is None:
+            topology = self.generate_topology(n)
+            if self.topology_cache:
+                TOPOLOGY_CACHE.add(key, topology)
 
-        norm_weighting_matrix = self.normlize_matrix(weighting_matrix)
+        weighting_matrix = topology["adjacency_matrix"]
+        self.number_of_edges = topology["number_of_edges"]
+        if self.sparse_network:
+            self.edge_rows = np.repeat(np.arange(weighting_matrix.shape[0]), np.diff(weighting_matrix.indptr))
 
         return (
             weighting_matrix,
-            norm_weighting_matrix,
-            G,
+            topology["weighting_matrix"].copy(),  # the link strengths change during the run
+            topology["network"],
         )
 
+    def generate_topology(self, n: int) -> dict:
+        """
+        Generate a watts-strogatz small world network with networkx or, if network_generator is "numpy", as arrays without
+        building a graph unless it is kept. If topology_cache_dir is set the connections are read from there when they
+        have been saved by an earlier run, and saved there otherwise
+
+        Parameters
+        ----------
+        n: int
+            number of individuals, including any green influencers
 
-    def circular_agent_list(self) -> list:
+        Returns
+        -------
+        topology: dict
+            "adjacency_matrix", "weighting_matrix" (row normalized), "network" and "number_of_edges" of the network
         """
-        Makes an ordered list circular so that the start and end values are matched in value and value distribution is symmetric
+        structure = None
+        if self.topology_cache_dir is not None:
+            structure_path = calc_structure_path(
+                self.topology_cache_dir, n, self.K, self.prob_rewire, self.set_seed, self.network_generator
+            )
+            structure = load_structure(structure_path)
+
+        if structure is not None:
+            indptr, indices = structure
+            number_of_edges = len(indices) // 2
+            if self.sparse_network:
+                weighting_matrix = sp.csr_array((np.ones(len(indices), dtype=self.dtype), indices, indptr), shape=(n, n))
+            else:
+                weighting_matrix = np.zeros((n, n), dtype=self.adjacency_dtype())
+                weighting_matrix[np.repeat(np.arange(n), np.diff(indptr)), indices] = 1
+
+            G = None
+            if self.keep_network_graph:
+                G = nx.Graph()
+                G.add_nodes_from(range(n))
+                rows = np.repeat(np.arange(n), np.diff(indptr))
+                G.add_edges_from(zip(rows[rows < indices].tolist(), indices[rows < indices].tolist()))
+        elif self.network_generator == "numpy":
+            source_array, target_array = watts_strogatz_edges(n, self.K, self.prob_rewire, create_topology_rng(self.set_seed))
+            number_of_edges = len(source_array)
+
+            if self.sparse_network:
+                weighting_matrix = sp.csr_array(
+                    (
+                        np.ones(2 * number_of_edges, dtype=self.dtype),
+                        (np.concatenate([source_array, target_array]), np.concatenate([target_array, source_array])),
+                    ),
+                    shape=(n, n),
+                )
+                weighting_matrix.sum_duplicates()  # sorts the columns of each row
+            else:
+                weighting_matrix = np.zeros((n, n), dtype=self.adjacency_dtype())
+                weighting_matrix[source_array, target_array] = 1
+                weighting_matrix[target_array, source_array] = 1
+
+            G = None
+            if self.keep_network_graph:
+                G = nx.Graph()
+                G.add_nodes_from(range(n))
+                G.add_edges_from(zip(source_array.tolist(), target_array.tolist()))
+        else:
+            G = nx.watts_strogatz_graph(n=n, k=self.K, p=self.prob_rewire, seed=self.set_seed)
+            number_of_edges = G.number_of_edges()
+
+            if self.sparse_network:
+                weighting_matrix = nx.to_scipy_sparse_array(G, dtype=self.dtype, format="csr")
+            else:
+                weighting_matrix = nx.to_numpy_array(G, dtype=self.adjacency_dtype())
+
+        if self.topology_cache_dir is not None and structure is None:
+            save_structure(structure_path, weighting_matrix)
+
+        return {
+            "adjacency_matrix": weighting_matrix,
+            "weighting_matrix": self.normlize_matrix(weighting_matrix).astype(self.dtype, copy=False),
+            "network": G,
+            "number_of_edges": number_of_edges,
+        }
+
+    def calc_network_density(self) -> float:
+        """
+        Fraction of the possible connections that exist, calculated from the number of edges as in nx.density
 
         Parameters
         ----------
-        list: list
-            an ordered list e.g [1,2,3,4,5]
+        None
+
         Returns
         -------
-        circular: list
-            a circular list symmetric about its middle entry e.g [1,3,5,4,2]
+        network_density: float
         """
+        n = self.adjacency_matrix.shape[0]
+        if self.number_of_edges == 0 or n <= 1:
+            return 0
+        return 2 * (self.number_of_edges / (n * (n - 1)))
 
-        first_half = self.agent_list[::2]  # take every second element in the list, even indicies
-        second_half = (self.agent_list[1::2])[::-1]  # take every second element , odd indicies
-        self.agent_list = first_half + second_half
+    def calc_circular_order(self, order: npt.NDArray) -> npt.NDArray:
+        """
+        Makes an ordering circular so that the start and end values are matched in value and value distribution is symmetric
+
+        Parameters
+        ----------
+        order: npt.NDArray[int]
+            an ordering e.g [1,2,3,4,5]
+        Returns
+        -------
+        circular: npt.NDArray[int]
+            a circular ordering symmetric about its middle entry e.g [1,3,5,4,2]
+        """
+        return np.concatenate([order[::2], order[1::2][::-1]])
+
+    def calc_partial_shuffle(self, order: npt.NDArray) -> npt.NDArray:
+        """
+        Partially shuffle an ordering by swapping shuffle_reps random pairs of positions. The pairs are drawn at once, which
+        gives the same draws as drawing them one pair at a time
+
+        Parameters
+        ----------
+        order: npt.NDArray[int]
+            the ordering
 
-    def partial_shuffle_agent_list(self) -> list:
+        Returns
+        -------
+        order: npt.NDArray[int]
+            the partially shuffled ordering
         """
-        Partially shuffle a list using Fisher Yates shuffle
+        swap_pairs = draw_integers(self.construction_rng, low=0, high=self.N, size=(self.shuffle_reps, 2)).tolist()
+        order = order.tolist()
+        for a, b in swap_pairs:  # each swap acts on the result of the previous ones
+            order[b], order[a] = order[a], order[b]
+        return np.asarray(order, dtype=int)
+
+    def calc_shuffle_order(self, identity_array: npt.NDArray) -> npt.NDArray:
         """
+        Order individuals by identity, make the order circular and then partially shuffle it
+
+        Parameters
+        ----------
+        identity_array: npt.NDArray[float]
+            identity of each individual
 
-        for _ in range(self.shuffle_reps):
-            a, b = np.random.randint(
-                low=0, high=self.N, size=2
-            )  # generate pair of indicies to swap
-            self.agent_list[b], self.agent_list[a] = self.agent_list[a], self.agent_list[b]
+        Returns
+        -------
+        order: npt.NDArray[int]
+            position of each individual in the network, as indices into identity_array
+        """
+        order = np.argsort(identity_array, kind="stable")  # sorted by identity, ties kept in order as in list.sort
+        order = self.calc_circular_order(order)  # circular in terms of identity
+        return self.calc_partial_shuffle(order)
 
     def generate_init_data_behaviours(self) -> tuple[npt.NDArray, npt.NDArray]:
         """
@@ -430,18 +800,9 @@ class Network:
             commute or disposable income of an individual
         """
 
-        attitude_list = [
-            np.random.beta(self.a_attitude, self.b_attitude, size=self.M)
-            for n in range(self.N)
-        ]
-
-        threshold_list = [
-            np.random.beta(self.a_threshold, self.b_threshold, size=self.M)
-            for n in range(self.N)
-        ]
-
-        attitude_matrix = np.asarray(attitude_list)
-        threshold_matrix = np.asarray(threshold_list)
+        # one draw of N*M values gives the same values as N draws of M
+        attitude_matrix = self.construction_rng.beta(self.a_attitude, self.b_attitude, size=(self.N, self.M)).astype(self.dtype)
+        threshold_matrix = self.construction_rng.beta(self.a_threshold, self.b_threshold, size=(self.N, self.M)).astype(self.dtype)
 
         return attitude_matrix, threshold_matrix
 
@@ -465,7 +826,9 @@ class Network:
             "save_timeseries_data": self.save_timeseries_data,
             "phi_array": self.phi_array,
             "compression_factor": self.compression_factor,
-            "alpha_change" : self.alpha_change
+            "alpha_change" : self.alpha_change,
+            "discount_factor": self.discount_factor,
+            "history": self.history if self.save_timeseries_data else None,
         }
 
         agent_list = [
@@ -485,15 +848,8 @@ class Network:
     def add_green_influencers_list(self):
         """Add green influencers to agent list"""
 
-        attitude_list_green_N = [
-            np.random.beta(self.a_attitude, self.b_attitude, size=self.M)
-            for n in range(self.green_N)
-        ]
-
-        threshold_list_green_N  = [
-            np.random.beta(self.a_threshold, self.b_threshold, size=self.M)
-            for n in range(self.green_N)
-        ]
+        attitude_matrix_green_N = self.construction_rng.beta(self.a_attitude, self.b_attitude, size=(self.green_N, self.M))
+        threshold_matrix_green_N = self.construction_rng.beta(self.a_threshold, self.b_threshold, size=(self.green_N, self.M))
 
         individual_params = {
             "t": self.t,
@@ -501,14 +857,16 @@ class Network:
             "save_timeseries_data": self.save_timeseries_data,
             "phi_array": self.phi_array,
             "compression_factor": self.compression_factor,
-            "alpha_change" : self.alpha_change
+            "alpha_change" : self.alpha_change,
+            "discount_factor": self.discount_factor,
+            "history": self.history if self.save_timeseries_data else None,
         }
 
         agent_green_influencer_list = [
             Individual_one_m_green_influencer(
                 individual_params,
-                attitude_list_green_N[n],
-                threshold_list_green_N[n],
+                attitude_matrix_green_N[n].astype(self.dtype),
+                threshold_matrix_green_N[n].astype(self.dtype),
                 self.normalized_discount_array,
                 self.cultural_inertia,
                 self.N + n
@@ -520,10 +878,119 @@ class Network:
 
 
     def shuffle_agent_list(self): 
-        #make list cirucalr then partial shuffle it
-        self.agent_list.sort(key=lambda x: x.identity)#sorted by identity
-        self.circular_agent_list()#agent list is now circular in terms of identity
-        self.partial_shuffle_agent_list()#partial shuffle of the list
+        #make list circular in terms of identity then partial shuffle it
+        order = self.calc_shuffle_order(self.get_identity_array())
+        self.agent_list = [self.agent_list[i] for i in order]
+
+    def init_agents(self):
+        """
+        Create the Individual objects, add any green influencers and then order them in the network by identity
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self.agent_list = self.create_agent_list()
+
+        if self.green_N > 0:
+            self.add_green_influencers_list()
+            self.N = len(self.agent_list)
+
+        self.shuffle_agent_list()#partial shuffle of the list based on identity
+
+    def get_behavioural_attitude_matrix(self) -> npt.NDArray:
+        """
+        Gather the current behavioural attitudes of every individual, rows ordered as in the social network
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        behavioural_attitude_matrix: npt.NDArray
+            NxM array of behavioural attitudes
+        """
+        return np.asarray([n.attitudes for n in self.agent_list])
+
+    def get_attitudes_star_matrix(self) -> npt.NDArray:
+        """
+        Gather the discounted past attitudes of every individual, only used in the "behavioural_independence" case
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        attitudes_star_matrix: npt.NDArray
+            NxM array of time discounted behavioural attitudes
+        """
+        return np.asarray([x.attitudes_star for x in self.agent_list])
+
+    def get_identity_array(self) -> npt.NDArray:
+        """
+        Gather the current identity of every individual, ordered as in the social network
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        identity_array: npt.NDArray
+            array of length N of individual identities
+        """
+        return np.array([x.identity for x in self.agent_list])
+
+    def get_id_array(self) -> npt.NDArray:
+        """
+        Gather the id of every individual, ordered as in the social network. Individual time series are indexed by id
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        id_array: npt.NDArray
+            array of length N of individual ids
+        """
+        return np.array([x.id for x in self.agent_list])
+
+    def get_individual_emissions_flow_array(self) -> npt.NDArray:
+        """
+        Gather the emissions of every individual, ordered as in the social network
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        individual_carbon_emissions_flow: npt.NDArray
+            array of length N of individual emissions
+        """
+        return np.fromiter((x.individual_carbon_emissions_flow for x in self.agent_list), dtype=self.dtype, count=self.N)
+
+    def get_green_fountain_state(self) -> npt.NDArray:
+        """
+        Gather which individuals are green influencers, ordered as in the social network
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        green_fountain_state: npt.NDArray[bool]
+            array of length N, True for green influencers
+        """
+        return np.fromiter((x.green_fountain_state for x in self.agent_list), dtype=bool, count=self.N)
 
     def calc_ego_influence_degroot(self) -> npt.NDArray:
         """
@@ -540,8 +1007,8 @@ class Network:
             behavioural attitude opinions, this influence is weighted by the weighting_matrix
         """
 
-        behavioural_attitude_matrix = np.asarray([n.attitudes for n in self.agent_list])
-        neighbour_influence = np.matmul(self.weighting_matrix, behavioural_attitude_matrix)
+        behavioural_attitude_matrix = self.get_behavioural_attitude_matrix()
+        neighbour_influence = self.weighting_matrix @ behavioural_attitude_matrix
         
         return neighbour_influence
 
@@ -560,11 +1027,15 @@ class Network:
             behavioural attitude opinions, this influence is weighted by the weighting_matrix
         """
 
-        behavioural_attitude_matrix = np.asarray([n.attitudes for n in self.agent_list])
-        neighbour_influence = np.zeros((self.N, self.M))
+        behavioural_attitude_matrix = self.get_behavioural_attitude_matrix()
+
+        if self.kernel_backend == "numba":
+            return kernels.calc_behavioural_influence_kernel(
+                self.behavioural_weighting_array, behavioural_attitude_matrix, self.edge_row_matrix.indptr, self.edge_columns
+            )
 
-        for m in range(self.M):
-            neighbour_influence[:, m] = np.matmul(self.weighting_matrix_list[m], behavioural_attitude_matrix[:,m])
+        neighbour_attitudes = behavioural_attitude_matrix[self.edge_columns]  # ExM attitude at the far end of each connection
+        neighbour_influence = self.edge_row_matrix @ (self.behavioural_weighting_array * neighbour_attitudes)
 
         return neighbour_influence
 
@@ -587,9 +1058,7 @@ class Network:
         else:
             ego_influence = self.calc_ego_influence_degroot()           
 
-        social_influence = ego_influence + np.random.normal(
-            loc=0, scale=self.learning_error_scale, size=(self.N, self.M)
-        )
+        social_influence = (ego_influence + self.learning_noise.next()).astype(self.dtype, copy=False)
         return social_influence
 
     def calc_total_weighting_matrix_difference(
@@ -610,10 +1079,59 @@ class Network:
         total_difference: float
             total element wise difference between the arrays
         """
-        difference_matrix = np.subtract(matrix_before, matrix_after)
-        total_difference = (np.abs(difference_matrix)).sum()
+        difference_matrix = matrix_before - matrix_after  # works for both dense and sparse arrays
+        total_difference = abs(difference_matrix).sum()
         return total_difference
 
+    def calc_sparse_weighting_matrix(self, attribute_array: npt.NDArray) -> tuple[sp.csr_array, npt.NDArray]:
+        """
+        Calculate the row normalized link strengths only over existing connections of the sparse adjacency_matrix
+
+        Parameters
+        ----------
+        attribute_array: npt.NDArray
+            array of length N of the attribute (identity or discounted attitude) that determines link strength
+
+        Returns
+        -------
+        norm_weighting_matrix: sp.csr_array
+            Row normalized sparse weighting array with the same structure as the adjacency_matrix
+        edge_differences: npt.NDArray
+            absolute difference in the attribute across each stored connection
+        """
+        edge_differences = np.abs(attribute_array[self.edge_rows] - attribute_array[self.adjacency_matrix.indices])
+        alpha_numerator = self.adjacency_matrix.data * np.exp(-self.confirmation_bias * edge_differences)
+
+        row_sums = np.bincount(self.edge_rows, weights=alpha_numerator, minlength=self.adjacency_matrix.shape[0]).astype(self.dtype, copy=False)
+        norm_weighting_matrix = sp.csr_array(
+            (alpha_numerator / row_sums[self.edge_rows], self.adjacency_matrix.indices, self.adjacency_matrix.indptr),
+            shape=self.adjacency_matrix.shape,
+        )
+
+        return norm_weighting_matrix, edge_differences
+
+    def calc_total_identity_differences(self, identity_array: npt.NDArray) -> npt.NDArray:
+        """
+        Calculate the total difference in identity of each individual with its neighbours, as found by update_weightings
+
+        Parameters
+        ----------
+        identity_array: npt.NDArray
+            array of length N of the identity of each individual
+
+        Returns
+        -------
+        total_identity_differences: npt.NDArray
+            sum over the connections of each individual of the absolute difference in identity
+        """
+        if self.sparse_network:
+            edge_differences = np.abs(identity_array[self.edge_rows] - identity_array[self.adjacency_matrix.indices])
+            return np.bincount(
+                self.edge_rows, weights=self.adjacency_matrix.data * edge_differences, minlength=self.adjacency_matrix.shape[0]
+            )
+        difference_matrix = np.subtract.outer(identity_array, identity_array)
+        return abs(self.adjacency_matrix * difference_matrix).sum(axis=1)
+
     def update_weightings(self) -> tuple[npt.NDArray, float]:
         """
         Update the link strength array according to the new agent identities
@@ -630,27 +1148,48 @@ class Network:
         total_difference: float
             total element wise difference between the previous weighting arrays
         """
-        identity_list = np.array([x.identity for x in self.agent_list])
-
-        difference_matrix = np.subtract.outer(identity_list, identity_list)
+        identity_list = self.get_identity_array()
+
+        if self.sparse_network and self.kernel_backend == "numba":
+            weighting_data, total_identity_differences = kernels.calc_sparse_weighting_kernel(
+                identity_list,
+                self.adjacency_matrix.indptr,
+                self.adjacency_matrix.indices,
+                self.adjacency_matrix.data,
+                self.confirmation_bias,
+            )
+            norm_weighting_matrix = sp.csr_array(
+                (weighting_data, self.adjacency_matrix.indices, self.adjacency_matrix.indptr), shape=self.adjacency_matrix.shape
+            )
+        elif self.kernel_backend == "numba":
+            norm_weighting_matrix, total_identity_differences = kernels.calc_weighting_matrix_kernel(
+                identity_list, self.adjacency_matrix, self.confirmation_bias
+            )
+        elif self.sparse_network:
+            norm_weighting_matrix, edge_differences = self.calc_sparse_weighting_matrix(identity_list)
+            total_identity_differences = np.bincount(
+                self.edge_rows, weights=self.adjacency_matrix.data * edge_differences, minlength=self.adjacency_matrix.shape[0]
+            )
+        else:
+            difference_matrix = np.subtract.outer(identity_list, identity_list)
 
-        alpha_numerator = np.exp(
-            -np.multiply(self.confirmation_bias, np.abs(difference_matrix))
-        )
+            alpha_numerator = np.exp(
+                -np.multiply(self.confirmation_bias, np.abs(difference_matrix))
+            )
 
-        non_diagonal_weighting_matrix = (
-            self.adjacency_matrix * alpha_numerator
-        )  # We want only those values that have network connections
+            non_diagonal_weighting_matrix = (
+                self.adjacency_matrix * alpha_numerator
+            )  # We want only those values that have network connections
 
-        norm_weighting_matrix = self.normlize_matrix(
-            non_diagonal_weighting_matrix
-        )  # normalize the matrix row wise
+            norm_weighting_matrix = self.normlize_matrix(
+                non_diagonal_weighting_matrix
+            )  # normalize the matrix row wise
 
-        #for total_identity_differences
-        difference_matrix_real_connections = abs(self.adjacency_matrix * difference_matrix)
-        total_identity_differences = difference_matrix_real_connections.sum(axis=1)
+            #for total_identity_differences
+            difference_matrix_real_connections = abs(self.adjacency_matrix * difference_matrix)
+            total_identity_differences = difference_matrix_real_connections.sum(axis=1)
 
-        if self.save_timeseries_data:
+        if self.save_timeseries_data and self.history.is_recorded("weighting_matrix_convergence"):
             total_difference = self.calc_total_weighting_matrix_difference(
                 self.weighting_matrix, norm_weighting_matrix
             )
@@ -658,9 +1197,13 @@ class Network:
         else:
             return norm_weighting_matrix, total_identity_differences, 0
     
-    def update_weightings_list(self):
+    def update_weightings_incremental(self) -> tuple[npt.NDArray, npt.NDArray, float]:
         """
-        Update the link strength array according to the agent ATTITUDES NOT IDENTITIES, RETURN LIST OF MATRICIES
+        Update the link strength array according to the new agent identities, but only for the rows that can have changed.
+        Individuals whose identity moved by more than weighting_tolerance since their links were last computed are marked as
+        changed, then every row containing a changed individual (their own row and those of their neighbours) is recomputed
+        and renormalized using the identities stored in weighting_identity_array. The array is modified in place.
+        The total identity differences are computed from the current identities, only if their time series is recorded
 
         Parameters
         ----------
@@ -668,50 +1211,139 @@ class Network:
 
         Returns
         -------
-        weighting_matrix_list: list[npt.NDArray]
-            List of row normalized weighting array giving the strength of inter-Individual connections due to similarity in attitude
+        weighting_matrix: npt.NDArray
+            Row normalized weighting array
+        total_identity_differences: npt.NDArray
+            total difference in identity of each individual with its neighbours, the previous value if it is not recorded
+        total_difference: float
+            total element wise difference between the previous weighting arrays
         """
-        weighting_matrix_list = []
+        identity_array = self.get_identity_array()
+        if self.save_timeseries_data and self.history.is_recorded("total_identity_differences"):
+            total_identity_differences = self.calc_total_identity_differences(identity_array)
+        else:
+            total_identity_differences = self.total_identity_differences
 
-        for m in range(self.M):
-            attitude_star_list = np.array([x.attitudes_star[m] for x in self.agent_list])
+        changed = np.abs(identity_array - self.weighting_identity_array) > self.weighting_tolerance
+        if not changed.any():
+            return self.weighting_matrix, total_identity_differences, 0
 
-            difference_matrix = np.subtract.outer(attitude_star_list, attitude_star_list)
+        self.weighting_identity_array[changed] = identity_array[changed]
+        calc_convergence = self.save_timeseries_data and self.history.is_recorded("weighting_matrix_convergence")
+        total_difference = 0
 
-            alpha_numerator = np.exp(
-                -np.multiply(self.confirmation_bias, np.abs(difference_matrix))
+        if self.sparse_network:
+            edge_changed = changed[self.edge_rows] | changed[self.adjacency_matrix.indices]
+            rows = np.zeros(self.N, dtype=bool)
+            rows[self.edge_rows[edge_changed]] = True
+            edges = rows[self.edge_rows]  # every edge of an affected row is needed to renormalize it
+
+            edge_differences = np.abs(
+                self.weighting_identity_array[self.edge_rows[edges]]
+                - self.weighting_identity_array[self.adjacency_matrix.indices[edges]]
             )
+            alpha_numerator = self.adjacency_matrix.data[edges] * np.exp(-self.confirmation_bias * edge_differences)
+            row_sums = np.bincount(self.edge_rows[edges], weights=alpha_numerator, minlength=self.N)
+            new_data = alpha_numerator / row_sums[self.edge_rows[edges]]
 
-            non_diagonal_weighting_matrix = (
-                self.adjacency_matrix * alpha_numerator
-            )  # We want only those values that have network connections
+            if calc_convergence:
+                total_difference = np.abs(self.weighting_matrix.data[edges] - new_data).sum()
+            self.weighting_matrix.data[edges] = new_data
+        else:
+            rows = changed | (self.adjacency_matrix @ changed.astype(float) > 0)
+            all_rows = rows.all()
+            if all_rows:
+                rows = slice(None)  # avoid copying every row through fancy indexing
+
+            difference_matrix = np.subtract.outer(self.weighting_identity_array[rows], self.weighting_identity_array)
+            alpha_numerator = np.exp(-np.multiply(self.confirmation_bias, np.abs(difference_matrix)))
+            non_diagonal_weighting_matrix = self.adjacency_matrix[rows] * alpha_numerator
+            new_rows = self.normlize_matrix(non_diagonal_weighting_matrix)
+
+            if calc_convergence:
+                total_difference = np.abs(self.weighting_matrix[rows] - new_rows).sum()
+            if all_rows:
+                self.weighting_matrix = new_rows
+            else:
+                self.weighting_matrix[rows] = new_rows
 
-            norm_weighting_matrix = self.normlize_matrix(
-                non_diagonal_weighting_matrix
-            )  # normalize the matrix row wise
+        return self.weighting_matrix, total_identity_differences, total_difference
 
-            weighting_matrix_list.append(norm_weighting_matrix)
+    def init_behavioural_weightings(self):
+        """
+        List the E connections of the adjacency_matrix, for dense and sparse networks alike, so that the link strengths of
+        all M behaviours can be stored as one ExM array, and start every behaviour from the initial weighting_matrix.
+        Only the connections are computed each step rather than M full NxN arrays
 
-        return weighting_matrix_list
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        N_total = self.adjacency_matrix.shape[0]
+        if self.sparse_network:
+            self.edge_columns = self.adjacency_matrix.indices
+            self.edge_adjacency = self.adjacency_matrix.data
+            indptr = self.adjacency_matrix.indptr
+        else:
+            self.edge_rows, self.edge_columns = np.nonzero(self.adjacency_matrix)
+            self.edge_adjacency = self.adjacency_matrix[self.edge_rows, self.edge_columns]
+            indptr = np.concatenate(([0], np.cumsum(np.bincount(self.edge_rows, minlength=N_total))))
+
+        n_edges = len(self.edge_rows)
+        self.edge_row_matrix = sp.csr_array((np.ones(n_edges, dtype=self.dtype), np.arange(n_edges), indptr), shape=(N_total, n_edges))
 
+        edge_weights = np.asarray(self.weighting_matrix[self.edge_rows, self.edge_columns]).ravel()
+        self.behavioural_weighting_array = np.repeat(edge_weights[:, np.newaxis], self.M, axis=1)
 
-    def calc_total_emissions_flow(self) -> int:
+    def update_behavioural_weightings(self) -> npt.NDArray:
         """
-        Calculate total carbon emissions of N*M behaviours
+        Update the link strengths of every behaviour according to the agent ATTITUDES NOT IDENTITIES. All M behaviours are
+        computed at once over the E connections of the network, in place in a single ExM array
 
         Parameters
         ----------
         None
 
+        Returns
+        -------
+        behavioural_weighting_array: npt.NDArray
+            ExM row normalized link strengths of each connection due to similarity in attitude for each behaviour
+        """
+        attitudes_star_matrix = self.get_attitudes_star_matrix()
+
+        if self.kernel_backend == "numba":
+            return kernels.calc_behavioural_weighting_kernel(
+                attitudes_star_matrix, self.edge_row_matrix.indptr, self.edge_columns, self.edge_adjacency, self.confirmation_bias
+            )
+
+        weighting_array = np.abs(attitudes_star_matrix[self.edge_rows] - attitudes_star_matrix[self.edge_columns])
+        np.multiply(weighting_array, -self.confirmation_bias, out=weighting_array)
+        np.exp(weighting_array, out=weighting_array)
+        weighting_array *= self.edge_adjacency[:, np.newaxis]
+        weighting_array /= (self.edge_row_matrix @ weighting_array)[self.edge_rows]  # normalize each row of each behaviour
+
+        return weighting_array
+
+    def calc_total_emissions_flow(self, exclude_influencers: bool = False) -> float:
+        """
+        Calculate total carbon emissions of N*M behaviours
+
+        Parameters
+        ----------
+        exclude_influencers: bool
+            whether to leave out the emissions of green influencers
+
         Returns
         -------
         total_network_emissions: float
-            total network emissions from each Individual object
+            total network emissions from each individual
         """
-        total_network_emissions = sum(
-            [x.individual_carbon_emissions_flow for x in self.agent_list]
-        )
-        return total_network_emissions
+        green_fountain_state = self.get_green_fountain_state() if exclude_influencers else None
+        return calc_total_emissions(self.get_individual_emissions_flow_array(), green_fountain_state)
 
     def calc_network_identity(self) -> tuple[float, float, float, float]:
         """
@@ -773,21 +1405,101 @@ class Network:
         -------
         None
         """
-        self.history_time.append(self.t)
-        self.history_weighting_matrix.append(self.weighting_matrix)
-        self.history_social_component_matrix.append(self.social_component_matrix)
-        self.history_weighting_matrix_convergence.append(
-            self.weighting_matrix_convergence
+        row = self.t // self.compression_factor
+        self.history.save("time", row, self.t)
+        if self.sparse_network:
+            self.history.save("weighting_matrix", row, self.weighting_matrix.data)
+        else:
+            self.history.save("weighting_matrix", row, self.weighting_matrix)
+        self.history.save("social_component_matrix", row, self.social_component_matrix)
+        self.history.save("weighting_matrix_convergence", row, self.weighting_matrix_convergence)
+        self.history.save("average_identity", row, self.average_identity)
+        self.history.save("std_identity", row, self.std_identity)
+        self.history.save("var_identity", row, self.var_identity)
+        self.history.save("min_identity", row, self.min_identity)
+        self.history.save("max_identity", row, self.max_identity)
+        self.history.save("total_carbon_emissions_flow", row, self.total_carbon_emissions_flow)
+        self.history.save("total_carbon_emissions_stock", row, self.total_carbon_emissions_stock)
+        if self.alpha_change in ("static_culturally_determined_weights", "dynamic_culturally_determined_weights"):
+            self.history.save("total_identity_differences", row, self.total_identity_differences)
+
+    def check_convergence(self) -> bool:
+        """
+        Save the current average identity, identity variance and emissions flow per behaviour in the convergence buffer and check
+        if each has changed by less than convergence_tolerance (max - min) over the last convergence_window steps. Fluctuations
+        due to the social learning error remain once converged, so the tolerance should be set above them. Nothing is tested
+        before both the window and the memory (cultural_inertia steps) have filled, as the identities still move while the
+        memory fills
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            whether the simulation has converged
+        """
+        self.convergence_buffer[self.t % self.convergence_window] = (
+            self.average_identity,
+            self.var_identity,
+            self.total_carbon_emissions_flow / (self.N * self.M),
         )
-        self.history_average_identity.append(self.average_identity)
-        self.history_std_identity.append(self.std_identity)
-        self.history_var_identity.append(self.var_identity)
-        self.history_min_identity.append(self.min_identity)
-        self.history_max_identity.append(self.max_identity)
-        self.history_total_carbon_emissions_flow.append(self.total_carbon_emissions_flow)
-        self.history_total_carbon_emissions_stock.append(self.total_carbon_emissions_stock)
-        if self.alpha_change == ("static_culturally_determined_weights" or "dynamic_culturally_determined_weights"):
-            self.history_total_identity_differences.append(self.total_identity_differences)
+        if self.t < max(self.convergence_window, self.cultural_inertia):
+            return False
+        return bool((np.ptp(self.convergence_buffer, axis=0) < self.convergence_tolerance).all())
+
+    def extrapolate_emissions_stock(self, time_steps_max: int):
+        """
+        Extend the emissions stock of a converged run to time_steps_max assuming the emissions flow stays at its current value.
+        The end state measures are kept as they are
+
+        Parameters
+        ----------
+        time_steps_max: int
+            the time step the run would have ended at
+
+        Returns
+        -------
+        None
+        """
+        self.t_converged = self.t
+        self.total_carbon_emissions_stock += self.total_carbon_emissions_flow * (time_steps_max - self.t)
+
+    def get_columnar_data(self) -> dict:
+        """
+        Gather the results of the simulation, the saved time series and the final state, as a dictionary of arrays and
+        scalars that can be saved with save_columnar and read back lazily with Network_Reader
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        columnar_data: dict
+            results of the simulation, with the time series in the "history" sub dictionary
+        """
+        columnar_data = {
+            "alpha_change": self.alpha_change,
+            "N": self.N,
+            "M": self.M,
+            "t": self.t,
+            "phi_array": np.asarray(self.phi_array),
+            "id_array": self.get_id_array(),
+            "identity_array": self.get_identity_array(),
+            "init_total_carbon_emissions": self.init_total_carbon_emissions,
+            "total_carbon_emissions_flow": self.total_carbon_emissions_flow,
+            "total_carbon_emissions_stock": self.total_carbon_emissions_stock,
+            "average_identity": self.average_identity,
+            "std_identity": self.std_identity,
+            "var_identity": self.var_identity,
+        }
+        if self.save_timeseries_data:
+            columnar_data["agent_channels"] = sorted(self.history.agent_channels)
+            columnar_data["history"] = {name: np.asarray(self.history.get(name)) for name in self.history.data}
+
+        return columnar_data
 
     def next_step(self):
         """
@@ -806,32 +1518,48 @@ class Network:
         self.t += 1
 
         # execute step
-        self.update_individuals()
+        with self.profiler.stage("update_individuals"):
+            self.update_individuals()
 
         # update network parameters for next step
-        if self.alpha_change == "dynamic_culturally_determined_weights":
-            if self.save_timeseries_data:
+        with self.profiler.stage("update_weightings"):
+            if self.alpha_change == "dynamic_culturally_determined_weights" and self.incremental_weighting:
                 (
                     self.weighting_matrix,
                     self.total_identity_differences,
                     self.weighting_matrix_convergence,
-                ) = self.update_weightings()
-            else:
-                self.weighting_matrix, self.total_identity_differences,__ = self.update_weightings()
-        elif self.alpha_change == "behavioural_independence":#independent behaviours
-            self.weighting_matrix_list = self.update_weightings_list()
+                ) = self.update_weightings_incremental()
+            elif self.alpha_change == "dynamic_culturally_determined_weights":
+                if self.save_timeseries_data:
+                    (
+                        self.weighting_matrix,
+                        self.total_identity_differences,
+                        self.weighting_matrix_convergence,
+                    ) = self.update_weightings()
+                else:
+                    self.weighting_matrix, self.total_identity_differences,__ = self.update_weightings()
+            elif self.alpha_change == "behavioural_independence":#independent behaviours
+                self.behavioural_weighting_array = self.update_behavioural_weightings()
+
+        with self.profiler.stage("calc_social_component_matrix"):
+            self.social_component_matrix = self.calc_social_component_matrix()
+        with self.profiler.stage("calc_total_emissions_flow"):
+            self.total_carbon_emissions_flow = self.calc_total_emissions_flow()
+            self.total_carbon_emissions_stock += self.total_carbon_emissions_flow
+        with self.profiler.stage("calc_network_identity"):
+            (
+                    self.identity_list,
+                    self.average_identity,
+                    self.std_identity,
+                    self.var_identity,
+                    self.min_identity,
+                    self.max_identity,
+            ) = self.calc_network_identity()
 
-        self.social_component_matrix = self.calc_social_component_matrix()
-        self.total_carbon_emissions_flow = self.calc_total_emissions_flow()
-        self.total_carbon_emissions_stock += self.total_carbon_emissions_flow
-        (
-                self.identity_list,
-                self.average_identity,
-                self.std_identity,
-                self.var_identity,
-                self.min_identity,
-                self.max_identity,
-        ) = self.calc_network_identity()
-        
         if (self.t % self.compression_factor == 0) and (self.save_timeseries_data):
-            self.save_timeseries_data_network()
+            with self.profiler.stage("save_timeseries_data_network"):
+                self.save_timeseries_data_network()
+
+        if self.convergence_window:
+            with self.profiler.stage("check_convergence"):
+                self.converged = self.check_convergence()
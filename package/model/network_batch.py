@@ -0,0 +1,373 @@
+"""Run several stochastic seeds of the same parameters at once
+A module that builds one Network_Matrix per seed in params["seed_list"] and then stacks their states into arrays with
+the seeds along the first axis, e.g attitudes of shape (S, N, M) and weighting matrices of shape (S, N, N). Every step
+is then done for all seeds together with batched matrix multiplication, so the Python overhead of a step is paid once
+rather than once per seed.
+
+Each seed keeps its own random number stream, so the results are the same as running the seeds one after another.
+Time series are not saved, only the end state of each seed is available.
+
+Created: 10/10/2022
+"""
+
+# imports
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse as sp
+from package.model.network_matrix import Network_Matrix
+from package.model.discounted_memory import stack_discounted_memories
+from package.model.emissions import calc_individual_emissions, calc_total_emissions
+
+# modules
+class Network_Batch:
+    """
+    Class to represent S simulations of the social network that differ only in their stochastic seed
+
+    ...
+
+    Parameters
+    ----------
+    parameters : dict
+        Dictionary of parameters used to generate attributes, dict used for readability instead of super long list of input parameters
+
+    Attributes
+    ----------
+    seed_list: list[int]
+        stochastic seeds of the simulations
+    S: int
+        number of seeds
+    learning_noise_list: list[Learning_Noise]
+        learning error of each seed, continuing from where the construction of that seed's network left off
+    t: int
+        keep track of time
+    N, M: int
+        number of individuals (including green influencers) and behaviours
+    alpha_change : str
+        determines how  and how often agent's re-asses their connections strength in the social network
+    confirmation_bias, learning_error_scale: float
+        as in Network
+    phi_array: npt.NDArray[float]
+        social susceptibility of the different behaviours
+    dtype: np.dtype
+        floating point type of the state, set by the "precision" parameter
+    adjacency_matrix: npt.NDArray[float]
+        SxNxN array of the network structure of each seed
+    weighting_matrix: npt.NDArray[float]
+        SxNxN array of link strengths
+    edge_rows, edge_columns: npt.NDArray[int]
+        rows and columns of the connections of every seed, numbering individual n of seed s as s*N + n. Only used in the
+        "behavioural_independence" case
+    edge_adjacency: npt.NDArray[float]
+        adjacency_matrix value of each connection, only used in the "behavioural_independence" case
+    edge_row_matrix: sp.csr_array
+        (S*N)xE array summing values over the connections of each individual, only used in the "behavioural_independence" case
+    behavioural_weighting_array: npt.NDArray[float]
+        ExM array of the link strength of each connection of every seed for each behaviour, only used in the
+        "behavioural_independence" case
+    green_fountain_state: npt.NDArray[bool]
+        SxN mask of green influencers
+    attitude_matrix, threshold_matrix, value_matrix: npt.NDArray[float]
+        SxNxM arrays of attitudes, thresholds and values
+    av_behaviour_memory, attitudes_memory: Discounted_Memory
+        memories of past average attitudes and attitudes with the seeds along the second axis of the buffer
+    identity_array: npt.NDArray[float]
+        SxN array of identities
+    attitudes_star_matrix: npt.NDArray[float]
+        SxNxM array of discounted past attitudes, only used in the "behavioural_independence" case
+    social_component_matrix: npt.NDArray[float]
+        SxNxM array of influence of neighbours
+    individual_carbon_emissions_flow: npt.NDArray[float]
+        SxN array of individual emissions
+    init_total_carbon_emissions, total_carbon_emissions_flow, total_carbon_emissions_stock: npt.NDArray[float]
+        emissions of each seed
+    average_identity, std_identity, var_identity: npt.NDArray[float]
+        identity properties of each seed
+
+    Methods
+    -------
+    calc_ego_influence_degroot() -> npt.NDArray:
+        Calculate the influence of neighbours using the Degroot model of weighted aggregation
+    calc_social_component_matrix() -> npt.NDArray:
+        Combine neighbour influence and social learning error
+    calc_weighting_matrix(attribute_array: npt.NDArray) -> tuple[npt.NDArray, npt.NDArray]:
+        Calculate the row normalized link strengths from the similarity of an attribute
+    init_behavioural_weightings(member_list: list[Network_Matrix]):
+        Join the connections of every seed into one list and take their initial link strengths
+    calc_behavioural_weighting_array() -> npt.NDArray:
+        Calculate the link strengths of every behaviour from the similarity of discounted attitudes
+    update_individuals():
+        Update the state of every individual of every seed
+    calc_total_emissions_flow(exclude_influencers: bool = False) -> npt.NDArray:
+        Calculate total carbon emissions of each seed
+    calc_network_identity():
+        Calculate the mean, standard deviation and variance of identity of each seed
+    next_step():
+        Push all the simulations forwards one time step
+    """
+
+    def __init__(self, parameters: dict):
+        """
+        Constructs all the necessary attributes for the Network_Batch object.
+
+        Parameters
+        ----------
+        parameters : dict
+            Dictionary of parameters used to generate attributes, dict used for readability instead of super long list of input parameters
+
+        """
+        if parameters.get("sparse_network", 0):
+            raise ValueError("Network_Batch stores dense SxNxN weighting arrays, it can't be used with sparse_network")
+        if parameters.get("incremental_weighting", 0):
+            raise ValueError("Network_Batch recomputes every link strength each step, it can't be used with incremental_weighting")
+        if parameters.get("convergence_window", 0):
+            raise ValueError("Network_Batch runs every seed to time_steps_max, it can't be used with convergence_window")
+
+        self.seed_list = list(parameters["seed_list"])
+        self.S = len(self.seed_list)
+
+        member_list = []
+        for v in self.seed_list:
+            member_params = dict(parameters)
+            member_params["set_seed"] = v
+            member_params["save_timeseries_data"] = 0
+            member_list.append(Network_Matrix(member_params))
+        self.learning_noise_list = [x.learning_noise for x in member_list]  # carry on the learning error of each seed
+
+        first = member_list[0]
+        self.t = first.t
+        self.N = first.N
+        self.M = first.M
+        self.alpha_change = first.alpha_change
+        self.confirmation_bias = first.confirmation_bias
+        self.learning_error_scale = first.learning_error_scale
+        self.phi_array = first.phi_array
+        self.dtype = first.dtype
+
+        self.adjacency_matrix = np.stack([x.adjacency_matrix for x in member_list])
+        self.weighting_matrix = np.stack([x.weighting_matrix for x in member_list])
+        if self.alpha_change == "behavioural_independence":
+            self.init_behavioural_weightings(member_list)
+
+        self.green_fountain_state = np.stack([x.green_fountain_state for x in member_list])
+        self.attitude_matrix = np.stack([x.attitude_matrix for x in member_list])
+        self.threshold_matrix = np.stack([x.threshold_matrix for x in member_list])
+        self.value_matrix = np.stack([x.value_matrix for x in member_list])
+        self.av_behaviour_memory = stack_discounted_memories([x.av_behaviour_memory for x in member_list])
+        self.identity_array = np.stack([x.identity_array for x in member_list])
+        if self.alpha_change == "behavioural_independence":
+            self.attitudes_memory = stack_discounted_memories([x.attitudes_memory for x in member_list])
+            self.attitudes_star_matrix = np.stack([x.attitudes_star_matrix for x in member_list])
+
+        self.social_component_matrix = np.stack([x.social_component_matrix for x in member_list])
+        self.individual_carbon_emissions_flow = np.stack([x.individual_carbon_emissions_flow for x in member_list])
+
+        self.init_total_carbon_emissions = np.asarray([x.init_total_carbon_emissions for x in member_list])
+        self.total_carbon_emissions_flow = self.init_total_carbon_emissions.copy()
+        self.total_carbon_emissions_stock = self.init_total_carbon_emissions.astype(np.float64)  # double precision whatever the precision
+
+        (
+            self.average_identity,
+            self.std_identity,
+            self.var_identity,
+        ) = self.calc_network_identity()
+
+    def calc_ego_influence_degroot(self) -> npt.NDArray:
+        """
+        Calculate the influence of neighbours using the Degroot model of weighted aggregation, for all seeds at once
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        neighbour_influence: npt.NDArray
+            SxNxM array of the influence of neighbours weighted by the weighting_matrix
+        """
+        if self.alpha_change == "behavioural_independence":
+            neighbour_attitudes = self.attitude_matrix.reshape(self.S * self.N, self.M)[self.edge_columns]
+            neighbour_influence = (self.edge_row_matrix @ (self.behavioural_weighting_array * neighbour_attitudes)).reshape(
+                self.S, self.N, self.M
+            )
+        else:
+            neighbour_influence = np.matmul(self.weighting_matrix, self.attitude_matrix)
+
+        return neighbour_influence
+
+    def calc_social_component_matrix(self) -> npt.NDArray:
+        """
+        Combine neighbour influence and social learning error, the error of each seed is drawn from its own stream
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        social_influence: npt.NDArray
+            SxNxM array giving the influence of social learning from neighbours for that time step
+        """
+        learning_error = np.stack([learning_noise.next() for learning_noise in self.learning_noise_list])
+        return (self.calc_ego_influence_degroot() + learning_error).astype(self.dtype, copy=False)
+
+    def calc_weighting_matrix(self, attribute_array: npt.NDArray) -> tuple[npt.NDArray, npt.NDArray]:
+        """
+        Calculate the row normalized link strengths of every seed from the similarity of an attribute
+
+        Parameters
+        ----------
+        attribute_array: npt.NDArray
+            SxN array of the attribute (identity or discounted attitude) that determines link strength
+
+        Returns
+        -------
+        norm_weighting_matrix: npt.NDArray
+            SxNxN row normalized weighting arrays
+        difference_matrix: npt.NDArray
+            SxNxN differences in the attribute between individuals
+        """
+        difference_matrix = attribute_array[:, :, np.newaxis] - attribute_array[:, np.newaxis, :]
+        alpha_numerator = np.exp(-np.multiply(self.confirmation_bias, np.abs(difference_matrix)))
+        non_diagonal_weighting_matrix = self.adjacency_matrix * alpha_numerator
+        norm_weighting_matrix = non_diagonal_weighting_matrix / non_diagonal_weighting_matrix.sum(axis=2)[:, :, np.newaxis]
+
+        return norm_weighting_matrix, difference_matrix
+
+    def init_behavioural_weightings(self, member_list: list[Network_Matrix]):
+        """
+        Join the connections of every seed into one list, as the connections of a network of S*N individuals made of S
+        separate networks, and take the initial link strengths of each behaviour from the seeds
+
+        Parameters
+        ----------
+        member_list: list[Network_Matrix]
+            the network of each seed
+
+        Returns
+        -------
+        None
+        """
+        self.edge_rows = np.concatenate([x.edge_rows + s * self.N for s, x in enumerate(member_list)])
+        self.edge_columns = np.concatenate([x.edge_columns + s * self.N for s, x in enumerate(member_list)])
+        self.edge_adjacency = np.concatenate([x.edge_adjacency for x in member_list])
+
+        n_edges = len(self.edge_rows)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(self.edge_rows, minlength=self.S * self.N))))
+        self.edge_row_matrix = sp.csr_array(
+            (np.ones(n_edges, dtype=self.dtype), np.arange(n_edges), indptr), shape=(self.S * self.N, n_edges)
+        )
+
+        self.behavioural_weighting_array = np.concatenate([x.behavioural_weighting_array for x in member_list])
+
+    def calc_behavioural_weighting_array(self) -> npt.NDArray:
+        """
+        Calculate the row normalized link strengths of every behaviour of every seed from the similarity of discounted attitudes,
+        over the connections only as in Network.update_behavioural_weightings
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        weighting_array: npt.NDArray
+            ExM row normalized link strengths of each connection for each behaviour
+        """
+        attitudes_star_matrix = self.attitudes_star_matrix.reshape(self.S * self.N, self.M)
+
+        weighting_array = np.abs(attitudes_star_matrix[self.edge_rows] - attitudes_star_matrix[self.edge_columns])
+        np.multiply(weighting_array, -self.confirmation_bias, out=weighting_array)
+        np.exp(weighting_array, out=weighting_array)
+        weighting_array *= self.edge_adjacency[:, np.newaxis]
+        weighting_array /= (self.edge_row_matrix @ weighting_array)[self.edge_rows]  # normalize each row of each behaviour
+
+        return weighting_array
+
+    def update_individuals(self):
+        """
+        Update the state of every individual of every seed, same steps as Individual.next_step
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self.value_matrix = self.attitude_matrix - self.threshold_matrix
+        self.attitude_matrix = (1 - self.phi_array)*self.attitude_matrix + (self.phi_array)*(self.social_component_matrix)
+        self.attitude_matrix[self.green_fountain_state, 0] = 1.0
+
+        if self.alpha_change == "behavioural_independence":
+            self.attitudes_star_matrix = self.attitudes_memory.update(self.attitude_matrix)
+        else:
+            self.identity_array = self.av_behaviour_memory.update(np.mean(self.attitude_matrix, axis=2))
+
+        self.individual_carbon_emissions_flow, __ = calc_individual_emissions(self.value_matrix)
+
+    def calc_total_emissions_flow(self, exclude_influencers: bool = False) -> npt.NDArray:
+        """
+        Calculate total carbon emissions of N*M behaviours of each seed
+
+        Parameters
+        ----------
+        exclude_influencers: bool
+            whether to leave out the emissions of green influencers
+
+        Returns
+        -------
+        npt.NDArray
+            emissions of each seed
+        """
+        green_fountain_state = self.green_fountain_state if exclude_influencers else None
+        return calc_total_emissions(self.individual_carbon_emissions_flow, green_fountain_state)
+
+    def calc_network_identity(self) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+        """
+        Return the mean, standard deviation and variance of identity of each seed
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        identity_mean, identity_std, identity_variance: npt.NDArray
+            arrays of length S
+        """
+        return (
+            np.mean(self.identity_array, axis=1),
+            np.std(self.identity_array, axis=1),
+            np.var(self.identity_array, axis=1),
+        )
+
+    def next_step(self):
+        """
+        Push all the simulations forwards one time step, in the same order as Network.next_step
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self.t += 1
+
+        self.update_individuals()
+
+        if self.alpha_change == "dynamic_culturally_determined_weights":
+            self.weighting_matrix, __ = self.calc_weighting_matrix(self.identity_array)
+        elif self.alpha_change == "behavioural_independence":
+            self.behavioural_weighting_array = self.calc_behavioural_weighting_array()
+
+        self.social_component_matrix = self.calc_social_component_matrix()
+        self.total_carbon_emissions_flow = self.calc_total_emissions_flow()
+        self.total_carbon_emissions_stock += self.total_carbon_emissions_flow
+        (
+            self.average_identity,
+            self.std_identity,
+            self.var_identity,
+        ) = self.calc_network_identity()
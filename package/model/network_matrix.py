@@ -0,0 +1,293 @@
+"""Create social network with the individuals stored as matrices
+A module that runs the same model as network.py but instead of holding a list of Individual objects, the state of
+every individual (attitudes, thresholds, values, identities and emissions) is kept in contiguous NxM or N arrays owned
+by the network. Each time step is then a handful of array operations rather than a Python loop over agents. Green
+influencers are handled with a mask over the rows of these arrays.
+
+The order of random draws is the same as in Network, so for a given seed both give the same simulation.
+
+Created: 10/10/2022
+"""
+
+# imports
+import numpy as np
+import numpy.typing as npt
+from package.model.network import Network
+from package.model.discounted_memory import Discounted_Memory
+from package.model import kernels
+from package.model.emissions import calc_individual_emissions
+
+# modules
+class Network_Matrix(Network):
+    """
+    Class to represent the social network of the simulation, with the individuals' states stored as arrays
+
+    ...
+
+    Parameters
+    ----------
+    parameters : dict
+        Dictionary of parameters used to generate attributes, dict used for readability instead of super long list of input parameters
+
+    Attributes
+    ----------
+    id_array: npt.NDArray[int]
+        id of the individual in each row, rows are ordered by position in the social network
+    green_fountain_state: npt.NDArray[bool]
+        mask of which rows are green influencers
+    attitude_matrix: npt.NDArray[float]
+        NxM array of behavioural attitudes
+    threshold_matrix: npt.NDArray[float]
+        NxM array of behavioural thresholds, static
+    value_matrix: npt.NDArray[float]
+        NxM array of behavioural values, if greater than 0 then the green alternative behaviour is performed. Domain =  [-1,1]
+    av_behaviour_array: npt.NDArray[float]
+        mean attitude towards M behaviours of each individual at time t
+    av_behaviour_memory: Discounted_Memory
+        circular buffer of shape (cultural_inertia, N) of past average attitudes and their discounted sum
+    identity_array: npt.NDArray[float]
+        identity of each individual. Domain = [0,1]
+    attitudes_memory: Discounted_Memory
+        circular buffer of shape (cultural_inertia, N, M) of past attitudes, only used in the "behavioural_independence" case
+    attitudes_star_matrix: npt.NDArray[float]
+        NxM array of time discounted past attitudes, only used in the "behavioural_independence" case
+    individual_carbon_emissions_flow: npt.NDArray[float]
+        emissions of each individual at time t
+    behavioural_carbon_emissions: npt.NDArray[float]
+        NxM array of emissions of each behaviour of each individual at time t
+
+    Methods
+    -------
+    init_agents():
+        Create the individual state arrays, add green influencers and order the rows in the network by identity
+    calc_individual_emissions_flow() -> tuple[npt.NDArray, npt.NDArray]:
+        Return the emissions of each individual and each of their behaviours
+    save_timeseries_data_individuals():
+        Save individual time series data
+    """
+
+    def init_agents(self):
+        """
+        Create the individual state arrays, add any green influencers and then order the rows in the network by identity.
+        Mirrors the creation of Individual and Individual_one_m_green_influencer objects in Network
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self.attitude_matrix = self.attitude_matrix_init.copy()
+        self.threshold_matrix = self.threshold_matrix_init.copy()
+        self.green_fountain_state = np.zeros(self.N, dtype=bool)
+
+        if self.green_N > 0:
+            attitude_matrix_green_N = self.construction_rng.beta(self.a_attitude, self.b_attitude, size=(self.green_N, self.M))
+            threshold_matrix_green_N = self.construction_rng.beta(self.a_threshold, self.b_threshold, size=(self.green_N, self.M))
+            self.attitude_matrix = np.vstack([self.attitude_matrix, attitude_matrix_green_N.astype(self.dtype)])
+            self.threshold_matrix = np.vstack([self.threshold_matrix, threshold_matrix_green_N.astype(self.dtype)])
+            self.green_fountain_state = np.concatenate([self.green_fountain_state, np.ones(self.green_N, dtype=bool)])
+            self.N = self.N + self.green_N
+
+            # green influencers have one perfect green behaviour (the first) that is socially inert
+            self.attitude_matrix[self.green_fountain_state, 0] = 1.0
+            self.threshold_matrix[self.green_fountain_state, 0] = 0.0
+
+        self.id_array = np.arange(self.N)
+
+        self.value_matrix = self.attitude_matrix - self.threshold_matrix
+        self.av_behaviour_array = np.mean(self.attitude_matrix, axis=1)
+        self.av_behaviour_memory = Discounted_Memory(self.av_behaviour_array, self.normalized_discount_array, self.discount_factor)
+        self.identity_array = self.av_behaviour_memory.discounted_value
+
+        if self.alpha_change == "behavioural_independence":
+            self.attitudes_memory = Discounted_Memory(self.attitude_matrix, self.normalized_discount_array, self.discount_factor)
+            self.attitudes_star_matrix = self.attitudes_memory.discounted_value
+
+        (
+            self.individual_carbon_emissions_flow,
+            self.behavioural_carbon_emissions,
+        ) = self.calc_individual_emissions_flow()
+
+        self.shuffle_agent_list()
+
+        if self.save_timeseries_data:
+            self.save_timeseries_data_individuals()
+
+    def shuffle_agent_list(self):
+        """
+        Sort the rows by identity, make the order circular and then partially shuffle it, as Network.shuffle_agent_list
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        order = self.calc_shuffle_order(self.identity_array)
+
+        self.id_array = self.id_array[order]
+        self.green_fountain_state = self.green_fountain_state[order]
+        self.attitude_matrix = self.attitude_matrix[order]
+        self.threshold_matrix = self.threshold_matrix[order]
+        self.value_matrix = self.value_matrix[order]
+        self.av_behaviour_array = self.av_behaviour_array[order]
+        self.av_behaviour_memory.reorder(order)
+        self.identity_array = self.identity_array[order]
+        self.individual_carbon_emissions_flow = self.individual_carbon_emissions_flow[order]
+        self.behavioural_carbon_emissions = self.behavioural_carbon_emissions[order]
+        if self.alpha_change == "behavioural_independence":
+            self.attitudes_memory.reorder(order)
+            self.attitudes_star_matrix = self.attitudes_star_matrix[order]
+
+    def get_behavioural_attitude_matrix(self) -> npt.NDArray:
+        return self.attitude_matrix
+
+    def get_attitudes_star_matrix(self) -> npt.NDArray:
+        return self.attitudes_star_matrix
+
+    def get_identity_array(self) -> npt.NDArray:
+        return self.identity_array
+
+    def get_id_array(self) -> npt.NDArray:
+        return self.id_array
+
+    def get_individual_emissions_flow_array(self) -> npt.NDArray:
+        return self.individual_carbon_emissions_flow
+
+    def get_green_fountain_state(self) -> npt.NDArray:
+        return self.green_fountain_state
+
+    def calc_individual_emissions_flow(self) -> tuple[npt.NDArray, npt.NDArray]:
+        """
+        Return the emissions of each individual and each of their behaviours based on behavioural values
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        individual_carbon_emissions_flow: npt.NDArray
+            emissions of each individual
+        behavioural_carbon_emissions: npt.NDArray
+            NxM array of emissions of each behaviour
+        """
+        return calc_individual_emissions(self.value_matrix)  # normalized Beta now used for emissions
+
+    def calc_network_identity(self) -> tuple[npt.NDArray, float, float, float, float, float]:
+        """
+        Return various identity properties, such as mean, variance, min and max
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        identity_list: npt.NDArray
+            array of individuals identity
+        identity_mean: float
+            mean of network identity at time step t
+        identity_std: float
+            std of network identity at time step t
+        identity_variance: float
+            variance of network identity at time step t
+        identity_max: float
+            max of network identity at time step t
+        identity_min: float
+            min of network identity at time step t
+        """
+        identity_list = self.identity_array
+        identity_mean = np.mean(identity_list)
+        identity_std = np.std(identity_list)
+        identity_variance = np.var(identity_list)
+        identity_max = np.max(identity_list)
+        identity_min = np.min(identity_list)
+        return (identity_list, identity_mean, identity_std, identity_variance, identity_max, identity_min)
+
+    def save_timeseries_data_individuals(self):
+        """
+        Save individual time series data, the columns of the agent time series are ordered by id
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        row = self.t // self.compression_factor
+        self.history.save("behaviour_values", row, self.value_matrix, self.id_array)
+        self.history.save("behaviour_attitudes", row, self.attitude_matrix, self.id_array)
+        self.history.save("behaviour_thresholds", row, self.threshold_matrix, self.id_array)
+        self.history.save("identity", row, self.identity_array, self.id_array)
+        self.history.save("av_behaviour", row, self.av_behaviour_array, self.id_array)
+        self.history.save("individual_carbon_emissions_flow", row, self.individual_carbon_emissions_flow, self.id_array)
+        self.history.save("behavioural_carbon_emissions", row, self.behavioural_carbon_emissions, self.id_array)
+
+    def update_individuals(self):
+        """
+        Update all individuals at once with new information regarding social interactions. Same steps as Individual.next_step
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self.kernel_backend == "numba":
+            remember_attitudes = self.alpha_change == "behavioural_independence"
+            memory = self.attitudes_memory if remember_attitudes else self.av_behaviour_memory
+            assert memory.buffer.flags.c_contiguous, "the kernel writes into the memory buffer, which must be C contiguous"
+            (
+                self.value_matrix,
+                self.attitude_matrix,
+                av_behaviour_array,
+                self.individual_carbon_emissions_flow,
+                self.behavioural_carbon_emissions,
+                discounted_value,
+            ) = kernels.update_individuals_kernel(
+                self.attitude_matrix,
+                self.threshold_matrix,
+                self.phi_array,
+                self.social_component_matrix,
+                self.green_fountain_state,
+                memory.buffer.reshape(memory.cultural_inertia, self.N, -1),  # a view, so the kernel writes into the buffer
+                memory.position,
+                memory.discounted_value.reshape(self.N, -1),
+                memory.discount_factor,
+                memory.newest_weight,
+                memory.oldest_weight,
+                remember_attitudes,
+            )
+            memory.advance(discounted_value.reshape(memory.discounted_value.shape))
+            if remember_attitudes:
+                self.attitudes_star_matrix = memory.discounted_value
+            else:
+                self.av_behaviour_array = av_behaviour_array
+                self.identity_array = memory.discounted_value
+        else:
+            self.value_matrix = self.attitude_matrix - self.threshold_matrix
+            self.attitude_matrix = (1 - self.phi_array)*self.attitude_matrix + (self.phi_array)*(self.social_component_matrix)
+            self.attitude_matrix[self.green_fountain_state, 0] = 1.0
+            (
+                self.individual_carbon_emissions_flow,
+                self.behavioural_carbon_emissions,
+            ) = self.calc_individual_emissions_flow()
+
+            if self.alpha_change == "behavioural_independence":
+                self.attitudes_star_matrix = self.attitudes_memory.update(self.attitude_matrix)
+            else:
+                self.av_behaviour_array = np.mean(self.attitude_matrix, axis=1)
+                self.identity_array = self.av_behaviour_memory.update(self.av_behaviour_array)
+
+        if (self.save_timeseries_data) and (self.t % self.compression_factor == 0):
+            self.save_timeseries_data_individuals()
@@ -8,6 +8,8 @@ Created: 10/10/2022
 # imports
 import numpy as np
 import numpy.typing as npt
+from package.model.discounted_memory import Discounted_Memory
+from package.model.emissions import calc_individual_emissions
 
 # modules
 class Individual_one_m_green_influencer:
@@ -39,29 +41,33 @@ class Individual_one_m_green_influencer:
         mean attitude towards M behaviours at time t
     av_behaviour_value
         mean value towards M behaviours at time t
-    av_behaviour_list: list[float]
-        time series of past average attitude combined with values depending on action_observation_I, as far back as cultural_inertia
+    av_behaviour_memory: Discounted_Memory
+        circular buffer of past average attitudes, as far back as cultural_inertia, and their discounted sum
+    attitudes_memory: Discounted_Memory
+        circular buffer of past attitudes and their discounted sum, only used in the "behavioural_independence" case
     identity: float
         identity of the individual, if > 0.5 it is considered green. Determines who individuals pay attention to. Domain = [0,1]
     total_carbon_emissions: float
         total carbon emissions of that individual due to their behaviour
-    history_behaviour_values: list[list[float]]
+    history: History_Recorder
+        recorder shared with the network in which the time series are saved, in the column of this individual's id
+    history_behaviour_values: npt.NDArray[float]
         timeseries of past behavioural values
-    history_behaviour_attitudes: list[list[float]]
+    history_behaviour_attitudes: npt.NDArray[float]
         timeseries of past behavioural attitudes
-    self.history_behaviour_thresholds: list[list[float]]
+    self.history_behaviour_thresholds: npt.NDArray[float]
         timeseries of past behavioural thresholds, static in the current model version
-    self.history_av_behaviour: list[float]
+    self.history_av_behaviour: npt.NDArray[float]
         timeseries of past average behavioural attitudes
-    self.history_identity: list[float]
+    self.history_identity: npt.NDArray[float]
         timeseries of past identity values
-    self.history_carbon_emissions: list[float]
+    self.history_individual_carbon_emissions_flow: npt.NDArray[float]
         timeseries of past individual total emissions
 
     Methods
     -------
-    update_av_behaviour_list():
-        Update moving average of past behaviours, inserting present value and 0th index and removing the oldest value
+    update_av_behaviour_memory():
+        Update memory of past behaviours, inserting the present value and removing the oldest value
     calc_identity() -> float:
         Calculate the individual identity from past average attitudes weighted by the truncated quasi-hyperbolic discounting factor
     update_values():
@@ -116,6 +122,8 @@ class Individual_one_m_green_influencer:
         self.compression_factor = individual_params["compression_factor"]
         self.phi_array = individual_params["phi_array"]
         self.alpha_change = individual_params["alpha_change"]
+        self.discount_factor = individual_params["discount_factor"]
+        self.history = individual_params["history"]
 
         self.id = id_n
 
@@ -128,32 +136,34 @@ class Individual_one_m_green_influencer:
         ##################################################
 
         if self.alpha_change == "behavioural_independence":
-            self.attitudes_matrix = np.tile(self.attitudes, (self.cultural_inertia,1))
+            self.attitudes_memory = Discounted_Memory(self.attitudes, self.normalized_discount_vector, self.discount_factor)
             self.attitudes_star = self.calc_attitudes_star()
 
         self.values = self.attitudes - self.thresholds
         self.av_behaviour = np.mean(self.attitudes)
-        self.av_behaviour_list = [self.av_behaviour] * self.cultural_inertia
+        self.av_behaviour_memory = Discounted_Memory(self.av_behaviour, self.normalized_discount_vector, self.discount_factor)
         self.identity = self.calc_identity()
         self.initial_carbon_emissions,self.behavioural_carbon_emissions = self.calc_total_emissions_flow()
         self.individual_carbon_emissions_flow = self.initial_carbon_emissions
 
 
         if self.save_timeseries_data:
-            self.history_behaviour_values = [list(self.values)]
-            self.history_behaviour_attitudes = [list(self.attitudes)]
-            self.history_behaviour_thresholds = [list(self.thresholds)]
-            self.history_av_behaviour = [self.av_behaviour]
-            self.history_identity = [self.identity]
-            self.history_individual_carbon_emissions_flow = [self.individual_carbon_emissions_flow]
-            self.history_behavioural_carbon_emissions = [self.behavioural_carbon_emissions]
+            self.save_timeseries_data_individual()
+
+    def __getattr__(self, name: str):
+        # history_* attributes are views of this individual's column in the shared History_Recorder
+        history = self.__dict__.get("history")
+        if history is not None and name.startswith("history_") and name[len("history_"):] in history.agent_channels:
+            return history.get(name[len("history_"):])[:, self.id]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
 
     def calc_av_behaviour(self):
         self.av_behaviour = np.mean(self.attitudes)
 
-    def update_av_behaviour_list(self):
+    def update_av_behaviour_memory(self):
         """
-        Update moving average of past behaviours, inserting present value and 0th index and removing the oldest value
+        Update memory of past behaviours, inserting the present value and removing the oldest value. The discounted
+        sum of the memory is updated incrementally
 
         Parameters
         ----------
@@ -163,8 +173,7 @@ class Individual_one_m_green_influencer:
         -------
         None
         """
-        self.av_behaviour_list.pop()
-        self.av_behaviour_list.insert(0, self.av_behaviour)
+        self.av_behaviour_memory.update(self.av_behaviour)
 
     def calc_identity(self) -> float:
         """
@@ -179,17 +188,13 @@ class Individual_one_m_green_influencer:
         float
         """
 
-        return np.matmul(
-            self.normalized_discount_vector, self.av_behaviour_list
-        )  # here discount list is normalized
+        return self.av_behaviour_memory.discounted_value  # here discount list is normalized
 
-    def update_attitudes_matrix(self):       
-        self.attitudes_matrix =  np.vstack([np.asarray([self.attitudes]), self.attitudes_matrix[:-1,:]])
+    def update_attitudes_memory(self):
+        self.attitudes_memory.update(self.attitudes)
 
     def calc_attitudes_star(self):
-        return np.matmul(
-            self.normalized_discount_vector, self.attitudes_matrix
-        )  # here discount list is normalized
+        return self.attitudes_memory.discounted_value  # here discount list is normalized
 
     def update_values(self):
         """
@@ -230,10 +235,12 @@ class Individual_one_m_green_influencer:
 
         Returns
         -------
-        float
+        individual_carbon_emissions_flow: float
+            emissions of the individual
+        behavioural_carbon_emissions: npt.NDArray
+            emissions of each behaviour
         """
-        behavioural_emissions = [((1-self.values[i])/2) for i in range(self.M)]
-        return sum(behavioural_emissions),behavioural_emissions# normalized Beta now used for emissions
+        return calc_individual_emissions(self.values)# normalized Beta now used for emissions
 
     def save_timeseries_data_individual(self):
         """
@@ -247,13 +254,14 @@ class Individual_one_m_green_influencer:
         -------
         None
         """
-        self.history_behaviour_values.append(list(self.values))
-        self.history_behaviour_attitudes.append(list(self.attitudes))
-        self.history_behaviour_thresholds.append(list(self.thresholds))
-        self.history_identity.append(self.identity)
-        self.history_av_behaviour.append(self.av_behaviour)
-        self.history_individual_carbon_emissions_flow.append(self.individual_carbon_emissions_flow)
-        self.history_behavioural_carbon_emissions.append(self.behavioural_carbon_emissions)
+        row = self.t // self.compression_factor
+        self.history.save("behaviour_values", row, self.values, self.id)
+        self.history.save("behaviour_attitudes", row, self.attitudes, self.id)
+        self.history.save("behaviour_thresholds", row, self.thresholds, self.id)
+        self.history.save("identity", row, self.identity, self.id)
+        self.history.save("av_behaviour", row, self.av_behaviour, self.id)
+        self.history.save("individual_carbon_emissions_flow", row, self.individual_carbon_emissions_flow, self.id)
+        self.history.save("behavioural_carbon_emissions", row, self.behavioural_carbon_emissions, self.id)
 
     def next_step(self, t: int, social_component: npt.NDArray):
         """
@@ -276,11 +284,11 @@ class Individual_one_m_green_influencer:
         self.update_attitudes(social_component)
 
         if self.alpha_change == "behavioural_independence":
-            self.update_attitudes_matrix()
+            self.update_attitudes_memory()
             self.attitudes_star = self.calc_attitudes_star()
         else:
             self.calc_av_behaviour()
-            self.update_av_behaviour_list()
+            self.update_av_behaviour_memory()
             self.identity = self.calc_identity()
 
         self.individual_carbon_emissions_flow, self.behavioural_carbon_emissions = self.calc_total_emissions_flow()
@@ -0,0 +1,164 @@
+"""Time the stages of a simulation step
+A module that defines a profiler which accumulates the number of calls and wall clock time of each stage of
+Network.next_step (updating individuals, link strengths, social influence, emissions, identity and saving data).
+The report shows where the time of a run goes for a given alpha_change, engine and N, M, K.
+
+When profiling is off every stage is entered through the same empty context, so the cost of an unprofiled step is unchanged.
+
+Created: 10/10/2022
+"""
+
+# imports
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+NULL_STAGE = nullcontext()
+
+# modules
+class Step_Profiler:
+    """
+    Class to represent the accumulated timings of the stages of a simulation
+
+    ...
+
+    Attributes
+    ----------
+    enabled: bool
+        whether stages are timed
+    calls: dict[str, int]
+        number of times each stage was run
+    times: dict[str, float]
+        total wall clock time of each stage in seconds
+
+    Methods
+    -------
+    stage(name: str):
+        Context in which a stage runs, timed if enabled
+    add(name: str, seconds: float):
+        Add one call of a stage
+    get_report() -> dict:
+        Return the counts and timings of every stage
+    save_report(path: str):
+        Write the report as JSON
+    print_report():
+        Print the report as a table
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Constructs all the necessary attributes for the Step_Profiler object.
+
+        Parameters
+        ----------
+        enabled: bool
+            whether stages are timed
+        """
+        self.enabled = enabled
+        self.calls = {}
+        self.times = {}
+
+    def add(self, name: str, seconds: float):
+        """
+        Add one call of a stage
+
+        Parameters
+        ----------
+        name: str
+            name of the stage e.g "update_individuals"
+        seconds: float
+            wall clock time of the call
+
+        Returns
+        -------
+        None
+        """
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timed_stage(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time)
+
+    def stage(self, name: str):
+        """
+        Context in which a stage runs, e.g with profiler.stage("update_individuals"): ...
+
+        Parameters
+        ----------
+        name: str
+            name of the stage
+
+        Returns
+        -------
+        context manager
+            times the stage if enabled, otherwise does nothing
+        """
+        if self.enabled:
+            return self.timed_stage(name)
+        return NULL_STAGE
+
+    def get_report(self) -> dict:
+        """
+        Return the counts and timings of every stage, with the share of the total time spent in each
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        report: dict
+            {"total_time": float, "stages": {name: {"calls", "total_time", "mean_time", "fraction"}}}
+        """
+        total_time = sum(self.times.values())
+        stages = {}
+        for name in sorted(self.times, key=self.times.get, reverse=True):
+            stages[name] = {
+                "calls": self.calls[name],
+                "total_time": self.times[name],
+                "mean_time": self.times[name] / self.calls[name],
+                "fraction": self.times[name] / total_time if total_time > 0 else 0.0,
+            }
+        return {"total_time": total_time, "stages": stages}
+
+    def save_report(self, path: str):
+        """
+        Write the report as JSON
+
+        Parameters
+        ----------
+        path: str
+            file to write e.g "results/profile.json"
+
+        Returns
+        -------
+        None
+        """
+        with open(path, "w") as f:
+            json.dump(self.get_report(), f, indent=4)
+
+    def print_report(self):
+        """
+        Print the report as a table, slowest stage first
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        report = self.get_report()
+        print("%-32s %8s %12s %12s %8s" % ("stage", "calls", "total (s)", "mean (s)", "share"))
+        for name, stage in report["stages"].items():
+            print(
+                "%-32s %8d %12.4f %12.2e %7.1f%%"
+                % (name, stage["calls"], stage["total_time"], stage["mean_time"], 100 * stage["fraction"])
+            )
+        print("%-32s %8s %12.4f" % ("total", "", report["total_time"]))
@@ -0,0 +1,86 @@
+"""Create the random number streams of a simulation
+A module that gives each simulation its own random number generators, seeded from set_seed, instead of seeding and
+drawing from NumPy's global state. Simulations can then run side by side in one process or thread pool without sharing
+a stream.
+
+Two kinds of stream are available, chosen with the "rng" parameter:
+- "legacy" (default): a np.random.RandomState(set_seed), which draws exactly the numbers that np.random.seed(set_seed)
+  followed by the global np.random functions did, so earlier results are reproduced. One stream is used for everything.
+- "generator": np.random.Generator streams using PCG64 and the ziggurat normal sampler. A SeedSequence
+  made from set_seed is spawned into independent child streams, one for building the network and one for the learning
+  noise of each step, so the noise does not depend on how many numbers the construction drew.
+
+Created: 10/10/2022
+"""
+
+# imports
+import numpy as np
+
+RNG_TYPES = ["legacy", "generator"]
+
+# modules
+def create_rng_streams(set_seed: int, rng_type: str = "legacy") -> tuple:
+    """
+    Create the random number streams of a simulation
+
+    Parameters
+    ----------
+    set_seed: int
+        stochastic seed of the simulation
+    rng_type: str
+        "legacy" or "generator"
+
+    Returns
+    -------
+    construction_rng: np.random.RandomState or np.random.Generator
+        stream used to build the network (initial attitudes, thresholds and shuffling)
+    noise_rng: np.random.RandomState or np.random.Generator
+        stream used for the learning noise of each step, the same object as construction_rng for "legacy"
+    """
+    if rng_type not in RNG_TYPES:
+        raise ValueError("Unknown rng %s, choose from %s" % (rng_type, RNG_TYPES))
+
+    if rng_type == "legacy":
+        rng = np.random.RandomState(set_seed)
+        return rng, rng
+
+    construction_seed, noise_seed = np.random.SeedSequence(set_seed).spawn(2)
+    return np.random.Generator(np.random.PCG64(construction_seed)), np.random.Generator(np.random.PCG64(noise_seed))
+
+def create_topology_rng(set_seed: int) -> np.random.Generator:
+    """
+    Create the stream used to generate the network with NumPy (see small_world.py), a child of the SeedSequence of set_seed
+    independent of the construction and noise streams, so the network only depends on set_seed and its size
+
+    Parameters
+    ----------
+    set_seed: int
+        stochastic seed of the simulation
+
+    Returns
+    -------
+    np.random.Generator
+    """
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(set_seed).spawn(3)[2]))
+
+def draw_integers(rng, low: int, high: int, size: int) -> np.ndarray:
+    """
+    Draw integers in [low, high) from either kind of stream
+
+    Parameters
+    ----------
+    rng: np.random.RandomState or np.random.Generator
+        the stream
+    low, high: int
+        range of the integers, high excluded
+    size: int
+        number of integers
+
+    Returns
+    -------
+    np.ndarray
+        the integers
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng.integers(low, high, size=size)
+    return rng.randint(low=low, high=high, size=size)
@@ -0,0 +1,82 @@
+"""Generate Watts-Strogatz small world networks with NumPy
+A module that builds the edges of a Watts-Strogatz small world network as arrays, without creating a networkx graph.
+As in networkx.watts_strogatz_graph each node is first joined to its k//2 nearest neighbours on each side of a ring,
+then each of these edges is rewired with probability p to a node picked uniformly at random, avoiding self loops and
+repeated edges. Here all the rewirings are drawn at once and any that clash are drawn again together, instead of one
+edge at a time.
+
+The edges are drawn from their own stream seeded with set_seed, see random_streams.create_topology_rng. The graphs
+have the same distribution as the networkx ones but are not the same graphs, so results differ from the default
+"network_generator": "networkx".
+
+Created: 10/10/2022
+"""
+
+# imports
+import numpy as np
+import numpy.typing as npt
+
+MAX_REDRAWS = 100
+
+# modules
+def watts_strogatz_edges(n: int, k: int, p: float, rng: np.random.Generator) -> tuple[npt.NDArray, npt.NDArray]:
+    """
+    Return the edges of a Watts-Strogatz small world network
+
+    Parameters
+    ----------
+    n: int
+        number of nodes
+    k: int
+        each node is joined to its k nearest neighbours in the ring
+    p: float
+        probability of rewiring each edge
+    rng: np.random.Generator
+        stream the rewiring is drawn from
+
+    Returns
+    -------
+    source_array, target_array: npt.NDArray[int]
+        the two ends of each edge, each edge appears once
+    """
+    if k > n:
+        raise ValueError("k>n, choose smaller k or larger n")
+    if k == n:  # the ring lattice is the complete graph
+        return np.triu_indices(n, 1)
+
+    half_k = k // 2
+    source_array = np.tile(np.arange(n), half_k)
+    original_target_array = (source_array + np.repeat(np.arange(1, half_k + 1), n)) % n
+    target_array = original_target_array.copy()
+
+    if p <= 0 or 2 * half_k >= n - 1:  # nodes joined to every other node cannot be rewired
+        return source_array, target_array
+
+    redraw_array = np.flatnonzero(rng.random(len(source_array)) < p)
+    for __ in range(MAX_REDRAWS):
+        if len(redraw_array) == 0:
+            break
+        target_array[redraw_array] = rng.integers(0, n, size=len(redraw_array))
+
+        # an edge clashes if it is a self loop, its old edge, or already present. Of the copies of an edge the unchanged
+        # one is kept, otherwise the first rewired one
+        pending = np.zeros(len(source_array), dtype=bool)
+        pending[redraw_array] = True
+        key_array = np.minimum(source_array, target_array) * n + np.maximum(source_array, target_array)
+        sort_index = np.lexsort((pending, key_array))
+        repeated = np.zeros(len(source_array), dtype=bool)
+        repeated[sort_index[1:]] = key_array[sort_index[1:]] == key_array[sort_index[:-1]]
+
+        clash = pending & (
+            (source_array == target_array) | (target_array == original_target_array) | repeated
+        )
+        redraw_array = np.flatnonzero(clash)
+    else:
+        # the edges still clashing cannot be rewired as their node is already joined to every other node, which can happen in
+        # very small dense networks. Like networkx they keep their old edge, unless it has been made by another rewiring
+        target_array[redraw_array] = original_target_array[redraw_array]
+        key_array = np.minimum(source_array, target_array) * n + np.maximum(source_array, target_array)
+        __, first_index = np.unique(key_array, return_index=True)
+        source_array, target_array = source_array[np.sort(first_index)], target_array[np.sort(first_index)]
+
+    return source_array, target_array
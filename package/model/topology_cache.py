@@ -0,0 +1,263 @@
+"""Cache the small world networks shared by runs
+A module that keeps the small world networks built by Network so that runs with the same network only build it once.
+The network of a run depends only on its number of individuals (including green influencers), K, prob_rewire, set_seed
+and network_generator. In a parameter sweep over other parameters (e.g confirmation_bias in a bifurcation run) every run
+with the same seed has the same network.
+
+Two levels are available:
+- a cache in memory for each process, off by default and turned on with "topology_cache": 1 in the sweeps whose runs
+  share networks (bifurcation_gen.py, adding_green_influencers_gen.py and sensitivity_analysis_gen.py). It holds the
+  adjacency matrix, the initial row normalized link strengths and the networkx graph, up to max_bytes, forgetting the
+  least recently used networks first. The cached arrays are read only and the graph is frozen. The link strengths are
+  copied for each run, as they change during a run.
+- a folder on disk, set with "topology_cache_dir", shared between processes and sessions. It holds the connections of
+  each network in CSR form (indptr and indices) as .npz files, from which the matrices are rebuilt.
+
+A network built from the cache is the same as one built directly, so results do not change. Change TOPOLOGY_VERSION
+whenever the generation of the networks changes, so that old files on disk are no longer used.
+
+Created: 10/10/2022
+"""
+
+# imports
+import os
+import tempfile
+from collections import OrderedDict
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse as sp
+import networkx as nx
+
+TOPOLOGY_VERSION = "1"
+DEFAULT_MAX_BYTES = 256 * 1024**2
+
+# modules
+def calc_topology_nbytes(topology: dict) -> int:
+    """
+    Return the memory used by the arrays of a cached network
+
+    Parameters
+    ----------
+    topology: dict
+        "adjacency_matrix", "weighting_matrix", "network" and "number_of_edges" of a network
+
+    Returns
+    -------
+    int
+        bytes of the adjacency and weighting matrices
+    """
+    nbytes = 0
+    for matrix in (topology["adjacency_matrix"], topology["weighting_matrix"]):
+        if sp.issparse(matrix):
+            nbytes += matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+        else:
+            nbytes += matrix.nbytes
+    return nbytes
+
+def set_read_only(matrix):
+    # shared between runs, so any attempt to change the cached arrays fails
+    for array in (matrix.data, matrix.indices, matrix.indptr) if sp.issparse(matrix) else (matrix,):
+        array.setflags(write=False)
+
+class Topology_Cache:
+    """
+    Class to represent the networks built in this process, keyed by everything that determines them
+
+    ...
+
+    Parameters
+    ----------
+    max_bytes: int
+        maximum memory of the cached matrices, a network larger than this is not cached
+
+    Attributes
+    ----------
+    max_bytes: int
+        maximum memory of the cached matrices
+    topologies: OrderedDict[tuple, dict]
+        cached networks, least recently used first
+    nbytes: int
+        memory of the cached matrices
+    hits, misses: int
+        number of networks found and not found in the cache
+
+    Methods
+    -------
+    get(key: tuple, need_network: bool) -> dict:
+        Return a cached network, or None if it is missing
+    add(key: tuple, topology: dict):
+        Cache a network
+    clear():
+        Forget every network
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Constructs all the necessary attributes for the Topology_Cache object.
+
+        Parameters
+        ----------
+        max_bytes: int
+            maximum memory of the cached matrices
+        """
+        self.max_bytes = max_bytes
+        self.topologies = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, need_network: bool = False) -> dict:
+        """
+        Return a cached network
+
+        Parameters
+        ----------
+        key: tuple
+            (N + green_N, K, prob_rewire, set_seed, network_generator, sparse_network, dtype)
+        need_network: bool
+            whether the networkx graph is needed, a network cached without its graph is then treated as missing
+
+        Returns
+        -------
+        topology: dict
+            "adjacency_matrix", "weighting_matrix", "network" and "number_of_edges", None if it is missing
+        """
+        topology = self.topologies.get(key)
+        if topology is None or (need_network and topology["network"] is None):
+            self.misses += 1
+            return None
+        self.topologies.move_to_end(key)
+        self.hits += 1
+        return topology
+
+    def add(self, key: tuple, topology: dict):
+        """
+        Cache a network, making its arrays read only and freezing its graph, then forget the least recently used networks
+        until the cache fits in max_bytes
+
+        Parameters
+        ----------
+        key: tuple
+            (N + green_N, K, prob_rewire, set_seed, network_generator, sparse_network, dtype)
+        topology: dict
+            "adjacency_matrix", "weighting_matrix", "network" and "number_of_edges" of the network
+
+        Returns
+        -------
+        None
+        """
+        nbytes = calc_topology_nbytes(topology)
+        if nbytes > self.max_bytes:
+            return
+
+        set_read_only(topology["adjacency_matrix"])
+        set_read_only(topology["weighting_matrix"])
+        if topology["network"] is not None:
+            nx.freeze(topology["network"])
+
+        if key in self.topologies:
+            self.nbytes -= calc_topology_nbytes(self.topologies.pop(key))
+        self.topologies[key] = topology
+        self.nbytes += nbytes
+
+        while self.nbytes > self.max_bytes:
+            __, oldest = self.topologies.popitem(last=False)
+            self.nbytes -= calc_topology_nbytes(oldest)
+
+    def clear(self):
+        """
+        Forget every network
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self.topologies.clear()
+        self.nbytes = 0
+
+TOPOLOGY_CACHE = Topology_Cache()  # one per process
+
+def calc_structure_path(directory: str, n: int, K: int, prob_rewire: float, set_seed: int, network_generator: str) -> str:
+    """
+    Return the file holding the connections of a network in the on disk cache
+
+    Parameters
+    ----------
+    directory: str
+        folder of the cache
+    n: int
+        number of individuals, including green influencers
+    K: int
+        number of neighbours each individual starts with
+    prob_rewire: float
+        probability of rewiring each connection
+    set_seed: int
+        stochastic seed of the simulation
+    network_generator: str
+        "networkx" or "numpy", the networkx version is part of the name as its networks may change between versions
+
+    Returns
+    -------
+    str
+        path of the .npz file
+    """
+    if network_generator == "networkx":
+        network_generator = "networkx" + nx.__version__
+    return os.path.join(
+        directory,
+        "ws_v%s_%s_n%d_k%d_p%r_seed%d.npz" % (TOPOLOGY_VERSION, network_generator, n, K, float(prob_rewire), int(set_seed)),
+    )
+
+def save_structure(path: str, adjacency_matrix):
+    """
+    Save the connections of a network in CSR form, writing to a temporary file then renaming it so that other processes
+    never read a partly written file
+
+    Parameters
+    ----------
+    path: str
+        .npz file to write
+    adjacency_matrix: npt.NDArray or sp.csr_array
+        adjacency matrix of the network, dense or sparse
+
+    Returns
+    -------
+    None
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    structure = adjacency_matrix if sp.issparse(adjacency_matrix) else sp.csr_array(adjacency_matrix)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, indptr=structure.indptr, indices=structure.indices)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def load_structure(path: str) -> tuple[npt.NDArray, npt.NDArray]:
+    """
+    Load the connections of a network saved by save_structure
+
+    Parameters
+    ----------
+    path: str
+        .npz file to read
+
+    Returns
+    -------
+    indptr, indices: npt.NDArray[int]
+        the connections of each individual in CSR form, with sorted columns. None if the file does not exist
+    """
+    try:
+        with np.load(path) as structure:
+            return structure["indptr"], structure["indices"]
+    except FileNotFoundError:
+        return None
@@ -6,6 +6,7 @@ import numpy as np
 from matplotlib.colors import  Normalize
 from matplotlib.cm import get_cmap
 from package.resources.utility import save_object,load_object, get_cluster_list,calc_num_clusters_set_bandwidth
+from package.resources.network_reader import load_network_list
 from package.resources.plot import (
     live_print_identity_timeseries_with_weighting,
     plot_joint_cluster_micro,
@@ -57,7 +58,7 @@ def main(
     cmap_weighting = get_cmap("Reds")
     cmap_multi = get_cmap("plasma")
     
-    data_list = load_object(fileName + "/Data", "data_list")
+    data_list = load_network_list(fileName + "/Data", "data_list")
     property_varied = load_object(fileName + "/Data", "property_varied")
     title_list = load_object(fileName + "/Data", "title_list")
     
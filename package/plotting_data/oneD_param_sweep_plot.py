@@ -7,6 +7,7 @@ Created: 10/10/2022
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap, Normalize
 from package.resources.utility import load_object
+from package.resources.network_reader import load_network_list
 from package.resources.plot import (
     live_print_identity_timeseries,
     print_live_initial_identity_networks_and_identity_timeseries,
@@ -29,7 +30,7 @@ def main(
 
     ############################
 
-    data_list = load_object(fileName + "/Data", "data_list")
+    data_list = load_network_list(fileName + "/Data", "data_list")
     property_varied = load_object(fileName + "/Data", "property_varied")
     property_varied_title = load_object(fileName + "/Data", "property_varied_title")
     property_values_list = load_object(fileName + "/Data", "property_values_list")
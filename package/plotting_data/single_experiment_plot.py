@@ -7,9 +7,7 @@ import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap, Normalize
 from matplotlib.cm import get_cmap
 import numpy as np
-from package.resources.utility import ( 
-    load_object,
-)
+from package.resources.network_reader import load_network
 from package.plotting_data.identity_frequency_plot import calc_groups
 from package.resources.plot import (
     plot_identity_timeseries,
@@ -49,7 +47,7 @@ def main(
         "BrownGreen", ["sienna", "whitesmoke", "olivedrab"], gamma=1
     )
 
-    Data = load_object(fileName + "/Data", "social_network")
+    Data = load_network(fileName + "/Data", "social_network")
 
     ###PLOTS
     if PLOT_NAME == "INDIVIDUAL":
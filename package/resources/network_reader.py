@@ -0,0 +1,160 @@
+"""Read saved simulations lazily for plotting
+A module that saves simulated networks with save_columnar and reads them back as Network_Reader objects. These have
+the attributes used by the plotting functions (history_time, history_weighting_matrix, agent_list, agent_list[n].history_identity,
+...) but every time series is a memory mapped array that is only read from disk when it is used, so plotting one panel
+of a sweep does not load every run with its full history.
+
+Results saved with save_object before this module existed are pickled Network objects, load_network and load_network_list
+fall back to them.
+
+Created: 10/10/2022
+"""
+
+# imports
+import os
+from package.resources.utility import save_columnar, load_columnar, load_object, Columnar_Data
+
+# modules
+class Individual_Reader:
+    """
+    Class to represent one saved individual, looked up by its id in the saved time series
+
+    ...
+
+    Attributes
+    ----------
+    id: int
+        id of the individual, the column of the agent time series
+    identity: float
+        identity at the end of the simulation
+
+    Methods
+    -------
+    history_*:
+        time series of the individual e.g history_identity, read from disk on access
+    """
+
+    def __init__(self, network_reader: "Network_Reader", id: int, position: int):
+        self.network_reader = network_reader
+        self.id = id
+        self.position = position
+
+    @property
+    def identity(self) -> float:
+        return self.network_reader.data["identity_array"][self.position]
+
+    def __getattr__(self, name: str):
+        network_reader = self.__dict__.get("network_reader")
+        if network_reader is not None and name.startswith("history_") and "history" in network_reader.data:
+            channel = name[len("history_"):]
+            if channel in network_reader.data["agent_channels"]:
+                return network_reader.data["history"][channel][:, self.id]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+class Network_Reader:
+    """
+    Class to represent one saved simulation, with the attributes of Network that are used for plotting
+
+    ...
+
+    Attributes
+    ----------
+    data: Columnar_Data
+        the saved results of the simulation
+    agent_list: list[Individual_Reader]
+        the individuals, ordered as in the social network
+
+    Methods
+    -------
+    history_*:
+        time series of the network e.g history_weighting_matrix, read from disk on access
+    """
+
+    def __init__(self, data: Columnar_Data):
+        self.data = data
+        self.agent_list = [Individual_Reader(self, int(id), position) for position, id in enumerate(data["id_array"])]
+
+    def __getattr__(self, name: str):
+        data = self.__dict__.get("data")
+        if data is None:
+            raise AttributeError(name)
+        if name.startswith("history_") and "history" in data:
+            channel = name[len("history_"):]
+            if channel in data["history"] and channel not in data["agent_channels"]:
+                return data["history"][channel]
+        elif name in data:
+            return data[name]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+def save_network(network, fileName: str, objectName: str):
+    """save a simulated Network (of any engine) in columnar form
+
+    Parameters
+    ----------
+    network: Network
+        the simulation to save
+    fileName: str
+        where to save it e.g in the results folder in data folder
+    objectName: str
+        what name to give the saved folder
+
+    Returns
+    -------
+    None
+    """
+    save_columnar(network.get_columnar_data(), fileName, objectName)
+
+def save_network_list(network_list: list, fileName: str, objectName: str):
+    """save a list of simulated Networks in columnar form, each in its own sub folder
+
+    Parameters
+    ----------
+    network_list: list[Network]
+        the simulations to save
+    fileName: str
+        where to save it e.g in the results folder in data folder
+    objectName: str
+        what name to give the saved folder
+
+    Returns
+    -------
+    None
+    """
+    save_columnar({str(i): x.get_columnar_data() for i, x in enumerate(network_list)}, fileName, objectName)
+
+def load_network(fileName: str, objectName: str):
+    """load a simulation saved with save_network as a Network_Reader, or a pickled Network saved with save_object
+
+    Parameters
+    ----------
+    fileName: str
+        where to load it from e.g in the results folder in data folder
+    objectName: str
+        name of the saved simulation
+
+    Returns
+    -------
+    Network_Reader or Network
+    """
+    if os.path.isdir(fileName + "/" + objectName):
+        return Network_Reader(load_columnar(fileName, objectName))
+    return load_object(fileName, objectName)
+
+def load_network_list(fileName: str, objectName: str) -> list:
+    """load simulations saved with save_network_list as Network_Readers, or a pickled list of Networks saved with save_object
+
+    Parameters
+    ----------
+    fileName: str
+        where to load it from e.g in the results folder in data folder
+    objectName: str
+        name of the saved simulations
+
+    Returns
+    -------
+    list[Network_Reader] or list[Network]
+    """
+    if os.path.isdir(fileName + "/" + objectName):
+        data = load_columnar(fileName, objectName)
+        return [Network_Reader(data[str(i)]) for i in range(len(data.keys()))]
+    return load_object(fileName, objectName)
@@ -0,0 +1,197 @@
+"""Cache simulation outputs between runs of the generating scripts
+A module that keeps the outputs of generate_data and the generate_*_output functions in run.py on disk, keyed by the
+hash of the function name, the parameter dictionary and MODEL_VERSION. Repeating or extending a parameter sweep then
+loads the simulations it has already done instead of running them again. The cache is bounded in size (DEFAULT_MAX_SIZE
+unless given): when it grows past max_size the least recently used outputs are deleted until it is back under
+EVICT_FRACTION of max_size, so the folder is only scanned once in a while rather than after every output.
+
+The size of the cache is counted when it is opened and each output saved is added to it. A cache handed to worker
+processes is copied into each of them, so each only counts its own outputs until it next scans the folder, and the folder
+can briefly exceed max_size by the outputs of the other workers.
+
+MODEL_VERSION must be changed whenever a change to the model alters its outputs, so that old outputs are no longer used.
+
+Created: 10/10/2022
+"""
+
+# imports
+import os
+from typing import Callable
+from package.resources.run_store import Run_Store
+from package.resources.utility import calc_params_hash
+
+MODEL_VERSION = "1"
+DEFAULT_MAX_SIZE = 2 * 1024**3
+EVICT_FRACTION = 0.9
+
+# modules
+class Result_Cache(Run_Store):
+    """
+    Class to represent a size bounded on disk cache of simulation outputs
+
+    ...
+
+    Parameters
+    ----------
+    directory: str
+        folder in which the outputs are kept, created if it does not exist
+    max_size: int
+        maximum total size of the cached outputs in bytes, if None the cache is unbounded
+    model_version: str
+        version of the model that produced the outputs
+
+    Attributes
+    ----------
+    max_size: int
+        maximum total size of the cached outputs in bytes
+    model_version: str
+        version of the model that produced the outputs
+    size: int
+        total size of the cached outputs in bytes, as last scanned plus the outputs saved since
+
+    Methods
+    -------
+    calc_func_key(func: Callable, params: dict) -> str:
+        Return the key of running func on a parameter dictionary
+    calc_size() -> int:
+        Scan the folder for the total size of the cached outputs
+    evict():
+        Delete the least recently used outputs until the cache is under EVICT_FRACTION of max_size
+    run(func: Callable, params: dict):
+        Return the cached output of func(params), running and caching it first if needed
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE, model_version: str = MODEL_VERSION):
+        """
+        Constructs all the necessary attributes for the Result_Cache object.
+
+        Parameters
+        ----------
+        directory: str
+            folder in which the outputs are kept, created if it does not exist
+        max_size: int
+            maximum total size of the cached outputs in bytes, if None the cache is unbounded
+        model_version: str
+            version of the model that produced the outputs
+        """
+        super().__init__(directory)
+        self.max_size = max_size
+        self.model_version = model_version
+        self.size = self.calc_size() if max_size is not None else 0
+
+    def calc_func_key(self, func: Callable, params: dict) -> str:
+        """
+        Return the key of running func on a parameter dictionary
+
+        Parameters
+        ----------
+        func: Callable
+            function that runs the simulation e.g generate_data
+        params: dict
+            Dictionary of parameters of the run
+
+        Returns
+        -------
+        str
+            key of the output
+        """
+        return calc_params_hash(
+            {
+                "model_version": self.model_version,
+                "function": func.__module__ + "." + func.__qualname__,
+                "params": params,
+            }
+        )
+
+    def load(self, key: str):
+        os.utime(self.calc_path(key))  # mark as recently used
+        return super().load(key)
+
+    def save(self, key: str, params: dict, result):
+        super().save(key, params, result)
+        if self.max_size is None:
+            return
+        try:
+            self.size += os.path.getsize(self.calc_path(key))
+        except FileNotFoundError:  # evicted by another process in the meantime
+            pass
+        if self.size > self.max_size:
+            self.evict()
+
+    def scan_outputs(self) -> list[tuple[float, int, str]]:
+        # (modification time, size, path) of every cached output, ignoring files removed by another process meanwhile
+        file_list = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                file_list.append((stat.st_mtime, stat.st_size, entry.path))
+        return file_list
+
+    def calc_size(self) -> int:
+        """
+        Scan the folder for the total size of the cached outputs
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            total size in bytes
+        """
+        return sum(x[1] for x in self.scan_outputs())
+
+    def evict(self):
+        """
+        Delete the least recently used outputs until the total size of the cache is at most EVICT_FRACTION of max_size, then
+        reset the running total to what is left. Files removed by another process at the same time are ignored
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        file_list = self.scan_outputs()
+        total_size = sum(x[1] for x in file_list)
+        for __, size, path in sorted(file_list):
+            if total_size <= EVICT_FRACTION * self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self.size = total_size
+
+    def run(self, func: Callable, params: dict):
+        """
+        Return the cached output of func(params), running and caching it first if it is missing
+
+        Parameters
+        ----------
+        func: Callable
+            function that runs the simulation e.g generate_data
+        params: dict
+            Dictionary of parameters of the run
+
+        Returns
+        -------
+        result: object
+            output of the run
+        """
+        key = self.calc_func_key(func, params)
+        if self.contains(key):
+            try:
+                return self.load(key)
+            except FileNotFoundError:  # evicted by another process in the meantime
+                pass
+        result = func(dict(params))
+        self.save(key, params, result)
+        return result
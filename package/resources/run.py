@@ -9,17 +9,102 @@ Created: 10/10/2022
 
 # imports
 import time
+from functools import partial
 import numpy as np
 import numpy.typing as npt
-from joblib import Parallel, delayed
-import multiprocessing
 from package.model.network import Network
+from package.model.network_matrix import Network_Matrix
+from package.model.network_batch import Network_Batch
+from package.resources.scheduling import schedule_parallel_run, schedule_stored_parallel_run
+
+ENGINES = {
+    "agent": Network,
+    "matrix": Network_Matrix,
+}
+
+SA_METRICS_DTYPE = np.dtype(
+    [
+        ("emissions_flow", float),
+        ("mean", float),
+        ("var", float),
+        ("coefficient_variance", float),
+        ("emissions_change", float),
+        ("emissions_stock", float),
+    ]
+)
 
 # modules
+def apply_cache(func, cache = None):
+    """
+    Wrap a function that runs simulations so that its outputs are looked up in, and saved to, a Result_Cache
+
+    Parameters
+    ----------
+    func: Callable
+        function taking a parameter dictionary e.g generate_data
+    cache: Result_Cache
+        the cache to use, if None func is returned unchanged
+
+    Returns
+    -------
+    Callable
+        function taking a parameter dictionary
+    """
+    if cache is None:
+        return func
+    return partial(cache.run, func)
+
 ####SINGLE SHOT RUN
+def create_network(parameters: dict) -> Network:
+    """
+    Create the social network using the engine set by parameters["engine"]. "agent" (the default) holds a list of Individual
+    objects, "matrix" keeps the state of all individuals in arrays and is much faster for large N
+
+    Parameters
+    ----------
+    parameters: dict
+        Dictionary of parameters used to generate attributes, dict used for readability instead of super long list of input parameters
+
+    Returns
+    -------
+    social_network: Network
+        Social network at its initial conditions
+    """
+    return ENGINES[parameters.get("engine", "agent")](parameters)
+
+def run_network(social_network: Network, time_steps_max: int) -> Network:
+    """
+    Run a social network forward in time for time_steps_max steps, or until it converges in which case the emissions stock
+    is extrapolated to the end
+
+    Parameters
+    ----------
+    social_network: Network
+        Social network at its initial conditions
+    time_steps_max: int
+        number of steps to run for
+
+    Returns
+    -------
+    social_network: Network
+        Social network that has evolved from initial conditions
+    """
+
+    #### RUN TIME STEPS
+    while social_network.t < time_steps_max and not social_network.converged:
+        social_network.next_step()
+
+    if social_network.t < time_steps_max:
+        social_network.extrapolate_emissions_stock(time_steps_max)
+
+    return social_network
+
 def generate_data(parameters: dict,print_simu = 0) -> Network:
     """
-    Generate the Network object which itself contains list of Individual objects. Run this forward in time for the desired number of steps
+    Generate the Network object which itself contains list of Individual objects (or arrays for the "matrix" engine). Run this forward in time for the desired number of steps,
+    or until it converges if parameters["convergence_window"] is set, in which case the emissions stock is extrapolated to the end.
+    If parameters["profile"] is set the time spent in each stage of a step is kept in social_network.profiler, printed if print_simu
+    and written as JSON to parameters["profile_file"] if given
 
     Parameters
     ----------
@@ -35,123 +120,208 @@ def generate_data(parameters: dict,print_simu = 0) -> Network:
     if print_simu:
         start_time = time.time()
 
-    social_network = Network(parameters)
+    social_network = create_network(parameters)
+    run_network(social_network, parameters["time_steps_max"])
+
+    if print_simu:
+        print(
+            "SIMULATION time taken: %s minutes" % ((time.time() - start_time) / 60),
+            "or %s s" % ((time.time() - start_time)),
+        )
+        if social_network.profiler.enabled:
+            social_network.profiler.print_report()
+    if social_network.profiler.enabled and parameters.get("profile_file"):
+        social_network.profiler.save_report(parameters["profile_file"])
+    return social_network
+
+def generate_data_batch(parameters: dict, print_simu = 0) -> Network_Batch:
+    """
+    Generate a Network_Batch holding one simulation per seed in parameters["seed_list"]. Run them all forward in time for the desired number of steps
+
+    Parameters
+    ----------
+    parameters: dict
+        Dictionary of parameters used to generate attributes, dict used for readability instead of super long list of input parameters
+
+    Returns
+    -------
+    social_network_batch: Network_Batch
+        Social networks of every seed that have evolved from initial conditions
+    """
+
+    if print_simu:
+        start_time = time.time()
+
+    social_network_batch = Network_Batch(parameters)
 
     #### RUN TIME STEPS
-    while social_network.t < parameters["time_steps_max"]:
-        social_network.next_step()
+    while social_network_batch.t < parameters["time_steps_max"]:
+        social_network_batch.next_step()
 
     if print_simu:
         print(
             "SIMULATION time taken: %s minutes" % ((time.time() - start_time) / 60),
             "or %s s" % ((time.time() - start_time)),
         )
-    return social_network
+    return social_network_batch
 
 def generate_first_behaviour_lists_one_seed_output(params):
     """For birfurcation just need attitude of first behaviour"""
     data = generate_data(params)
-    return [x.attitudes[0] for x in data.agent_list]
+    return list(data.get_behavioural_attitude_matrix()[:, 0])
 
 def generate_multi_output_individual_emissions_flow_list(params):
     """Individual specific emission and associated id to compare runs with and without behavioural interdependence"""
 
+    if params.get("batch_seeds"):
+        data = generate_data_batch(params)
+        emissions_flow_list = list(data.total_carbon_emissions_flow)
+        carbon_emissions_not_influencer = list(data.calc_total_emissions_flow(exclude_influencers=True))
+        return (emissions_flow_list, carbon_emissions_not_influencer)
+
     emissions_flow_list = []
     carbon_emissions_not_influencer = []
     for v in params["seed_list"]:
         params["set_seed"] = v
         data = generate_data(params)
-        emissions_flow_list.append(data.total_carbon_emissions)
-        carbon_emissions_not_influencer.append(sum(x.total_carbon_emissions for x in data.agent_list if not x.green_fountain_state))
+        emissions_flow_list.append(data.total_carbon_emissions_flow)
+        carbon_emissions_not_influencer.append(data.calc_total_emissions_flow(exclude_influencers=True))
     return (emissions_flow_list, carbon_emissions_not_influencer)
 
+def calc_sa_metrics(data: Network) -> np.void:
+    """
+    Return the end state measures used in the sensitivity analysis as one record of SA_METRICS_DTYPE: the emissions flow,
+    emissions change and emissions stock normalised by N*M, and the mean, variance and coefficient of variance of identity
+
+    Parameters
+    ----------
+    data: Network
+        Social network that has evolved from initial conditions
+
+    Returns
+    -------
+    metrics: np.void
+        record with the fields of SA_METRICS_DTYPE
+    """
+    norm_factor = data.N * data.M
+    # Insert more measures below that want to be used for evaluating the
+    return np.array(
+        (
+            data.total_carbon_emissions_flow / norm_factor,
+            data.average_identity,
+            data.var_identity,
+            data.std_identity / data.average_identity,
+            np.abs(data.total_carbon_emissions_flow - data.init_total_carbon_emissions) / norm_factor,
+            data.total_carbon_emissions_stock / norm_factor,
+        ),
+        dtype=SA_METRICS_DTYPE,
+    )[()]
+
+def generate_sa_metrics(params: dict) -> np.void:
+    """
+    Run one simulation keeping only what is needed for its end state measures: no time series are saved and the networkx graph
+    is dropped once the adjacency matrix is built. The topology cache is left to the caller: in a Saltelli design every row
+    that varies a parameter other than N, K and prob_rewire has the network of its A row, so sensitivity_analysis_gen.py turns
+    it on. Only the small record of calc_sa_metrics is returned to the parent process
+
+    Parameters
+    ----------
+    params: dict
+        Dictionary of parameters used to generate attributes
+
+    Returns
+    -------
+    metrics: np.void
+        record with the fields of SA_METRICS_DTYPE
+    """
+    params = dict(params, save_timeseries_data=0, keep_network_graph=0)
+    data = run_network(create_network(params), params["time_steps_max"])
+    return calc_sa_metrics(data)
+
+def unpack_sa_metrics(res: list) -> tuple[npt.NDArray, ...]:
+    """
+    Stack the records of many runs and split them into one array per measure, in the order of SA_METRICS_DTYPE. Tuples stored
+    by older runs are accepted as well
+
+    Parameters
+    ----------
+    res: list
+        records (or tuples) of each run
+
+    Returns
+    -------
+    tuple[npt.NDArray, ...]
+        array of each measure over the runs
+    """
+    metrics = np.array([tuple(x) for x in res], dtype=SA_METRICS_DTYPE)
+    return tuple(metrics[name] for name in SA_METRICS_DTYPE.names)
+
 def generate_sensitivity_output(params: dict):
     """
     Generate data from a set of parameter contained in a dictionary. Average results over multiple stochastic seeds contained in params["seed_list"]
+    If params["batch_seeds"] is set all the seeds are simulated together, see generate_sensitivity_output_batch
 
     """
 
-    emissions_flow_list = []
-    mean_list = []
-    var_list = []
-    coefficient_variance_list = []
-    emissions_change_list = []
-    emissions_stock_list = []
+    if params.get("batch_seeds"):
+        return generate_sensitivity_output_batch(params)
 
-    for v in params["seed_list"]:
+    metrics = np.empty(len(params["seed_list"]), dtype=SA_METRICS_DTYPE)
+    for i, v in enumerate(params["seed_list"]):
         params["set_seed"] = v
-        data = generate_data(params)
-        norm_factor = data.N * data.M
-        # Insert more measures below that want to be used for evaluating the
-        emissions_flow_list.append(data.total_carbon_emissions_flow / norm_factor)
-        mean_list.append(data.average_identity)
-        var_list.append(data.var_identity)
-        coefficient_variance_list.append(data.std_identity / (data.average_identity))
-        emissions_change_list.append(np.abs(data.total_carbon_emissions_flow - data.init_total_carbon_emissions)/norm_factor)
-        emissions_stock_list.append(data.total_carbon_emissions_stock/norm_factor)
-
-    stochastic_norm_emissions_flow = np.mean(emissions_flow_list)
-    stochastic_norm_mean = np.mean(mean_list)
-    stochastic_norm_var = np.mean(var_list)
-    stochastic_norm_coefficient_variance = np.mean(coefficient_variance_list)
-    stochastic_norm_emissions_change = np.mean(emissions_change_list)
-    stochastic_norm_emissions_stock= np.mean(emissions_stock_list)
+        metrics[i] = generate_sa_metrics(params)
 
-    return (
-        stochastic_norm_emissions_flow,
-        stochastic_norm_mean,
-        stochastic_norm_var,
-        stochastic_norm_coefficient_variance,
-        stochastic_norm_emissions_change,
-        stochastic_norm_emissions_stock
-    )
+    return tuple(np.mean(metrics[name]) for name in SA_METRICS_DTYPE.names)
 
-def generate_sensitivity_output_flat(params: dict):
+def generate_sensitivity_output_batch(params: dict):
     """
-    Generate data from a set of parameter contained in a dictionary. Average results over multiple stochastic seeds contained in params["seed_list"]
+    Generate the same outputs as generate_sensitivity_output but with all stochastic seeds in params["seed_list"] simulated
+    at once as a Network_Batch, which amortises the cost of each time step over the seeds
 
     """
 
-    data = generate_data(params)
+    data = generate_data_batch(params)
     norm_factor = data.N * data.M
-    # Insert more measures below that want to be used for evaluating the
-    stochastic_norm_emissions_flow = data.total_carbon_emissions_flow/norm_factor
-    stochastic_norm_mean = data.average_identity
-    stochastic_norm_var = data.var_identity
-    stochastic_norm_coefficient_variance = data.std_identity/data.average_identity
-    stochastic_norm_emissions_change = np.abs(data.total_carbon_emissions_flow - data.init_total_carbon_emissions)/norm_factor
-    stochastic_norm_emissions_stock = data.total_carbon_emissions_stock/norm_factor
+
+    emissions_flow_array = data.total_carbon_emissions_flow / norm_factor
+    coefficient_variance_array = data.std_identity / data.average_identity
+    emissions_change_array = np.abs(data.total_carbon_emissions_flow - data.init_total_carbon_emissions)/norm_factor
+    emissions_stock_array = data.total_carbon_emissions_stock/norm_factor
 
     return (
-        stochastic_norm_emissions_flow,
-        stochastic_norm_mean,
-        stochastic_norm_var,
-        stochastic_norm_coefficient_variance,
-        stochastic_norm_emissions_change,
-        stochastic_norm_emissions_stock
+        np.mean(emissions_flow_array),
+        np.mean(data.average_identity),
+        np.mean(data.var_identity),
+        np.mean(coefficient_variance_array),
+        np.mean(emissions_change_array),
+        np.mean(emissions_stock_array)
     )
 
-def parallel_run(params_dict: dict[dict]) -> list[Network]:
+def generate_sensitivity_output_flat(params: dict) -> np.void:
+    """
+    Generate the end state measures of a single simulation, with one stochastic seed, as a record of SA_METRICS_DTYPE
+
     """
-    Generate data from a list of parameter dictionaries, parallelize the execution of each single shot simulation
+
+    return generate_sa_metrics(params)
+
+def parallel_run(params_dict: dict[dict], n_jobs: int = None, backend: str = None, cache = None) -> list[Network]:
+    """
+    Generate data from a list of parameter dictionaries, parallelize the execution of each single shot simulation.
+    Runs are grouped into cost balanced chunks, see scheduling.py. n_jobs defaults to the number of cores and backend to the joblib default.
+    If a Result_Cache is given, runs already in it are loaded rather than simulated again
 
     """
 
-    num_cores = multiprocessing.cpu_count()
     #data_parallel = [generate_data(i) for i in params_dict]
-    data_parallel = Parallel(n_jobs=num_cores, verbose=10)(
-        delayed(generate_data)(i) for i in params_dict
-    )
+    data_parallel = schedule_parallel_run(apply_cache(generate_data, cache), params_dict, n_jobs, backend)
     return data_parallel
 
 def multi_stochstic_emissions_run_all_individual(
-        params_dict: list[dict]
+        params_dict: list[dict], n_jobs: int = None, backend: str = None, cache = None
 ) -> npt.NDArray:
-    num_cores = multiprocessing.cpu_count()
     #res = [generate_multi_output_individual_emissions_flow_list(i) for i in params_dict]
-    res = Parallel(n_jobs=num_cores, verbose=10)(
-        delayed(generate_multi_output_individual_emissions_flow_list)(i) for i in params_dict
-    )
+    res = schedule_parallel_run(apply_cache(generate_multi_output_individual_emissions_flow_list, cache), params_dict, n_jobs, backend)
     emissions_flow_list, carbon_emissions_not_influencer = zip(
         *res
     )
@@ -159,21 +329,17 @@ def multi_stochstic_emissions_run_all_individual(
     return np.asarray(emissions_flow_list),np.asarray(carbon_emissions_not_influencer)
 
 def one_seed_identity_data_run(
-        params_dict: list[dict]
+        params_dict: list[dict], n_jobs: int = None, backend: str = None, cache = None
 ) -> npt.NDArray:
 
-    num_cores = multiprocessing.cpu_count()
     #res = [generate_sensitivity_output(i) for i in params_dict]
-    results_identity_lists = Parallel(n_jobs=num_cores, verbose=10)(
-
-        delayed(generate_first_behaviour_lists_one_seed_output)(i) for i in params_dict
-    )
+    results_identity_lists = schedule_parallel_run(apply_cache(generate_first_behaviour_lists_one_seed_output, cache), params_dict, n_jobs, backend)
 
     return np.asarray(results_identity_lists)#can't run with multiple different network sizes
 
 
 def parallel_run_sa(
-    params_dict: dict[dict],
+    params_dict: dict[dict], n_jobs: int = None, backend: str = None, cache = None
 ) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
     """
     Generate data for sensitivity analysis for model varying lots of parameters dictated by params_dict, producing output
@@ -182,11 +348,8 @@ def parallel_run_sa(
     """
 
     #print("params_dict", params_dict)
-    num_cores = multiprocessing.cpu_count()
     #res = [generate_sensitivity_output(i) for i in params_dict]
-    res = Parallel(n_jobs=num_cores, verbose=10)(
-        delayed(generate_sensitivity_output)(i) for i in params_dict
-    )
+    res = schedule_parallel_run(apply_cache(generate_sensitivity_output, cache), params_dict, n_jobs, backend)
     results_emissions_flow, results_mean, results_var, results_coefficient_variance, results_emissions_flow_change, results_emissions_stock = zip(
         *res
     )
@@ -201,27 +364,19 @@ def parallel_run_sa(
     )
 
 def parallel_run_sa_flat(
-    params_dict: dict[dict],
+    params_dict: dict[dict], n_jobs: int = None, backend: str = None, run_store = None, cache = None
 ) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
     """
-    Generate data for sensitivity analysis for model varying lots of parameters dictated by params_dict
+    Generate data for sensitivity analysis for model varying lots of parameters dictated by params_dict, a list of parameter dictionaries
+    or a Shared_Param_List whose dictionaries are made inside the workers. If a Run_Store is given each run is saved to it when done
+    and runs already in it are skipped
     """
 
     #print("params_dict", params_dict)
-    num_cores = multiprocessing.cpu_count()
     #res = [generate_sensitivity_output(i) for i in params_dict]
-    res = Parallel(n_jobs=num_cores, verbose=10)(
-        delayed(generate_sensitivity_output_flat)(i) for i in params_dict
-    )
-    results_emissions_flow, results_mean, results_var, results_coefficient_variance, results_emissions_flow_change, results_emissions_stock = zip(
-        *res
-    )
+    if run_store is None:
+        res = schedule_parallel_run(apply_cache(generate_sensitivity_output_flat, cache), params_dict, n_jobs, backend)
+    else:
+        res = schedule_stored_parallel_run(apply_cache(generate_sensitivity_output_flat, cache), params_dict, run_store, n_jobs, backend)
 
-    return (
-        np.asarray(results_emissions_flow),
-        np.asarray(results_mean),
-        np.asarray(results_var),
-        np.asarray(results_coefficient_variance),
-        np.asarray(results_emissions_flow_change),
-        np.asarray(results_emissions_stock)
-    )
\ No newline at end of file
+    return unpack_sa_metrics(res)
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""Store the outputs of completed runs on disk
+A module that saves the output of every run of a long campaign (e.g a sensitivity analysis) as soon as it finishes, in
+its own file named by the hash of the run's parameter dictionary. If the campaign is stopped it can be restarted with
+the same store and only the runs without a file are computed again.
+
+Files are written to a temporary name and then renamed, so a crash mid write never leaves a half written result.
+
+Created: 10/10/2022
+"""
+
+# imports
+import os
+import pickle
+import tempfile
+from typing import Callable
+from package.resources.utility import calc_params_hash
+
+# modules
+class Run_Store:
+    """
+    Class to represent a directory of completed run outputs keyed by parameter hash
+
+    ...
+
+    Parameters
+    ----------
+    directory: str
+        folder in which the outputs are kept, created if it does not exist
+
+    Attributes
+    ----------
+    directory: str
+        folder in which the outputs are kept
+
+    Methods
+    -------
+    calc_key(params: dict) -> str:
+        Return the key of a parameter dictionary
+    contains(key: str) -> bool:
+        Whether the output of a run is stored
+    save(key: str, params: dict, result):
+        Atomically write the output of a run
+    load(key: str):
+        Load the output of a run
+    run(func: Callable, params: dict):
+        Return the stored output of a run, computing and storing it first if needed
+    """
+
+    def __init__(self, directory: str):
+        """
+        Constructs all the necessary attributes for the Run_Store object.
+
+        Parameters
+        ----------
+        directory: str
+            folder in which the outputs are kept, created if it does not exist
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def calc_key(self, params: dict) -> str:
+        """
+        Return the key of a parameter dictionary, its hash
+
+        Parameters
+        ----------
+        params: dict
+            Dictionary of parameters of one run
+
+        Returns
+        -------
+        str
+            key of the run
+        """
+        return calc_params_hash(params)
+
+    def calc_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pkl")
+
+    def contains(self, key: str) -> bool:
+        """
+        Whether the output of a run is stored
+
+        Parameters
+        ----------
+        key: str
+            key of the run
+
+        Returns
+        -------
+        bool
+        """
+        return os.path.exists(self.calc_path(key))
+
+    def save(self, key: str, params: dict, result):
+        """
+        Write the output of a run to a temporary file then rename it, so the file either holds the whole result or does not exist.
+        The parameters are saved alongside so that the store can be inspected
+
+        Parameters
+        ----------
+        key: str
+            key of the run
+        params: dict
+            Dictionary of parameters of the run
+        result: object
+            output of the run
+
+        Returns
+        -------
+        None
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"params": params, "result": result}, f)
+            os.replace(tmp_path, self.calc_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(self, key: str):
+        """
+        Load the output of a run
+
+        Parameters
+        ----------
+        key: str
+            key of the run
+
+        Returns
+        -------
+        result: object
+            output of the run
+        """
+        with open(self.calc_path(key), "rb") as f:
+            return pickle.load(f)["result"]
+
+    def run(self, func: Callable, params: dict):
+        """
+        Return the stored output of func(params), computing and storing it first if it is missing. Used inside workers so that
+        each output is saved as soon as the run finishes
+
+        Parameters
+        ----------
+        func: Callable
+            function that runs the simulation e.g generate_sensitivity_output_flat
+        params: dict
+            Dictionary of parameters of the run
+
+        Returns
+        -------
+        result: object
+            output of the run
+        """
+        key = self.calc_key(params)
+        if self.contains(key):
+            return self.load(key)
+        result = func(dict(params))
+        self.save(key, params, result)
+        return result
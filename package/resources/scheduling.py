@@ -0,0 +1,216 @@
+"""Schedule many simulations over several processes
+A module that groups the runs of a parameter sweep into chunks of roughly equal estimated cost and hands the chunks
+to joblib. Each worker gets a few large tasks instead of one task per parameter dictionary, which lowers the dispatch
+and pickling overhead, and as the most expensive runs are started first the cores are not left idle while one long
+run finishes at the end. Results are streamed back as chunks complete and reassembled in the order of the inputs.
+
+Created: 10/10/2022
+"""
+
+# imports
+import heapq
+import multiprocessing
+from functools import partial
+from typing import Callable, Iterator
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+
+# modules
+def calc_run_cost(params: dict) -> float:
+    """
+    Estimate the relative cost of running a parameter dictionary. Each step costs about N*N for the weighting matrix
+    and N*M*(K + 1) for social learning, and the discounted memory of each individual is filled over cultural_inertia
+    steps at the start. The estimate only needs to rank runs, not predict run times
+
+    Parameters
+    ----------
+    params: dict
+        Dictionary of parameters of one run
+
+    Returns
+    -------
+    cost: float
+        estimated relative cost of the run
+    """
+    N = params["N"] + params.get("green_N", 0)
+    M = params["M"]
+    K = params.get("K", 0)
+
+    step_cost = N * N + N * M * (K + 1)
+    init_cost = params.get("cultural_inertia", 1) * N * M
+
+    return params["time_steps_max"] * step_cost + init_cost
+
+def make_chunks(cost_list: list, n_chunks: int) -> list[list[int]]:
+    """
+    Split tasks into chunks of similar total cost using the longest processing time first rule: tasks are taken in
+    order of decreasing cost and each one goes to the chunk with the lowest total so far
+
+    Parameters
+    ----------
+    cost_list: list[float]
+        estimated cost of each task
+    n_chunks: int
+        number of chunks to make, fewer are returned if there are fewer tasks
+
+    Returns
+    -------
+    chunk_list: list[list[int]]
+        indices of the tasks in each chunk, the most expensive chunk first
+    """
+    n_chunks = max(1, min(n_chunks, len(cost_list)))
+    heap = [(0.0, i) for i in range(n_chunks)]
+    chunk_list = [[] for _ in range(n_chunks)]
+    chunk_cost = np.zeros(n_chunks)
+
+    for task in np.argsort(cost_list, kind="stable")[::-1]:
+        total, i = heapq.heappop(heap)
+        chunk_list[i].append(int(task))
+        chunk_cost[i] = total + cost_list[task]
+        heapq.heappush(heap, (chunk_cost[i], i))
+
+    return [chunk_list[i] for i in np.argsort(-chunk_cost, kind="stable") if chunk_list[i]]
+
+def take_params(params_list, index_list: list[int]):
+    """
+    Return the inputs of a chunk. For a Shared_Param_List (see shared_params.py) this is a subset that only holds the indices,
+    the parameter dictionaries are then made inside the worker
+
+    Parameters
+    ----------
+    params_list: list[dict] or Shared_Param_List
+        inputs of all the runs
+    index_list: list[int]
+        positions of the runs of the chunk
+
+    Returns
+    -------
+    list[dict] or Shared_Param_List
+        inputs of the chunk
+    """
+    if hasattr(params_list, "subset"):
+        return params_list.subset(index_list)
+    return [params_list[i] for i in index_list]
+
+def run_chunk(func: Callable, task_list: list, index_list: list[int]) -> list[tuple]:
+    """
+    Run a chunk of tasks one after another inside a worker
+
+    Parameters
+    ----------
+    func: Callable
+        function to apply to each task
+    task_list: list or Shared_Param_List
+        the inputs of the chunk
+    index_list: list[int]
+        position of each input in the full list of inputs
+
+    Returns
+    -------
+    list[tuple]
+        pairs of (index, result)
+    """
+    return [(i, func(task)) for i, task in zip(index_list, task_list)]
+
+def stream_parallel_run(
+    func: Callable,
+    params_list: list[dict],
+    n_jobs: int = None,
+    backend: str = None,
+    chunks_per_job: int = 4,
+    cost_func: Callable = calc_run_cost,
+    verbose: int = 10,
+) -> Iterator[tuple]:
+    """
+    Apply func to every parameter dictionary in parallel with cost balanced chunks, yielding results as they complete
+
+    Parameters
+    ----------
+    func: Callable
+        function run on each parameter dictionary, e.g generate_sensitivity_output
+    params_list: list[dict] or Shared_Param_List
+        inputs of the runs
+    n_jobs: int
+        number of workers, defaults to the number of cores
+    backend: str
+        joblib backend e.g "loky", "multiprocessing" or "threading", None uses the joblib default
+    chunks_per_job: int
+        number of chunks made per worker, more chunks balance the load better at the cost of more dispatches
+    cost_func: Callable
+        estimate of the relative cost of a parameter dictionary
+    verbose: int
+        joblib verbosity
+
+    Returns
+    -------
+    Iterator[tuple]
+        pairs of (index in params_list, result) in order of completion
+    """
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+
+    if not hasattr(params_list, "subset"):
+        params_list = list(params_list)
+    cost_list = [cost_func(params) for params in params_list]
+    chunk_list = make_chunks(cost_list, effective_n_jobs(n_jobs) * chunks_per_job)
+
+    res = Parallel(n_jobs=n_jobs, backend=backend, verbose=verbose, return_as="generator_unordered")(
+        delayed(run_chunk)(func, take_params(params_list, index_list), index_list) for index_list in chunk_list
+    )
+    for chunk_res in res:
+        yield from chunk_res
+
+def schedule_parallel_run(
+    func: Callable,
+    params_list: list[dict],
+    n_jobs: int = None,
+    backend: str = None,
+    chunks_per_job: int = 4,
+    cost_func: Callable = calc_run_cost,
+    verbose: int = 10,
+) -> list:
+    """
+    Apply func to every parameter dictionary in parallel with cost balanced chunks, see stream_parallel_run
+
+    Returns
+    -------
+    list
+        results in the same order as params_list
+    """
+    if not hasattr(params_list, "subset"):
+        params_list = list(params_list)
+    results = [None] * len(params_list)
+    for i, result in stream_parallel_run(func, params_list, n_jobs, backend, chunks_per_job, cost_func, verbose):
+        results[i] = result
+    return results
+
+def schedule_stored_parallel_run(
+    func: Callable,
+    params_list: list[dict],
+    run_store,
+    n_jobs: int = None,
+    backend: str = None,
+    verbose: int = 10,
+) -> list:
+    """
+    Like schedule_parallel_run but each output is saved to run_store (a Run_Store) by the worker as soon as the run finishes.
+    Runs already in the store are not repeated, so an interrupted campaign can be resumed by calling this again
+
+    Returns
+    -------
+    list
+        results in the same order as params_list
+    """
+    key_list = [run_store.calc_key(params) for params in params_list]
+
+    missing_runs = {}
+    for i, key in enumerate(key_list):
+        if (key not in missing_runs) and (not run_store.contains(key)):
+            missing_runs[key] = i
+
+    print("Stored runs: %s, runs to do: %s" % (len(set(key_list)) - len(missing_runs), len(missing_runs)))
+    if missing_runs:
+        missing_params_list = take_params(params_list, list(missing_runs.values()))
+        schedule_parallel_run(partial(run_store.run, func), missing_params_list, n_jobs, backend, verbose=verbose)
+
+    return [run_store.load(key) for key in key_list]
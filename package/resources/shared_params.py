@@ -0,0 +1,130 @@
+"""Share the sampled parameter values of a sensitivity analysis with the workers
+A module that defines a list of parameter dictionaries which is never built in full: the sampled parameter values are
+saved once as a .npy file and each dictionary is made on demand from a row of it, the base parameters and a seed.
+When the runs are sent to the workers (see scheduling.py) each chunk carries the file name and the indices of its runs
+instead of one pickled dictionary per run, and the workers read their rows from the memory mapped file, whose pages
+are shared between the processes by the operating system.
+
+Created: 10/10/2022
+"""
+
+# imports
+import numpy as np
+import numpy.typing as npt
+
+# modules
+def save_param_values(param_values: npt.NDArray, path: str):
+    """
+    Save the sampled parameter values so that workers can memory map them
+
+    Parameters
+    ----------
+    param_values: npt.NDArray
+        array of shape (samples, D) of the sampled values of the D varied parameters
+    path: str
+        .npy file to write
+
+    Returns
+    -------
+    None
+    """
+    np.save(path, np.ascontiguousarray(param_values, dtype=float))
+
+class Shared_Param_List:
+    """
+    Class to represent the parameter dictionaries of a sensitivity analysis, one per sample and seed in the order
+    sample 0 seed 0, sample 0 seed 1, ..., made on demand from a memory mapped array of parameter values
+
+    ...
+
+    Parameters
+    ----------
+    param_values_path: str
+        .npy file of the sampled parameter values, shape (samples, D)
+    base_params: dict
+        parameters which are not varied
+    property_list: list[str]
+        names of the D varied parameters, in the order of the columns of the parameter values
+    index_array: npt.NDArray[int]
+        runs of the full list that this list holds, all of them if None
+
+    Attributes
+    ----------
+    param_values: npt.NDArray
+        the memory mapped parameter values, opened the first time they are used in each process
+    seed_reps: int
+        number of seeds in base_params["seed_list"]
+
+    Methods
+    -------
+    subset(index_list: list[int]) -> Shared_Param_List:
+        Return the list of some of the runs, sharing the same file
+    """
+
+    def __init__(self, param_values_path: str, base_params: dict, property_list: list[str], index_array: npt.NDArray = None):
+        """
+        Constructs all the necessary attributes for the Shared_Param_List object.
+
+        Parameters
+        ----------
+        param_values_path: str
+            .npy file of the sampled parameter values, shape (samples, D)
+        base_params: dict
+            parameters which are not varied
+        property_list: list[str]
+            names of the D varied parameters, in the order of the columns of the parameter values
+        index_array: npt.NDArray[int]
+            runs of the full list that this list holds, all of them if None
+        """
+        self.param_values_path = param_values_path
+        self.base_params = base_params
+        self.property_list = property_list
+        self.seed_reps = len(base_params["seed_list"])
+        self._param_values = None
+
+        if index_array is None:
+            index_array = np.arange(len(self.param_values) * self.seed_reps)
+        self.index_array = np.asarray(index_array)
+
+    @property
+    def param_values(self) -> npt.NDArray:
+        if self._param_values is None:
+            self._param_values = np.load(self.param_values_path, mmap_mode="r")
+        return self._param_values
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_param_values"] = None  # workers open the file themselves
+        return state
+
+    def __len__(self) -> int:
+        return len(self.index_array)
+
+    def __getitem__(self, i: int) -> dict:
+        run = self.index_array[i]
+        sample, seed = divmod(int(run), self.seed_reps)
+
+        params = self.base_params.copy()  # copy it as we dont want the changes from one experiment influencing another
+        for property, value in zip(self.property_list, self.param_values[sample]):
+            params[property] = value
+        params["set_seed"] = self.base_params["seed_list"][seed]
+        return params
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def subset(self, index_list: list[int]) -> "Shared_Param_List":
+        """
+        Return the list of some of the runs, sharing the same file. This is what is sent to a worker
+
+        Parameters
+        ----------
+        index_list: list[int]
+            positions of the runs in this list
+
+        Returns
+        -------
+        Shared_Param_List
+        """
+        return Shared_Param_List(self.param_values_path, self.base_params, self.property_list, self.index_array[index_list])
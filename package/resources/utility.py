@@ -7,6 +7,9 @@ Created: 10/10/2022
 # imports
 import pickle
 import os
+import json
+import shutil
+import hashlib
 import numpy as np
 from scipy.signal import argrelextrema
 import datetime
@@ -98,6 +101,145 @@ def load_object(fileName, objectName) -> dict:
         data = pickle.load(f)
     return data
 
+def save_columnar(data: dict, fileName, objectName):
+    """save a dictionary of arrays and scalars as a folder holding one .npy file per array and a manifest.json,
+    an alternative to save_object that allows single arrays to be loaded, memory mapped, without reading the rest.
+    Nested dictionaries are saved as sub folders. The folder is written under a temporary name and then renamed
+
+    Parameters
+    ----------
+    data: dict
+        maps names to NumPy arrays, json serialisable values (numbers, strings, lists of them) or further dicts
+    fileName: str
+        where to save it e.g in the results folder in data or plots folder
+    objectName: str
+        what name to give the saved folder
+
+    Returns
+    -------
+    None
+    """
+    path = fileName + "/" + objectName
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    manifest = {"arrays": {}, "values": {}, "groups": []}
+    for name, value in data.items():
+        if isinstance(value, dict):
+            save_columnar(value, tmp_path, name)
+            manifest["groups"].append(name)
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            np.save(tmp_path + "/" + name + ".npy", value)
+            manifest["arrays"][name] = {"shape": list(value.shape), "dtype": str(value.dtype)}
+        elif isinstance(value, np.generic):
+            manifest["values"][name] = value.item()
+        else:
+            manifest["values"][name] = value
+
+    with open(tmp_path + "/manifest.json", "w") as f:
+        json.dump(manifest, f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+def load_columnar(fileName, objectName, mmap_mode = "r") -> "Columnar_Data":
+    """load a folder written by save_columnar, no arrays are read until they are used
+
+    Parameters
+    ----------
+    fileName: str
+        where to load it from e.g in the results folder in data folder
+    objectName: str
+        name of the saved folder
+    mmap_mode: str
+        how arrays are memory mapped, see numpy.load. None reads them fully into memory on first use
+
+    Returns
+    -------
+    data: Columnar_Data
+        dictionary like object that loads each array on first access
+    """
+    return Columnar_Data(fileName + "/" + objectName, mmap_mode)
+
+class Columnar_Data:
+    """
+    Class to represent a folder written by save_columnar, used like a read only dictionary. Arrays are memory mapped
+    on first access, scalars come from the manifest and sub folders are returned as Columnar_Data
+
+    ...
+
+    Attributes
+    ----------
+    path: str
+        folder of the saved data
+    mmap_mode: str
+        how arrays are memory mapped, see numpy.load
+    manifest: dict
+        names, shapes and dtypes of the arrays, the scalar values and the names of the sub folders
+
+    Methods
+    -------
+    keys() -> list[str]:
+        Names of everything saved
+    shape(name: str) -> tuple:
+        Shape of an array without loading it
+    """
+
+    def __init__(self, path: str, mmap_mode = "r"):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        with open(path + "/manifest.json") as f:
+            self.manifest = json.load(f)
+        self._loaded = {}
+
+    def keys(self) -> list:
+        return list(self.manifest["arrays"]) + list(self.manifest["values"]) + list(self.manifest["groups"])
+
+    def shape(self, name: str) -> tuple:
+        return tuple(self.manifest["arrays"][name]["shape"])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.keys()
+
+    def __getitem__(self, name: str):
+        if name in self.manifest["values"]:
+            return self.manifest["values"][name]
+        if name not in self._loaded:
+            if name in self.manifest["arrays"]:
+                self._loaded[name] = np.load(self.path + "/" + name + ".npy", mmap_mode=self.mmap_mode)
+            elif name in self.manifest["groups"]:
+                self._loaded[name] = Columnar_Data(self.path + "/" + name, self.mmap_mode)
+            else:
+                raise KeyError(name)
+        return self._loaded[name]
+
+def calc_params_hash(params: dict) -> str:
+    """Hash a parameter dictionary, the same parameters always give the same hash regardless of key order or whether
+    values are NumPy or Python numbers
+
+    Parameters
+    ----------
+    params: dict
+        Dictionary of parameters of one run
+
+    Returns
+    -------
+    str
+        hex digest of the sha256 hash of the parameters written as sorted json
+    """
+    def to_json_type(x):
+        if isinstance(x, np.ndarray):
+            return x.tolist()
+        if isinstance(x, np.generic):
+            return x.item()
+        raise TypeError("Can't hash parameter value of type %s" % type(x))
+
+    text = json.dumps(params, sort_keys=True, default=to_json_type)
+    return hashlib.sha256(text.encode()).hexdigest()
+
 def calc_pos_clusters_set_bandwidth(identity_data,s,bandwidth):
     kde, e = calc_num_clusters_set_bandwidth(identity_data,s,bandwidth)
     ma = argrelextrema(e, np.greater)[0]